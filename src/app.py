@@ -1,54 +1,91 @@
-from libs.huawei_wrapper import ErrorCodes
-from libs.huawei_wrapper import HuaweiWrapper
 from libs.config_parser import ConfigParser
+from libs.history_cli import HistoryCli
+from libs.config_watcher import ConfigWatcher
+from libs.huawei_wrapper import HuaweiWrapper
 from libs.app_history import AppHistory
+from libs.async_engine import AsyncEngine
+from libs.poll_loop import PollLoop
+from libs.router_supervisor import RouterSupervisor
+from libs.send_queue import SendQueue
+from libs.send_gateway import SendGateway
+from libs.seen_index import SeenIndex
+from libs.forward_sink import ForwardSink
+from libs.metrics import Metrics
 from libs import logger
 
-import time
+import atexit
+import sys
 
 
-client = None
+# History subcommand (the router is not used)
+if len(sys.argv) > 1 and sys.argv[1] == "history":
+    sys.exit(HistoryCli.main(sys.argv[2:]))
+
 config = ConfigParser.get_config()
-history = AppHistory.load_history()
-
-while True:
-    try:
-        client = HuaweiWrapper.api_connection_loop(client, config["ROUTER_URI"]) # type: ignore
-        last_sms = HuaweiWrapper.get_last_sms(client, config["CONTACTS"], True, False) # type: ignore
-
-        # Checks if the last SMS is properly received
-        if type(last_sms) is dict or last_sms is None:
-            # Main SMS forwarding function
-            HuaweiWrapper.sms_forwarder(
-                client,
-                last_sms,
-                config["FORWARDERS"] # type: ignore
-            )
-
-            # Waits for 1 second to prevent the router from crashing
-            time.sleep(1)
-
-            # Main SMS replying function
-            HuaweiWrapper.sms_replier(
-                client,
-                last_sms,
-                config["REPLIERS"] # type: ignore
-            )
-
-            # Saves the history every loop
-            if history:
-                AppHistory.save_history()
-        else:
-            # Disconnects from the router if the last SMS cannot be returned
-            if last_sms == ErrorCodes.SMS_CANNOT_BE_RETURNED:
-                    HuaweiWrapper.disconnect(client, False)
-                    client = None
-
-        time.sleep(config["ROUTER_LOOP_SLEEP"]) # type: ignore
-
-    # Disconnect from the router if possible
-    except KeyboardInterrupt:
-        HuaweiWrapper.disconnect(client)
-    except Exception as err:
-        logger.critical(f"Something went wrong!\n{err}")
-        HuaweiWrapper.disconnect(client)
+
+# Multi-router mode ("routers" section), every router is named
+is_multi_router = config["ROUTER_NAME"] != ""
+
+history = AppHistory.load_history(
+    config["HISTORY_FLUSH_INTERVAL"], # type: ignore
+    config["HISTORY_FLUSH_COUNT"], # type: ignore
+    config["HISTORY_HOT_WINDOW"], # type: ignore
+    [router["ROUTER_NAME"] for router in config["ROUTERS"]] # type: ignore
+)
+
+# Persistent dedup of the received SMS
+seen_index = SeenIndex(
+    SeenIndex.SEEN_PATH,
+    config["SEEN_CAPACITY"], # type: ignore
+    config["SEEN_MAX_AGE"] * 86400 # type: ignore
+)
+
+if seen_index.load():
+    HuaweiWrapper.seen_index = seen_index
+    Metrics.register_gauge("seen_sms", seen_index.__len__)
+else:
+    logger.warning("The seen SMS index is disabled, a SMS could be forwarded twice after a restart")
+
+# Metrics endpoint & summary (optional)
+if config["METRICS_PORT"] != 0:
+    Metrics.start_server(config["METRICS_HOST"], config["METRICS_PORT"]) # type: ignore
+
+if config["METRICS_SUMMARY_INTERVAL"] > 0: # type: ignore
+    Metrics.start_summary(config["METRICS_SUMMARY_INTERVAL"]) # type: ignore
+
+# Non-SMS forwarding sinks (own worker each), the queued SMS are delivered when the app exits
+for sink_name, sink_settings in config["SINKS"].items(): # type: ignore
+    sink = ForwardSink.from_config(sink_settings)
+    sink.start()
+    atexit.register(sink.stop)
+
+    HuaweiWrapper.sinks[sink_name] = sink
+
+# Hot reload of the contacts, forwarders, templates & repliers
+config_watcher = ConfigWatcher(config, config["APP_CONFIG_WATCH"]) # type: ignore
+config_watcher.start()
+
+if is_multi_router:
+    RouterSupervisor.run(config, history, config_watcher)
+else:
+    send_queue = SendQueue(
+        SendQueue.OUTBOX_PATH,
+        SendQueue.DEAD_LETTER_PATH,
+        config["ROUTER_SEND_RATE"], # type: ignore
+        config["ROUTER_SEND_BURST"], # type: ignore
+        config["OUTBOX_MAX_ATTEMPTS"], # type: ignore
+        config["OUTBOX_RETRY_DELAY"] # type: ignore
+    )
+    send_queue.load()
+
+    Metrics.register_gauge("outbox_size", lambda: len(send_queue))
+
+    # Send requests of the other services (queued)
+    if config["GATEWAY_PORT"] != 0:
+        SendGateway(config, {"": send_queue}).start(config["GATEWAY_HOST"], config["GATEWAY_PORT"]) # type: ignore
+
+    # Polling engine selection
+    if config["APP_ENGINE"] == "async":
+        AsyncEngine.run(config, history, send_queue)
+    else:
+        PollLoop.run(config, history, send_queue)
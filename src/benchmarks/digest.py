@@ -0,0 +1,110 @@
+"""
+Digest benchmark, a burst of SMS is received by a local mock router and forwarded by the polling loop
+(PollLoop.poll_once()), with and without a digest window on the forwarders (see SmsDigest).
+
+Reports the send requests made to the router, the SMS inside the router sent box, their segments
+and the time until the whole burst is forwarded.
+
+Usage (from /src):
+    python -m benchmarks.digest --messages 50 --forwarders 3 --window 2
+"""
+
+from benchmarks.mock_router import MockRouter
+from libs.router_session import RouterSession
+from libs.config_parser import ConfigParser
+from libs.routing_table import RoutingTable
+from libs.app_history import AppHistory
+from libs.sms_template import SmsEncoding
+from libs.send_queue import SendQueue
+from libs.sms_digest import SmsDigest
+from libs.poll_loop import PollLoop
+from libs import logger
+
+import tempfile
+import argparse
+import logging
+import time
+import os
+
+
+def run(args: argparse.Namespace, window: float) -> None:
+    mock_router = MockRouter(latency=args.latency, local_max=max(args.messages, 500)).start()
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+
+    forwarders = {f"+3370000{i:04d}": [] for i in range(args.forwarders)}
+    digests = {
+        forwarder: ConfigParser.parse_digest({"digest": window, "digest_max": args.messages}, forwarder)
+        for forwarder in forwarders
+    } if window > 0 else {}
+
+    config = {
+        "ROUTER_NAME": "",
+        "ROUTER_BATCH_SIZE": 20,
+        "ROUTER_SEND_WORKERS": 1,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": digests,
+        "ROUTING": RoutingTable({}, forwarders, {})
+    }
+    send_queue = SendQueue(
+        os.path.join(temp_dir, "outbox.jsonl"),
+        os.path.join(temp_dir, "dead_letter.jsonl"),
+        args.send_rate,
+        args.send_rate
+    )
+    digest = SmsDigest(config, os.path.join(temp_dir, "digest.jsonl"), send_queue)
+    session = RouterSession(mock_router.uri, 3600)
+
+    # Provider campaign, the SMS arrive during the first polling iterations
+    start_time = time.perf_counter()
+    received_count = 0
+
+    while received_count < args.messages or len(digest) > 0 or len(send_queue) > 0:
+        if received_count < args.messages:
+            mock_router.add_burst(min(args.per_poll, args.messages - received_count))
+            received_count = min(received_count + args.per_poll, args.messages)
+
+        PollLoop.poll_once(session, config, False, send_queue, digest=digest)
+
+        if time.perf_counter() - start_time > args.timeout:
+            logger.warning("Timeout reached")
+            break
+
+        time.sleep(min(args.interval, digest.wait_time()))
+
+    elapsed_time = time.perf_counter() - start_time
+
+    send_requests = mock_router.request_counts.get("/api/sms/send-sms", 0)
+    segments = sum(SmsEncoding.count_segments(sms["Content"]) for sms in mock_router.sent_box.values())
+
+    print(
+        f"{'off' if window == 0 else f'{window:.0f}s':>7} {send_requests:>10} {len(mock_router.sent_box):>9} "
+        f"{segments:>9} {elapsed_time:>8.2f}s"
+    )
+
+    mock_router.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Digest benchmark (mock router)")
+    parser.add_argument("--messages", type=int, default=50, help="Number of SMS of the burst")
+    parser.add_argument("--per-poll", type=int, default=5, help="Number of SMS received between two polling iterations")
+    parser.add_argument("--forwarders", type=int, default=3, help="Number of forwarders (all whitelisted)")
+    parser.add_argument("--window", type=float, default=2, help="Digest window (in seconds)")
+    parser.add_argument("--interval", type=float, default=0.1, help="Delay between two polling iterations (in seconds)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Router response delay (in seconds)")
+    parser.add_argument("--send-rate", type=float, default=1000, help="Send rate limit (requests/sec)")
+    parser.add_argument("--timeout", type=float, default=120, help="Max duration of a run (in seconds)")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    # Isolated history
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+    AppHistory.HISTORY_PATH = os.path.join(temp_dir, "history.jsonl")
+    AppHistory.LEGACY_HISTORY_PATH = os.path.join(temp_dir, "history.json")
+    AppHistory.load_history()
+
+    print(f"{'Digest':>7} {'Send reqs':>10} {'Sent SMS':>9} {'Segments':>9} {'Duration':>9}")
+
+    for window in (0, args.window):
+        run(args, window)
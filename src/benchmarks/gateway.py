@@ -0,0 +1,153 @@
+"""
+Send gateway benchmark, concurrent clients post SMS to the gateway (see SendGateway) which are sent
+by a polling loop against a local mock router, with and without batching of the identical contents.
+
+Reports the accepted requests/sec, the p50/p99 request latency, the time until every SMS is inside
+the router sent box and the number of send requests made to the router.
+
+Usage (from /src):
+    python -m benchmarks.gateway --clients 8 --requests 50
+"""
+
+from benchmarks.mock_router import MockRouter
+from libs.router_session import RouterSession
+from libs.send_gateway import SendGateway
+from libs.routing_table import RoutingTable
+from libs.send_queue import SendQueue
+from libs.poll_loop import PollLoop
+from libs import logger
+
+import http.client
+import threading
+import tempfile
+import argparse
+import logging
+import json
+import time
+import os
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    if len(values) == 0:
+        return 0
+
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def client_loop(port: int, request_count: int, client_index: int, identical: bool, latencies: list[float]) -> None:
+    """
+    Posts SMS on a keep-alive connection (alert-like contents, shared by every client if identical).
+    """
+
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+
+    for i in range(request_count):
+        content = f"Alert #{i}: disk usage above 90%" if identical else f"Alert #{client_index}-{i}"
+        body = json.dumps({"to": f"+3370000{client_index:04d}", "content": content})
+
+        start_time = time.perf_counter()
+        connection.request("POST", "/sms", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start_time)
+
+        if response.status != 202:
+            logger.warning(f"Request refused ({response.status})")
+
+    connection.close()
+
+
+def run(args: argparse.Namespace, batch_window: float, identical: bool) -> None:
+    mock_router = MockRouter(latency=args.latency).start()
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+
+    config = {
+        "ROUTER_NAME": "",
+        "ROUTER_BATCH_SIZE": 20,
+        "ROUTER_SEND_WORKERS": 1,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "ROUTING": RoutingTable({}, {}, {}),
+        "GATEWAY_TOKEN": "",
+        "GATEWAY_MAX_PENDING": 100000,
+        "GATEWAY_BATCH_WINDOW": batch_window
+    }
+    send_queue = SendQueue(
+        os.path.join(temp_dir, "outbox.jsonl"),
+        os.path.join(temp_dir, "dead_letter.jsonl"),
+        args.send_rate,
+        args.send_rate
+    )
+
+    gateway = SendGateway(config, {"": send_queue})
+    gateway.start("127.0.0.1", 0)
+    port = gateway.server.server_address[1] # type: ignore
+
+    # Polling loop of the app (single router session)
+    session = RouterSession(mock_router.uri, 3600)
+    stop_event = threading.Event()
+
+    def poll_loop() -> None:
+        while not stop_event.is_set():
+            PollLoop.poll_once(session, config, False, send_queue)
+            send_queue.wait(1)
+
+    poll_thread = threading.Thread(target=poll_loop, daemon=True)
+    poll_thread.start()
+
+    latencies: list[float] = []
+    expected_sent = args.clients * args.requests
+    start_time = time.perf_counter()
+
+    client_threads = [
+        threading.Thread(target=client_loop, args=(port, args.requests, i, identical, latencies))
+        for i in range(args.clients)
+    ]
+
+    for client_thread in client_threads:
+        client_thread.start()
+
+    for client_thread in client_threads:
+        client_thread.join()
+
+    accept_time = time.perf_counter() - start_time
+
+    while len(mock_router.sent_box) < expected_sent and time.perf_counter() - start_time < args.timeout:
+        time.sleep(0.005)
+
+    sent_time = time.perf_counter() - start_time
+
+    stop_event.set()
+    send_queue.wake()
+    poll_thread.join()
+    gateway.stop()
+
+    send_requests = mock_router.request_counts.get("/api/sms/send-sms", 0)
+
+    print(
+        f"{batch_window * 1000:>6.0f}ms {'same' if identical else 'distinct':>9} "
+        f"{expected_sent / accept_time:>10.0f} "
+        f"{percentile(latencies, 0.5) * 1000:>7.1f} {percentile(latencies, 0.99) * 1000:>7.1f} "
+        f"{len(mock_router.sent_box):>6}/{expected_sent:<6} {sent_time:>7.2f}s {send_requests:>9}"
+    )
+
+    mock_router.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send gateway benchmark (mock router)")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=50, help="Number of SMS posted by each client")
+    parser.add_argument("--latency", type=float, default=0.005, help="Router response delay (in seconds)")
+    parser.add_argument("--send-rate", type=float, default=1000, help="Send rate limit (requests/sec)")
+    parser.add_argument("--timeout", type=float, default=120, help="Max duration of a run (in seconds)")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    print(f"{'Window':>8} {'Contents':>9} {'Accepted/s':>10} {'p50 ms':>7} {'p99 ms':>7} {'Sent':>13} {'Duration':>8} {'Send reqs':>9}")
+
+    for batch_window in (0, 0.05):
+        for identical in (False, True):
+            run(args, batch_window, identical)
@@ -0,0 +1,90 @@
+"""
+Idle polling benchmark, measures the router load of the polling loop while no SMS is received,
+with and without the unread counter probe (see InboxProbe), for a growing number of read SMS
+kept inside the router inbox.
+
+Reports the HTTP requests, the bytes returned by the router and the app CPU time per idle iteration.
+
+Usage (from /src):
+    python -m benchmarks.idle_poll --ticks 200
+"""
+
+from benchmarks.mock_router import MockRouter
+from libs.router_session import RouterSession
+from libs.send_queue import SendQueue
+from libs.routing_table import RoutingTable
+from libs.inbox_probe import InboxProbe
+from libs.poll_loop import PollLoop
+from libs import logger
+
+import tempfile
+import argparse
+import logging
+import time
+import os
+
+
+# Number of read SMS inside the inbox per run
+INBOX_SIZES = [0, 20, 200]
+
+
+def run(inbox_size: int, ticks: int, use_probe: bool) -> tuple[float, float, float]:
+    """
+    Returns the HTTP requests, the response kilobytes and the CPU time (in ms) per idle iteration.
+    """
+
+    mock_router = MockRouter(local_max=max(inbox_size, 500)).start()
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+
+    # Read SMS (already forwarded), the inbox stays idle
+    for index in mock_router.add_burst(inbox_size):
+        mock_router.inbox[index]["Smstat"] = "1"
+
+    config = {
+        "ROUTER_NAME": "",
+        "ROUTER_BATCH_SIZE": 20,
+        "ROUTER_SEND_WORKERS": 1,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "ROUTING": RoutingTable({}, {}, {})
+    }
+    send_queue = SendQueue(
+        os.path.join(temp_dir, "outbox.jsonl"),
+        os.path.join(temp_dir, "dead_letter.jsonl"),
+        1000,
+        1000
+    )
+    session = RouterSession(mock_router.uri, 3600)
+    probe = InboxProbe() if use_probe else None
+
+    # Login and first (full) list excluded
+    PollLoop.poll_once(session, config, False, send_queue, probe=probe)
+    mock_router.reset_stats()
+
+    cpu_start_time = time.process_time()
+
+    for _ in range(ticks):
+        PollLoop.poll_once(session, config, False, send_queue, probe=probe)
+
+    cpu_time = time.process_time() - cpu_start_time
+    requests = mock_router.total_requests() / ticks
+    kilobytes = mock_router.bytes_sent / ticks / 1024
+
+    mock_router.stop()
+
+    return requests, kilobytes, cpu_time / ticks * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Idle polling benchmark (mock router)")
+    parser.add_argument("--ticks", type=int, default=200, help="Number of idle iterations per run")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    print(f"{'Inbox':>6} {'Mode':>6} {'Requests/tick':>14} {'KB/tick':>9} {'CPU ms/tick':>12}")
+
+    for inbox_size in INBOX_SIZES:
+        for use_probe in (False, True):
+            requests, kilobytes, cpu_time = run(inbox_size, args.ticks, use_probe)
+            print(f"{inbox_size:>6} {'probe' if use_probe else 'list':>6} {requests:>14.2f} {kilobytes:>9.2f} {cpu_time:>12.2f}")
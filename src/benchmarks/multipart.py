@@ -0,0 +1,105 @@
+"""
+Multipart SMS benchmark, long SMS are received by a local mock router as separate parts (SmsType 2)
+and processed by the polling loop (PollLoop.poll_once()), with and without reassembly (see SmsAssembler).
+
+Reports the router send requests, the forwarded SMS, the history records and the replies of a replier
+whose filter is split across two parts.
+
+Usage (from /src):
+    python -m benchmarks.multipart --messages 20 --forwarders 2
+"""
+
+from benchmarks.mock_router import MockRouter
+from libs.router_session import RouterSession
+from libs.sms_assembler import SmsAssembler
+from libs.routing_table import RoutingTable
+from libs.reply_matcher import ReplyMatcher
+from libs.app_history import AppHistory
+from libs.send_queue import SendQueue
+from libs.poll_loop import PollLoop
+from libs import logger
+
+import tempfile
+import argparse
+import logging
+import time
+import os
+
+
+SENDER = "+33600000000"
+FILTER = "Reply CONTINUE to get 20 more GB"
+
+
+def run(args: argparse.Namespace, reassembly: bool) -> None:
+    mock_router = MockRouter(latency=args.latency, local_max=max(args.messages * 4, 500)).start()
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+
+    # Isolated history
+    AppHistory.HISTORY_PATH = os.path.join(temp_dir, "history.jsonl")
+    AppHistory.LEGACY_HISTORY_PATH = os.path.join(temp_dir, "history.json")
+    AppHistory.load_history()
+
+    forwarders = {f"+3370000{i:04d}": [] for i in range(args.forwarders)}
+    repliers = {SENDER: ReplyMatcher([{"filter": FILTER, "reply": "CONTINUE"}])}
+
+    config = {
+        "ROUTER_NAME": "",
+        "ROUTER_BATCH_SIZE": 20,
+        "ROUTER_SEND_WORKERS": 1,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "ROUTING": RoutingTable({}, forwarders, repliers)
+    }
+    send_queue = SendQueue(
+        os.path.join(temp_dir, "outbox.jsonl"),
+        os.path.join(temp_dir, "dead_letter.jsonl"),
+        args.send_rate,
+        args.send_rate
+    )
+    assembler = SmsAssembler(os.path.join(temp_dir, "multipart.jsonl")) if reassembly else None
+    session = RouterSession(mock_router.uri, 3600)
+
+    # 3 parts per SMS, the replier filter is split between the first two parts
+    for i in range(args.messages):
+        header = f"Provider notice #{i}: "
+        content = header + "x" * (140 - len(header)) + FILTER + " " + "y" * 150
+        mock_router.add_multipart(SENDER, content)
+
+    start_time = time.perf_counter()
+
+    while len(mock_router.inbox) > 0 and any(sms["Smstat"] == "0" for sms in mock_router.inbox.values()):
+        PollLoop.poll_once(session, config, True, send_queue, assembler=assembler)
+
+    while len(send_queue) > 0 or (assembler is not None and len(assembler) > 0):
+        PollLoop.poll_once(session, config, True, send_queue, assembler=assembler)
+        time.sleep(0.01)
+
+    elapsed_time = time.perf_counter() - start_time
+
+    send_requests = mock_router.request_counts.get("/api/sms/send-sms", 0)
+    replies = sum(1 for sms in mock_router.sent_box.values() if sms["Content"] == "CONTINUE")
+    forwarded = len(mock_router.sent_box) - replies
+    history_records = sum(1 for _ in AppHistory.iter_history())
+
+    print(
+        f"{'on' if reassembly else 'off':>10} {send_requests:>10} {forwarded:>10} {history_records:>8} "
+        f"{replies:>4}/{args.messages:<4} {elapsed_time:>8.2f}s"
+    )
+
+    mock_router.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multipart SMS benchmark (mock router)")
+    parser.add_argument("--messages", type=int, default=20, help="Number of long SMS (3 parts each)")
+    parser.add_argument("--forwarders", type=int, default=2, help="Number of forwarders (all whitelisted)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Router response delay (in seconds)")
+    parser.add_argument("--send-rate", type=float, default=1000, help="Send rate limit (requests/sec)")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    print(f"{'Reassembly':>10} {'Send reqs':>10} {'Forwarded':>10} {'History':>8} {'Replies':>9} {'Duration':>9}")
+
+    for reassembly in (False, True):
+        run(args, reassembly)
@@ -0,0 +1,78 @@
+"""
+Replier matching benchmark, compares the previous linear filter scan
+with the compiled ReplyMatcher for a growing number of rules.
+
+Usage (from /src):
+    python -m benchmarks.replier
+"""
+
+from libs.reply_matcher import ReplyMatcher
+
+import random
+import string
+import time
+
+
+# Number of rules per run and number of matched SMS per run
+RULE_COUNTS = [10, 100, 1000, 5000]
+SMS_COUNT = 2000
+
+
+def random_word(length: int) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+
+def linear_match(messages: list[dict], sms_content: str) -> list[str]:
+    """
+    Previous HuaweiWrapper.sms_replier() behavior (lowercased on every message).
+    """
+
+    sms_content = sms_content.lower()
+
+    for message in messages:
+        if message["filter"].lower() in sms_content:
+            return [message["reply"]]
+
+    return []
+
+
+def run(rule_count: int) -> tuple[float, float]:
+    """
+    Returns the average matching time per SMS (in microseconds) of both implementations.
+    """
+
+    messages = [{"filter": f"{random_word(6)} {random_word(8)}", "reply": random_word(5)} for _ in range(rule_count)]
+    matcher = ReplyMatcher(messages)
+
+    # One SMS out of ten contains a filter
+    sms_contents = []
+
+    for i in range(SMS_COUNT):
+        words = [random_word(random.randint(3, 9)) for _ in range(25)]
+
+        if i % 10 == 0:
+            words.insert(random.randint(0, len(words)), random.choice(messages)["filter"])
+
+        sms_contents.append(" ".join(words))
+
+    start_time = time.perf_counter()
+    for sms_content in sms_contents:
+        linear_match(messages, sms_content)
+    linear_time = (time.perf_counter() - start_time) / SMS_COUNT * 1e6
+
+    start_time = time.perf_counter()
+    for sms_content in sms_contents:
+        matcher.match(sms_content)
+    compiled_time = (time.perf_counter() - start_time) / SMS_COUNT * 1e6
+
+    return linear_time, compiled_time
+
+
+if __name__ == "__main__":
+    random.seed(0)
+
+    print(f"{'Rules':>8} {'Linear (us/SMS)':>18} {'Compiled (us/SMS)':>20}")
+
+    for rule_count in RULE_COUNTS:
+        linear_time, compiled_time = run(rule_count)
+        print(f"{rule_count:>8} {linear_time:>18.1f} {compiled_time:>20.1f}")
@@ -0,0 +1,75 @@
+"""
+Routing benchmark, compares the previous per-SMS contact lookup and linear whitelist scans
+with the compiled RoutingTable for a growing number of contacts.
+
+Usage (from /src):
+    python -m benchmarks.routing
+"""
+
+from libs.routing_table import RoutingTable
+
+import random
+import time
+
+
+# Number of contacts (also whitelisted by each forwarder) per run and number of routed SMS per run
+CONTACT_COUNTS = [100, 1000, 10000, 50000]
+FORWARDER_COUNT = 5
+SMS_COUNT = 5000
+
+
+def random_phone_number() -> str:
+    return "+336" + "".join(random.choices("0123456789", k=8))
+
+
+def linear_route(contacts: dict[str, str], forwarders: dict[str, list[str]], sender: str) -> list[str]:
+    """
+    Previous HuaweiWrapper behavior (formatted number, then a whitelist scan per forwarder).
+    """
+
+    phone_number = sender.replace(" ", "")
+    contacts.get(phone_number)
+
+    return [
+        forwarder for forwarder, whitelist in forwarders.items()
+        if len(whitelist) == 0 or sender in whitelist
+    ]
+
+
+def run(contact_count: int) -> tuple[float, float]:
+    """
+    Returns the average routing time per SMS (in microseconds) of both implementations.
+    """
+
+    contacts = {random_phone_number(): f"Contact {i}" for i in range(contact_count)}
+    phone_numbers = list(contacts.keys())
+    forwarders = {random_phone_number(): phone_numbers for _ in range(FORWARDER_COUNT)}
+    routing = RoutingTable(contacts, forwarders, {})
+
+    # Half of the SMS are sent by contacts, the other half by unknown numbers
+    senders = [
+        random.choice(phone_numbers) if i % 2 == 0 else random_phone_number()
+        for i in range(SMS_COUNT)
+    ]
+
+    start_time = time.perf_counter()
+    for sender in senders:
+        linear_route(contacts, forwarders, sender)
+    linear_time = (time.perf_counter() - start_time) / SMS_COUNT * 1e6
+
+    start_time = time.perf_counter()
+    for sender in senders:
+        routing.route(sender)
+    compiled_time = (time.perf_counter() - start_time) / SMS_COUNT * 1e6
+
+    return linear_time, compiled_time
+
+
+if __name__ == "__main__":
+    random.seed(0)
+
+    print(f"{'Contacts':>8} {'Linear (us/SMS)':>18} {'Compiled (us/SMS)':>20}")
+
+    for contact_count in CONTACT_COUNTS:
+        linear_time, compiled_time = run(contact_count)
+        print(f"{contact_count:>8} {linear_time:>18.1f} {compiled_time:>20.1f}")
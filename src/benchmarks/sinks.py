@@ -0,0 +1,147 @@
+"""
+Forwarding sink benchmark, SMS are forwarded (HuaweiWrapper.sms_forwarder()) to a webhook sink
+served by a slow local HTTP server, to measure the time spent by the polling side.
+
+Reports the forwarding time per SMS (polling side), the time until every SMS is received by
+the webhook and the number of webhook requests, with and without batching.
+
+Usage (from /src):
+    python -m benchmarks.sinks --messages 200 --delay 0.05
+"""
+
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.forward_sink import ForwardSink
+from libs.routing_table import RoutingTable
+from libs.app_history import AppHistory
+from libs import logger
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import threading
+import tempfile
+import argparse
+import logging
+import json
+import time
+import os
+
+
+class WebhookServer:
+    """
+    Local webhook answering every request after a delay (slow remote service).
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.request_count = 0
+        self.received: list[dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+        webhook = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(webhook.delay)
+
+                with webhook.lock:
+                    webhook.request_count += 1
+                    webhook.received.extend(json.loads(body)["messages"])
+
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/sms"
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_case(args: argparse.Namespace, batch_size: int) -> None:
+    webhook = WebhookServer(args.delay)
+
+    sink = ForwardSink.from_config({
+        "name": f"bench{batch_size}",
+        "type": "webhook",
+        "url": webhook.url,
+        "batch_size": batch_size,
+        "batch_delay": args.batch_delay,
+        "timeout": 10,
+        "max_attempts": 3,
+        "retry_delay": 0.1,
+        "queue_size": 10000
+    })
+    sink.start()
+
+    HuaweiWrapper.sinks = {sink.name: sink}
+
+    forwarders = {f"{ForwardSink.FORWARDER_PREFIX}{sink.name}": []}
+    routing = RoutingTable({}, forwarders, {})
+
+    # Timed run (the client is not used, no SMS recipient)
+    start_time = time.perf_counter()
+
+    for i in range(args.messages):
+        HuaweiWrapper.sms_forwarder(None, { # type: ignore
+            "Index": str(50000 + i),
+            "Phone": "+33612345678",
+            "Content": f"Sink message #{i}",
+            "Date": "2024-01-01 12:00:00",
+            "Smstat": "0",
+            "Sca": "",
+            "SaveType": "4",
+            "Priority": "0",
+            "SmsType": "1"
+        }, routing)
+
+    forward_time = time.perf_counter() - start_time
+
+    while len(webhook.received) < args.messages and time.perf_counter() - start_time < args.timeout:
+        time.sleep(0.005)
+
+    delivery_time = time.perf_counter() - start_time
+
+    sink.stop()
+    webhook.stop()
+
+    print(f"Batch size {batch_size}:")
+    print(f"    Forwarding time:   {forward_time / args.messages * 1000:.3f}ms per SMS (polling side)")
+    print(f"    Delivered:         {len(webhook.received)}/{args.messages} in {delivery_time:.2f}s")
+    print(f"    Webhook requests:  {webhook.request_count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forwarding sink benchmark (slow local webhook)")
+    parser.add_argument("--messages", type=int, default=200, help="Number of forwarded SMS")
+    parser.add_argument("--delay", type=float, default=0.05, help="Webhook response delay (in seconds)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Max number of SMS per webhook request")
+    parser.add_argument("--batch-delay", type=float, default=0.05, help="Batch collection delay (in seconds)")
+    parser.add_argument("--timeout", type=float, default=120, help="Max duration of a run (in seconds)")
+    parser.add_argument("--verbose", action="store_true", help="Shows the app logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    # Isolated history and sink files
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+    AppHistory.HISTORY_PATH = os.path.join(temp_dir, "history.jsonl")
+    AppHistory.LEGACY_HISTORY_PATH = os.path.join(temp_dir, "history.json")
+    AppHistory.load_history()
+    ForwardSink.PENDING_PATH = os.path.join(temp_dir, "sink.jsonl")
+    ForwardSink.DEAD_LETTER_PATH = os.path.join(temp_dir, "sink_dead_letter.jsonl")
+
+    for batch_size in sorted({1, args.batch_size}):
+        run_case(args, batch_size)
@@ -0,0 +1,174 @@
+"""
+End-to-end throughput benchmark, drives the polling loops (PollLoop.poll_once(), through
+the RouterSupervisor) against local mock routers, from the SMS reception to its forwarding.
+
+Reports the messages/sec, the p50/p99 receive-to-forward latency, the HTTP requests
+per message, the CPU time and the peak RSS of the process.
+
+Usage (from /src):
+    python -m benchmarks.throughput --messages 200 --forwarders 3 --latency 0.01
+    python -m benchmarks.throughput --routers 4
+"""
+
+from benchmarks.mock_router import MockRouter
+from libs.router_supervisor import RouterSupervisor
+from libs.app_history import AppHistory
+from libs.routing_table import RoutingTable
+from libs import logger
+
+import threading
+import tempfile
+import argparse
+import resource
+import logging
+import time
+import os
+import re
+
+
+BURST_CONTENT_REGEX = re.compile(r"Burst message #(\d+)")
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    if len(values) == 0:
+        return 0
+
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def run(args: argparse.Namespace) -> None:
+    mock_routers = [
+        MockRouter(latency=args.latency, error_rate=args.error_rate, local_max=max(args.messages, 500)).start()
+        for _ in range(args.routers)
+    ]
+    router_names = [f"router{i + 1}" for i in range(args.routers)]
+    temp_dir = tempfile.mkdtemp(prefix="sms_benchmark_")
+
+    # Isolated history (one partition per router)
+    AppHistory.HISTORY_PATH = os.path.join(temp_dir, "history.jsonl")
+    AppHistory.LEGACY_HISTORY_PATH = os.path.join(temp_dir, "history.json")
+    history = AppHistory.load_history(partitions=router_names)
+
+    forwarders = {f"+3370000{i:04d}": [] for i in range(args.forwarders)}
+    routers = [
+        {
+            "ROUTER_NAME": name,
+            "ROUTER_URI": mock_router.uri,
+            "ROUTER_HEARTBEAT": 60,
+            "ROUTER_LOOP_SLEEP": 0.01,
+            "ROUTER_LOOP_MIN": 0.01,
+            "ROUTER_LOOP_MAX": 0.05,
+            "ROUTER_LOOP_BACKOFF": 2,
+            "ROUTER_BATCH_SIZE": args.batch_size,
+            "ROUTER_PROBE": not args.no_probe,
+            "ROUTER_SEND_WORKERS": args.send_workers,
+            "ROUTER_SEND_RATE": args.send_rate,
+            "ROUTER_SEND_BURST": args.send_burst
+        }
+        for name, mock_router in zip(router_names, mock_routers)
+    ]
+    config = {
+        "CONTACTS": {},
+        "FORWARDERS": forwarders,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "REPLIERS": {},
+        "ROUTING": RoutingTable({}, forwarders, {}),
+        "OUTBOX_MAX_ATTEMPTS": 5,
+        "OUTBOX_RETRY_DELAY": 1,
+        "HOUSEKEEPING_ENABLED": False,
+        "DELIVERY_ENABLED": False,
+        "MULTIPART_ENABLED": False,
+        "ROUTERS": routers
+    }
+
+    # Every router is polled by its own loop, like the multi-router mode of the app
+    supervisor = RouterSupervisor(
+        config,
+        history,
+        os.path.join(temp_dir, "outbox.jsonl"),
+        os.path.join(temp_dir, "dead_letter.jsonl")
+    )
+
+    # Timed run
+    cpu_start_time = time.process_time()
+    start_time = time.perf_counter()
+
+    for mock_router in mock_routers:
+        mock_router.add_burst(args.messages)
+
+    supervisor_thread = threading.Thread(target=supervisor.run_loops, daemon=True)
+    supervisor_thread.start()
+
+    expected_sent = args.messages * args.forwarders * args.routers
+
+    while sum(len(mock_router.sent_box) for mock_router in mock_routers) < expected_sent:
+        if time.perf_counter() - start_time > args.timeout:
+            logger.warning("Timeout reached")
+            break
+
+        time.sleep(0.005)
+
+    elapsed_time = time.perf_counter() - start_time
+    cpu_time = time.process_time() - cpu_start_time
+
+    supervisor.stop()
+    supervisor_thread.join()
+
+    # Receive-to-forward latency of every (SMS, forwarder) pair
+    latencies = []
+    request_counts: dict[str, int] = {}
+
+    for mock_router in mock_routers:
+        for sent_index, sms in mock_router.sent_box.items():
+            match = BURST_CONTENT_REGEX.search(sms["Content"])
+
+            if match is not None:
+                latencies.append(mock_router.sent_at[sent_index] - mock_router.received_at[int(match.group(1))])
+
+        for endpoint, count in mock_router.request_counts.items():
+            request_counts[endpoint] = request_counts.get(endpoint, 0) + count
+
+    forwarded = len(latencies) // max(args.forwarders, 1)
+    http_requests = sum(request_counts.values())
+    http_bytes = sum(mock_router.bytes_sent for mock_router in mock_routers)
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"Messages:          {forwarded}/{args.messages * args.routers} forwarded to {args.forwarders} forwarders ({args.routers} routers)")
+    print(f"Throughput:        {forwarded / elapsed_time:.1f} messages/sec ({elapsed_time:.2f}s)")
+    print(f"Latency p50/p99:   {percentile(latencies, 0.5) * 1000:.1f}ms / {percentile(latencies, 0.99) * 1000:.1f}ms")
+    print(f"HTTP requests:     {http_requests} ({http_requests / max(forwarded, 1):.2f} per message)")
+    print(f"HTTP bytes:        {http_bytes / 1024:.1f} KB")
+    print(f"CPU time:          {cpu_time:.2f}s ({cpu_time / max(forwarded, 1) * 1000:.2f}ms per message)")
+    print(f"Peak RSS:          {peak_rss:.1f} MB")
+
+    for endpoint, count in sorted(request_counts.items()):
+        print(f"    {endpoint:<28} {count}")
+
+    for mock_router in mock_routers:
+        mock_router.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark (mock router)")
+    parser.add_argument("--messages", type=int, default=200, help="Number of SMS received by each router in a single burst")
+    parser.add_argument("--routers", type=int, default=1, help="Number of mock routers (multi-router mode)")
+    parser.add_argument("--forwarders", type=int, default=3, help="Number of forwarders (all whitelisted)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Router response delay (in seconds)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Ratio of router requests failing with \"system busy\"")
+    parser.add_argument("--batch-size", type=int, default=20, help="Inbox page size")
+    parser.add_argument("--send-rate", type=float, default=1000, help="Send rate limit (requests/sec)")
+    parser.add_argument("--send-burst", type=int, default=1000, help="Send burst limit")
+    parser.add_argument("--send-workers", type=int, default=1)
+    parser.add_argument("--no-probe", action="store_true", help="Lists the inbox on every iteration (no unread counter check)")
+    parser.add_argument("--timeout", type=float, default=120, help="Max duration of the run (in seconds)")
+    parser.add_argument("--verbose", action="store_true", help="Shows the app logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    run(args)
@@ -1,15 +1,29 @@
 from libs import logger
-from typing import Optional
+from libs.history_store import HistoryStore
+from libs.metrics import Metrics
+from typing import Iterator, Optional
 from copy import deepcopy
 
-import json
+import threading
+import atexit
+import time
 import sys
 import os
 
 
 class AppHistory:
-    HISTORY_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/history.json")
-    history: dict[str, dict[str, str]] = {}
+    HISTORY_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/history.jsonl")
+    LEGACY_HISTORY_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/history.json")
+    store: Optional[HistoryStore] = None
+
+    # Per router history partitions (multi-router mode), the default store uses the "" key
+    stores: dict[str, HistoryStore] = {}
+    lock = threading.RLock()
+
+    # Write coalescing, see AppHistory.save_history()
+    FLUSH_INTERVAL: float = 30
+    FLUSH_COUNT = 10
+    last_save_time = 0.0
 
 
     @staticmethod
@@ -45,84 +59,252 @@ class AppHistory:
             except KeyError as err:
                 logger.error(f"SMS could not be parsed:\n{err}")
 
-            # Add to the history general dict
-            AppHistory.history[sms_id] = sep_sms
+            # Add to the history partition of the router (written by AppHistory.save_history())
+            store = AppHistory.stores.get(sep_sms.get("Router", ""), AppHistory.store)
+
+            if store is not None:
+                with AppHistory.lock:
+                    store.add({"Index": sms_id, **sep_sms})
 
 
     @staticmethod
-    def save_history() -> bool:
+    def set_delivery_states(key: str, states: dict[str, str], partition: str = "") -> bool:
         """
-        Saves the history dict into a json file.
+        Records the delivery state of the SMS forwarded (or replied) from a received SMS.
 
-        Note:
-            Also creates the JSON "history" file if not found.
+        Args:
+            key (str): History key of the received SMS (see HistoryStore.get_key()).
+            states (dict[str, str]): Delivery state per recipient ("sent", "failed" or "unconfirmed").
+            partition (str, optional): Name of the router (multi-router mode).
 
         Returns:
-            bool: True if the history has been correctly saved.
+            bool: True if the SMS is inside the history.
         """
 
-        # Directory creation
-        if not os.path.exists(os.path.dirname(AppHistory.HISTORY_PATH)):
-            try:
-                os.makedirs(os.path.dirname(AppHistory.HISTORY_PATH))
-            except OSError as err:
-                logger.error(f"History directory could not be created:\n{err}")
+        store = AppHistory.stores.get(partition, AppHistory.store)
+
+        if store is None:
+            return False
+
+        with AppHistory.lock:
+            record = store.get(key)
+
+            if record is None:
+                return False
+
+            return store.update(key, {"Delivery": {**record.get("Delivery", {}), **states}}) # type: ignore
+
+
+    @staticmethod
+    def get_partition_path(path: str, partition: str) -> str:
+        """
+        Returns the path of a partition file ("logs/history.jsonl" -> "logs/history.<partition>.jsonl").
+        """
+
+        if partition == "":
+            return path
+
+        root, ext = os.path.splitext(path)
+        return f"{root}.{partition}{ext}"
+
+
+    @staticmethod
+    def get_partitions() -> list[str]:
+        """
+        Returns the names of the existing history partitions ("history.<partition>.jsonl" files).
+        """
 
-        # Detects file creation (prevents empty history dict catching)
-        file_exists = os.path.exists(AppHistory.HISTORY_PATH)
+        directory = os.path.dirname(AppHistory.HISTORY_PATH)
+        root, ext = os.path.splitext(os.path.basename(AppHistory.HISTORY_PATH))
+        partitions = []
 
         try:
-            with open(AppHistory.HISTORY_PATH, "w+") as history_file:
-                # Empty history dict catch
-                if len(AppHistory.history) == 0:
-                    if file_exists:
-                        return False
+            for file_name in sorted(os.listdir(directory)):
+                if file_name.startswith(f"{root}.") and file_name.endswith(ext):
+                    partition = file_name[len(root) + 1:-len(ext)]
+
+                    if partition != "" and "." not in partition:
+                        partitions.append(partition)
+        except OSError:
+            pass
+
+        return partitions
+
+
+    @staticmethod
+    def get_sms(key: str, partition: str = "") -> Optional[dict[str, str]]:
+        """
+        Returns a SMS of the history from its key (read from the disk if not recently used).
+
+        Args:
+            key (str): History key of the SMS (see HistoryStore.get_key()).
+            partition (str, optional): Name of the router (multi-router mode).
+
+        Returns:
+            Optional[dict[str, str]]: The history record or None if not found.
+        """
+
+        store = AppHistory.stores.get(partition)
+
+        if store is None:
+            return None
+
+        with AppHistory.lock:
+            return store.get(key)
+
+
+    @staticmethod
+    def find_sms(keys: list[str], partition: str = "") -> dict[str, dict[str, str]]:
+        """
+        Returns multiple SMS of the history, the file is read at most once (see HistoryStore.find()).
+
+        Args:
+            keys (list[str]): History keys of the SMS, or of the parts of a reassembled SMS.
+            partition (str, optional): Name of the router (multi-router mode).
+
+        Returns:
+            dict[str, dict[str, str]]: The history records found per key.
+        """
+
+        store = AppHistory.stores.get(partition)
+
+        if store is None:
+            return {}
+
+        with AppHistory.lock:
+            return store.find(keys)
+
+
+    @staticmethod
+    def iter_history() -> Iterator[dict[str, str]]:
+        """
+        Streams every SMS of the history, from the oldest to the newest (partition by partition).
+
+        Yields:
+            dict[str, str]: The history records.
+        """
 
-                json.dump(AppHistory.history, history_file, indent=4)
+        for store in list(AppHistory.stores.values()):
+            yield from store.iter_records()
 
+
+    @staticmethod
+    def is_dirty() -> bool:
+        """
+        Returns True if the history contains records that are not saved yet.
+        """
+
+        return any(len(store.pending) > 0 for store in list(AppHistory.stores.values()))
+
+
+    @staticmethod
+    def save_history(force: bool = False) -> bool:
+        """
+        Appends the new history records to the JSON-lines file.
+
+        Note:
+            - Nothing is written if the history has no unsaved changes.
+            - Writes are coalesced, unless forced, the records are only written once
+            AppHistory.FLUSH_COUNT records are waiting or AppHistory.FLUSH_INTERVAL
+            seconds have passed since the last write.
+            - A history file is compacted once it holds too many superseded records
+            (updated records, see HistoryStore.should_compact()).
+
+        Args:
+            force (bool, optional): Writes the unsaved records without waiting (used on shutdown).
+
+        Returns:
+            bool: True if the history is correctly saved or if the write is deferred.
+        """
+
+        if AppHistory.store is None:
+            return False
+
+        with AppHistory.lock:
+            if not AppHistory.is_dirty():
                 return True
-        except FileNotFoundError as err:
-            logger.warning(f"History file could not be found:\n{err}")
-        except PermissionError as err:
-            logger.warning(f"History file could not be written:\n{err}")
 
-        return False
+            if not force:
+                pending_count = sum(len(store.pending) for store in AppHistory.stores.values())
+                elapsed_time = time.monotonic() - AppHistory.last_save_time
+
+                if pending_count < AppHistory.FLUSH_COUNT and elapsed_time < AppHistory.FLUSH_INTERVAL:
+                    return True
+
+            start_time = time.perf_counter()
+            is_saved = all([store.flush() for store in AppHistory.stores.values()])
+            Metrics.observe("save_history", time.perf_counter() - start_time)
+
+            if is_saved:
+                AppHistory.last_save_time = time.monotonic()
+
+                for store in AppHistory.stores.values():
+                    if store.should_compact():
+                        store.compact()
+
+        return is_saved
 
 
     @staticmethod
-    def load_history() -> bool:
+    def load_history(
+        flush_interval: float = 30,
+        flush_count: int = 10,
+        hot_window: int = 1000,
+        partitions: Optional[list[str]] = None
+    ) -> bool:
         """
-        Loads the history from the json file
-        into the AppHistory.history var (as a dict with SMS IDs).
+        Loads the most recent records of the history file (older records are read on demand).
 
         Note:
-            It also detects if the path exists and creates an empty file if not.
+            - It also detects if the path exists and creates an empty file if not.
+            - The legacy "history.json" file is migrated once if found.
+            - Only the most recent records are loaded (hot window), the other ones are read on demand.
+            - The unsaved records are written when the app exits.
+            - In the multi-router mode, each router has its own history file ("history.<router>.jsonl").
+
+        Args:
+            flush_interval (float, optional): Max delay before writing the new records (in seconds).
+            flush_count (int, optional): Max number of new records before writing them.
+            hot_window (int, optional): Max number of records kept in memory (per partition).
+            partitions (list[str], optional): Names of the routers (multi-router mode).
 
         Returns:
             bool: True if the history has been correctly loaded.
         """
 
-        # Creates the file if not initialized
-        if not os.path.exists(AppHistory.HISTORY_PATH):
-            history_state = AppHistory.save_history()
-            return history_state
+        AppHistory.FLUSH_INTERVAL = flush_interval
+        AppHistory.FLUSH_COUNT = flush_count
+        AppHistory.store = HistoryStore(AppHistory.HISTORY_PATH, hot_window)
+        AppHistory.stores = {"": AppHistory.store}
+        AppHistory.last_save_time = time.monotonic()
 
-        try:
-            with open(AppHistory.HISTORY_PATH, "r") as history_file:
-                try:
-                    AppHistory.history = json.load(history_file)
+        for partition in partitions or []:
+            if partition != "":
+                partition_path = AppHistory.get_partition_path(AppHistory.HISTORY_PATH, partition)
+                AppHistory.stores[partition] = HistoryStore(partition_path, hot_window)
 
-                    return True
-                except json.JSONDecodeError as err:
-                    # Empty files support (json.load() returns an error)
-                    AppHistory.history = {}
+        for store in AppHistory.stores.values():
+            if not store.load():
+                return False
 
-                    return True
-        except FileNotFoundError as err:
-            logger.warning(f"History file could not be found:\n{err}")
-        except PermissionError as err:
-            logger.warning(f"History file could not be read:\n{err}")
-        except Exception as err:
-            logger.error(f"History file could not be loaded:\n{err}")
-
-        return False
+        # One-time migration of the legacy history file
+        if os.path.exists(AppHistory.LEGACY_HISTORY_PATH):
+            if not AppHistory.store.migrate_json(AppHistory.LEGACY_HISTORY_PATH):
+                return False
+
+        # History size (the files are not read to count the records)
+        Metrics.register_gauge(
+            "history_file_bytes",
+            lambda: sum(
+                os.path.getsize(store.path) for store in list(AppHistory.stores.values()) if os.path.exists(store.path)
+            )
+        )
+        Metrics.register_gauge(
+            "history_pending_records",
+            lambda: sum(len(store.pending) for store in list(AppHistory.stores.values()))
+        )
+
+        # Last flush in the case of an unexpected exit
+        atexit.register(AppHistory.save_history, True)
+
+        return True
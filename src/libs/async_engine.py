@@ -0,0 +1,292 @@
+from libs.huawei_wrapper import ErrorCodes
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.app_history import AppHistory
+from libs.send_queue import SendQueue
+from libs.poll_scheduler import PollScheduler
+from libs.router_session import RouterSession
+from libs.inbox_housekeeper import InboxHousekeeper
+from libs.delivery_tracker import DeliveryTracker
+from libs.inbox_probe import InboxProbe
+from libs.sms_digest import SmsDigest
+from libs.sms_assembler import SmsAssembler
+from libs.metrics import Metrics
+from libs import logger
+from huawei_lte_api.Client import Client
+from typing import Any, Callable, Optional
+
+import asyncio
+
+
+class AsyncEngine:
+    """
+    Asyncio engine, an alternative to the blocking PollLoop.
+
+    Note:
+        - Inbox polling, forwarding, reply evaluation, outbound sends (SendQueue)
+        and history persistence run as separate tasks connected by bounded queues,
+        a full queue pauses the previous stage (backpressure).
+        - The router calls are still made by HuaweiWrapper (same dedup, whitelist & history),
+        inside worker threads and one at a time, as they share the same router session.
+        - A router that cannot be reached only ends the tasks of its engine (see AsyncEngine.main()).
+    """
+
+    def __init__(self, config: dict[str, Any], history: bool, send_queue: SendQueue, session: Optional[RouterSession] = None):
+        self.config = config
+        self.history = history
+        self.send_queue = send_queue
+        self.session = session or RouterSession(config["ROUTER_URI"], config["ROUTER_HEARTBEAT"])
+        self.client: Optional[Client] = None
+        self.housekeeper = InboxHousekeeper.from_config(config)
+        self.tracker = DeliveryTracker.from_config(config, send_queue)
+        self.probe = InboxProbe.from_config(config)
+        self.digest = SmsDigest.from_config(config, send_queue)
+        self.assembler = SmsAssembler.from_config(config)
+        self.scheduler = PollScheduler(
+            config["ROUTER_LOOP_MIN"],
+            config["ROUTER_LOOP_MAX"],
+            config["ROUTER_LOOP_BACKOFF"],
+            config["ROUTER_LOOP_SLEEP"],
+            config["ROUTER_NAME"]
+        )
+
+        # Created inside the event loop (see AsyncEngine.main())
+        self.router_lock: asyncio.Lock
+        self.forward_queue: asyncio.Queue[dict[str, str]]
+        self.reply_queue: asyncio.Queue[dict[str, str]]
+
+
+    async def router_call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Runs a blocking HuaweiWrapper function in a worker thread,
+        the calls are serialized as they share the same router session.
+
+        Args:
+            func (Callable[..., Any]): The blocking function.
+            *args (Any): The function arguments.
+
+        Returns:
+            Any: The value returned by the function.
+        """
+
+        async with self.router_lock:
+            return await asyncio.to_thread(func, *args)
+
+
+    def is_idle(self, new_sms_count: int) -> bool:
+        return (
+            new_sms_count == 0
+            and self.forward_queue.empty()
+            and self.reply_queue.empty()
+            and len(self.send_queue) == 0
+        )
+
+
+    async def poll_inbox(self) -> None:
+        """
+        Inbox polling task, pushes the new SMS to the forward queue.
+
+        Note:
+            Returns when the router cannot be reached anymore (see RouterSession.ensure()).
+        """
+
+        name = self.config["ROUTER_NAME"]
+
+        while True:
+            new_sms_count = 0
+            delay = None
+
+            try:
+                self.client = await self.router_call(self.session.ensure)
+
+                sms_list = await self.router_call(
+                    HuaweiWrapper.get_unread_sms_list,
+                    self.client,
+                    self.config["ROUTING"],
+                    self.config["ROUTER_BATCH_SIZE"],
+                    False,
+                    self.config["ROUTER_NAME"],
+                    self.probe
+                )
+
+                if type(sms_list) is list:
+                    # The parts of a long SMS are processed as a single SMS
+                    if self.assembler is not None:
+                        sms_list = self.assembler.feed(sms_list)
+
+                    new_sms_count = len(sms_list)
+
+                    for sms in sms_list:
+                        # Waits if the forward queue is full
+                        await self.forward_queue.put(sms)
+                elif sms_list == ErrorCodes.SMS_CANNOT_BE_RETURNED:
+                    # Authenticates again (same connection) if the unread SMS cannot be returned
+                    self.session.invalidate()
+
+                # Inbox cleanup, only when nothing is being processed
+                if self.housekeeper is not None and self.housekeeper.is_due() and self.is_idle(new_sms_count):
+                    await self.router_call(self.housekeeper.run, self.client)
+            except SystemExit:
+                Metrics.increment(Metrics.labeled("router_errors", router=name))
+                logger.critical(f"Router {name} stopped" if name != "" else "Router stopped")
+                return
+            except Exception as err:
+                Metrics.increment(Metrics.labeled("router_errors", router=name))
+                logger.critical(f"Something went wrong while polling the inbox!\n{err}")
+                delay = self.scheduler.max_interval
+
+            # Adaptive delay, shorter after a received SMS, longer on a quiet inbox
+            # (shorter if a multipart wait ends before, longest after an error)
+            if delay is None:
+                delay = min(
+                    self.scheduler.update(new_sms_count),
+                    self.assembler.wait_time() if self.assembler is not None else float("inf")
+                )
+
+            await asyncio.sleep(delay)
+
+
+    async def forward_sms(self) -> None:
+        """
+        Forwarding task, queues the forwarded SMS then pushes them to the reply queue.
+        """
+
+        while True:
+            sms = await self.forward_queue.get()
+
+            # Consistent snapshot of the config (hot reload, see ConfigWatcher)
+            config = self.config.copy()
+
+            try:
+                await asyncio.to_thread(
+                    HuaweiWrapper.sms_forwarder,
+                    self.client,
+                    sms,
+                    config["ROUTING"],
+                    config["ROUTER_SEND_WORKERS"],
+                    self.send_queue,
+                    config["FORWARDER_TEMPLATES"],
+                    self.digest
+                )
+            except Exception as err:
+                logger.critical(f"Something went wrong while forwarding a SMS!\n{err}")
+            finally:
+                self.forward_queue.task_done()
+
+            # Waits if the reply queue is full
+            await self.reply_queue.put(sms)
+
+
+    async def evaluate_replies(self) -> None:
+        """
+        Reply evaluation task, queues the replies of the matching repliers.
+        """
+
+        while True:
+            sms = await self.reply_queue.get()
+
+            try:
+                await asyncio.to_thread(
+                    HuaweiWrapper.sms_replier,
+                    self.client,
+                    sms,
+                    self.config["ROUTING"],
+                    self.send_queue
+                )
+            except Exception as err:
+                logger.critical(f"Something went wrong while replying to a SMS!\n{err}")
+            finally:
+                self.reply_queue.task_done()
+
+
+    async def send_outbound(self) -> None:
+        """
+        Outbound send task, sends the queued SMS (rate limited).
+        """
+
+        while True:
+            try:
+                # Queues the digests whose window is over
+                await asyncio.to_thread(self.digest.flush)
+
+                # The SMS sent before the tracker starts are never matched (before the first send, once connected)
+                if self.tracker is not None and self.tracker.last_sent_id is None and self.client is not None:
+                    await self.router_call(self.tracker.seed, self.client)
+
+                await self.router_call(
+                    self.send_queue.process,
+                    self.client,
+                    self.config["ROUTER_SEND_WORKERS"]
+                )
+
+                # Confirms the sent SMS (batched sent box checks, failed ones are queued again)
+                if self.tracker is not None and self.tracker.is_due():
+                    await self.router_call(self.tracker.check, self.client, self.config["ROUTING"])
+            except Exception as err:
+                logger.critical(f"Something went wrong while sending the queued SMS!\n{err}")
+
+            # Sleeps until the next SMS can be sent
+            wait_time = self.send_queue.wait_time()
+            await asyncio.sleep(min(wait_time, 1) if wait_time > 0 else 0.5)
+
+
+    async def persist_history(self) -> None:
+        """
+        Persistence task, saves the history if needed (writes are coalesced).
+        """
+
+        while True:
+            await asyncio.sleep(1)
+
+            if self.history and AppHistory.is_dirty():
+                await asyncio.to_thread(AppHistory.save_history)
+
+
+    async def main(self) -> None:
+        """
+        Creates the queues and runs all the tasks.
+        """
+
+        queue_size = self.config["APP_QUEUE_SIZE"]
+
+        self.router_lock = asyncio.Lock()
+        self.forward_queue = asyncio.Queue(maxsize=queue_size)
+        self.reply_queue = asyncio.Queue(maxsize=queue_size)
+
+        tasks = [
+            asyncio.create_task(coroutine)
+            for coroutine in (self.forward_sms(), self.evaluate_replies(), self.send_outbound(), self.persist_history())
+        ]
+
+        # The other tasks only end with the polling task (router stopped), the other engines keep running
+        try:
+            await self.poll_inbox()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    @staticmethod
+    def run(config: dict[str, Any], history: bool, send_queue: SendQueue) -> None:
+        """
+        Runs the asyncio engine forever.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config().
+            history (bool): True if the history has been correctly loaded.
+            send_queue (SendQueue): Persistent queue of the outbound SMS.
+        """
+
+        engine = AsyncEngine(config, history, send_queue)
+
+        try:
+            asyncio.run(engine.main())
+
+        # Disconnect from the router if possible (also once the router cannot be reached)
+        except KeyboardInterrupt:
+            pass
+        except Exception as err:
+            logger.critical(f"Something went wrong!\n{err}")
+
+        engine.session.disconnect()
@@ -1,8 +1,15 @@
 from libs import logger
-from typing import Union
+from libs.forward_sink import ForwardSink
+from libs.rate_limiter import RateLimiter
+from libs.reply_matcher import ReplyMatcher
+from libs.routing_table import RoutingTable
+from libs.sms_template import SmsTemplate
+from libs.sms_digest import SmsDigest
+from typing import Any, Union
 
 import yaml
 import sys
+import re
 import os
 
 
@@ -11,6 +18,17 @@ class ConfigParser:
     Loads the config.yaml file and format it, allowing it to be used by the app.
     """
 
+    @staticmethod
+    def get_config_paths() -> tuple[str, str]:
+        """
+        Returns the paths of the config.dev.yaml and config.yaml files.
+        """
+
+        return (
+            os.path.join(os.path.dirname(sys.argv[0]), "config.dev.yaml"),
+            os.path.join(os.path.dirname(sys.argv[0]), "config.yaml")
+        )
+
     @staticmethod
     def load_yaml():
         """
@@ -24,8 +42,7 @@ class ConfigParser:
         """
 
         # Path to the .yaml files
-        config_dev_path = os.path.join(os.path.dirname(sys.argv[0]), "config.dev.yaml")
-        config_path = os.path.join(os.path.dirname(sys.argv[0]), "config.yaml")
+        config_dev_path, config_path = ConfigParser.get_config_paths()
         final_path = None
 
         # Check if config.dev.yaml exists, if not, load config.yaml
@@ -47,7 +64,7 @@ class ConfigParser:
             sys.exit(1)
 
     @staticmethod
-    def format_phone_number(phone_number: str) -> str:
+    def format_phone_number(phone_number: str, allow_prefix: bool = False) -> str:
         """
         Formats a phone number to an international format without spaces.
 
@@ -58,6 +75,7 @@ class ConfigParser:
 
         Args:
             phone_number (str): The original phone number.
+            allow_prefix (bool, optional): If True, accepts a prefix rule ending with "*" ("+3361*").
 
         Returns:
             str: The formatted & verified phone number.
@@ -68,15 +86,208 @@ class ConfigParser:
             return ""
 
         # Remove spaces
-        phone_number = phone_number.replace(" ", "")
+        phone_number = str(phone_number).replace(" ", "")
+
+        # A lone "*" matches every phone number
+        if allow_prefix and phone_number == "*":
+            return phone_number
 
         # Check if the phone number is valid
-        if not phone_number[1:].isdigit():
+        if not (phone_number[:-1] if allow_prefix and phone_number.endswith("*") else phone_number)[1:].isdigit():
             logger.critical(f"The phone number must contain only numbers [{phone_number}]")
             sys.exit(1)
 
         return phone_number
 
+    @staticmethod
+    def compile_template(template: str, max_segments: int, split: bool = False) -> SmsTemplate:
+        """
+        Compiles a forwarded SMS template (exits the app if it is invalid).
+
+        Args:
+            template (str): The template string (see SmsTemplate for the fields).
+            max_segments (int): Max number of segments of the forwarded SMS (0 to disable it).
+            split (bool, optional): Sends a long SMS as several single SMS.
+
+        Returns:
+            SmsTemplate: The compiled template.
+        """
+
+        if type(max_segments) is not int or max_segments < 0:
+            logger.critical(f"The max segments must be a positive integer or 0 [{max_segments}]")
+            sys.exit(1)
+
+        if type(split) is not bool:
+            logger.critical(f"The template split setting must be a boolean [{split}]")
+            sys.exit(1)
+
+        try:
+            return SmsTemplate(str(template), max_segments, split)
+        except ValueError as err:
+            logger.critical(f"Invalid forwarder template: {err}")
+            sys.exit(1)
+
+
+    @staticmethod
+    def parse_router(router_dict: dict, name: str) -> dict[str, Union[str, int, float]]:
+        """
+        Parses the settings of a router.
+
+        Note:
+            The name is used inside the log/history/outbox file names in the multi-router mode,
+            so it can only contain letters, numbers, "-" and "_" (empty in the single router mode).
+
+        Args:
+            router_dict (dict): A "router" section of the .yaml file.
+            name (str): Name of the router.
+
+        Returns:
+            dict[str, Union[str, int, float]]: The router keys (ROUTER_NAME, ROUTER_URI, etc.).
+        """
+
+        res: dict = {}
+
+        if name != "" and not re.fullmatch(r"[A-Za-z0-9_-]+", str(name)):
+            logger.critical(f"The router name can only contain letters, numbers, \"-\" and \"_\" [{name}]")
+            sys.exit(1)
+
+        res["ROUTER_NAME"] = str(name)
+        res["ROUTER_IP_ADDRESS"] = router_dict["ip_address"]
+        res["ROUTER_PHONE_NUMBER"] = ConfigParser.format_phone_number(router_dict["phone_number"])
+        res["ROUTER_USERNAME"] = router_dict["username"]
+        res["ROUTER_PASSWORD"] = router_dict["password"]
+        res["ROUTER_LOOP_SLEEP"] = router_dict["loop"]
+        res["ROUTER_LOOP_MIN"] = router_dict.get("loop_min", res["ROUTER_LOOP_SLEEP"])
+        res["ROUTER_LOOP_MAX"] = router_dict.get("loop_max", res["ROUTER_LOOP_SLEEP"])
+        res["ROUTER_LOOP_BACKOFF"] = router_dict.get("loop_backoff", 2)
+
+        if res["ROUTER_LOOP_MIN"] <= 0 or res["ROUTER_LOOP_MAX"] < res["ROUTER_LOOP_MIN"]:
+            logger.critical("The loop delays must be positive and loop_min must be lower than loop_max")
+            sys.exit(1)
+
+        res["ROUTER_HEARTBEAT"] = router_dict.get("heartbeat", 60)
+        res["ROUTER_BATCH_SIZE"] = router_dict.get("batch_size", 20)
+        res["ROUTER_PROBE"] = bool(router_dict.get("probe", True))
+        res["ROUTER_SEND_WORKERS"] = router_dict.get("send_workers", 1)
+        res["ROUTER_MODEL"] = router_dict.get("model", "")
+
+        # Send rate of the router model if not overridden
+        send_rate, send_burst = RateLimiter.get_send_rate(res["ROUTER_MODEL"])
+        res["ROUTER_SEND_RATE"] = router_dict.get("send_rate", send_rate)
+        res["ROUTER_SEND_BURST"] = router_dict.get("send_burst", send_burst)
+
+        if type(res["ROUTER_BATCH_SIZE"]) is not int or res["ROUTER_BATCH_SIZE"] < 1:
+            logger.critical(f"The batch size must be a positive integer [{res['ROUTER_BATCH_SIZE']}]")
+            sys.exit(1)
+
+        if type(res["ROUTER_SEND_WORKERS"]) is not int or res["ROUTER_SEND_WORKERS"] < 1:
+            logger.critical(f"The send workers must be a positive integer [{res['ROUTER_SEND_WORKERS']}]")
+            sys.exit(1)
+
+        res["ROUTER_URI"] = "http://{0}:{1}@{2}".format(
+            res["ROUTER_USERNAME"],
+            res["ROUTER_PASSWORD"],
+            res["ROUTER_IP_ADDRESS"]
+        )
+
+        for key in res:
+            if res[key] is None:
+                logger.critical(f"Invalid config: {key} is None ({name or 'router'})")
+                sys.exit(1)
+
+        return res
+
+
+    @staticmethod
+    def parse_sink(sink_dict: dict) -> dict[str, Any]:
+        """
+        Parses the settings of a non-SMS forwarding sink.
+
+        Note:
+            The type specific settings (url, host, topic, etc.) are kept as they are,
+            the required ones are listed inside ForwardSink.TYPES.
+
+        Args:
+            sink_dict (dict): An item of the "sinks" section of the .yaml file.
+
+        Returns:
+            dict[str, Any]: The sink settings, with the default batch, timeout and retry settings.
+        """
+
+        if not isinstance(sink_dict, dict) or not re.fullmatch(r"[A-Za-z0-9_-]+", str(sink_dict.get("name", ""))):
+            logger.critical(f"A sink needs a name containing only letters, numbers, \"-\" and \"_\" [{sink_dict}]")
+            sys.exit(1)
+
+        res: dict[str, Any] = {**sink_dict, "name": str(sink_dict["name"])}
+
+        if res.get("type") not in ForwardSink.TYPES:
+            logger.critical(f"The sink type must be one of {', '.join(ForwardSink.TYPES)} [{res['name']}]")
+            sys.exit(1)
+
+        for key in ForwardSink.TYPES[res["type"]]:
+            if res.get(key) in (None, "", []):
+                logger.critical(f"The {res['type']} sink {res['name']} needs a \"{key}\" setting")
+                sys.exit(1)
+
+        res["batch_size"] = sink_dict.get("batch_size", 20)
+        res["batch_delay"] = sink_dict.get("batch_delay", 1)
+        res["timeout"] = sink_dict.get("timeout", 10)
+        res["max_attempts"] = sink_dict.get("max_attempts", 5)
+        res["retry_delay"] = sink_dict.get("retry_delay", 5)
+        res["queue_size"] = sink_dict.get("queue_size", 10000)
+
+        for key in ("batch_size", "max_attempts", "queue_size"):
+            if type(res[key]) is not int or res[key] < 1:
+                logger.critical(f"The sink {key} must be a positive integer [{res['name']}: {res[key]}]")
+                sys.exit(1)
+
+        if res["batch_delay"] < 0 or res["timeout"] <= 0 or res["retry_delay"] < 0:
+            logger.critical(f"The sink delays must be positive [{res['name']}]")
+            sys.exit(1)
+
+        return res
+
+
+    @staticmethod
+    def parse_digest(forwarder_dict: dict, forwarder: str) -> dict[str, Any]:
+        """
+        Parses the digest settings of a forwarder ("digest", "digest_max", "digest_segments" and "digest_template").
+
+        Args:
+            forwarder_dict (dict): An item of the "forwarders" section of the .yaml file.
+            forwarder (str): Formatted phone number of the forwarder.
+
+        Returns:
+            dict[str, Any]: The digest window (in seconds), max number of SMS, max number of segments
+            of a digest SMS and the compiled line template (see SmsDigest).
+        """
+
+        if forwarder.startswith(ForwardSink.FORWARDER_PREFIX):
+            logger.critical(f"The digest is only available for the phone number forwarders (sinks are batched) [{forwarder}]")
+            sys.exit(1)
+
+        res: dict[str, Any] = {
+            "window": forwarder_dict["digest"],
+            "max_messages": forwarder_dict.get("digest_max", 20),
+            "max_segments": forwarder_dict.get("digest_segments", 3),
+            "template": ConfigParser.compile_template(forwarder_dict.get("digest_template", SmsDigest.DEFAULT_TEMPLATE), 0)
+        }
+
+        if type(res["window"]) not in (int, float) or res["window"] < 0:
+            logger.critical(f"The digest window must be a positive number of seconds [{forwarder}: {res['window']}]")
+            sys.exit(1)
+
+        if type(res["max_messages"]) is not int or res["max_messages"] < 1:
+            logger.critical(f"The digest max number of SMS must be a positive integer [{forwarder}: {res['max_messages']}]")
+            sys.exit(1)
+
+        if type(res["max_segments"]) is not int or res["max_segments"] < 0:
+            logger.critical(f"The digest max number of segments must be a positive integer (or 0) [{forwarder}: {res['max_segments']}]")
+            sys.exit(1)
+
+        return res
+
+
     @staticmethod
     def get_config() -> dict[str, Union[str, list[str], int, None, dict[str, str]]]:
         """
@@ -84,47 +295,269 @@ class ConfigParser:
         with all the data used by the app.
 
         Keys:
+            - ROUTER_NAME: Name of the router (empty in the single router mode).
             - ROUTER_URI: Formatted URI for the API connection.
             - ROUTER_IP_ADDRESS: IP address of the router.
             - ROUTER_PHONE_NUMBER: International number of the router.
             - ROUTER_USERNAME: Username of the router (account).
             - ROUTER_PASSWORD: Password of the router (account).
-            - ROUTER_LOOP_SLEEP: Delay between each loop iteration.
+            - ROUTER_LOOP_SLEEP: Delay between each loop iteration (initial delay).
+            - ROUTER_LOOP_MIN: Min delay between each loop iteration.
+            - ROUTER_LOOP_MAX: Max delay between each loop iteration.
+            - ROUTER_LOOP_BACKOFF: Delay multiplier after each iteration without SMS.
+            - ROUTER_HEARTBEAT: Delay between two checks of the router session.
+            - ROUTER_BATCH_SIZE: Number of SMS requested per inbox page.
+            - ROUTER_PROBE: If True, the inbox is only listed if the router unread counter is above 0.
+            - ROUTER_SEND_WORKERS: Max number of concurrent send requests.
+            - ROUTER_MODEL: Model of the router.
+            - ROUTER_SEND_RATE: Max number of send requests per second.
+            - ROUTER_SEND_BURST: Max number of send requests in a burst.
+            - OUTBOX_MAX_ATTEMPTS: Number of send attempts before dead-lettering a SMS.
+            - OUTBOX_RETRY_DELAY: Delay before the first retry of a SMS.
+            - APP_ENGINE: Polling engine ("loop" or "async").
+            - APP_QUEUE_SIZE: Max number of SMS waiting between two tasks (async engine).
+            - APP_COUNTRY_CODE: International prefix of the national phone numbers (empty to disable it).
+            - APP_CONFIG_WATCH: Delay between two checks of the config file changes (0 to only reload on SIGHUP).
+            - HISTORY_FLUSH_INTERVAL: Max delay before writing the new history records.
+            - HISTORY_FLUSH_COUNT: Max number of new history records before writing them.
+            - HISTORY_HOT_WINDOW: Max number of history records kept in memory.
+            - HOUSEKEEPING_ENABLED: If True, the old processed SMS are deleted from the router inbox.
+            - HOUSEKEEPING_RETENTION_DAYS: Delay before a read SMS is deleted from the router inbox (in days).
+            - HOUSEKEEPING_MAX_INBOX: Max number of SMS kept inside the router inbox.
+            - HOUSEKEEPING_INTERVAL: Min delay between two housekeeping runs (in seconds).
+            - HOUSEKEEPING_ARCHIVE: If True, the SMS that are not inside the history are archived before being deleted.
+            - DELIVERY_ENABLED: If True, the sent SMS are confirmed with the router sent box.
+            - DELIVERY_INTERVAL: Min delay between two checks of the router sent box (in seconds).
+            - DELIVERY_TIMEOUT: Delay before a sent SMS that is not inside the sent box is sent again (in seconds).
+            - MULTIPART_ENABLED: If True, the parts of the concatenated SMS are reassembled before being processed.
+            - MULTIPART_TIMEOUT: Delay before an incomplete concatenated SMS is processed (in seconds).
+            - MULTIPART_MAX_GAP: Max delay between the dates of two parts of the same SMS (in seconds).
+            - MULTIPART_MAX_PARTS: Max number of parts of a concatenated SMS.
+            - SEEN_CAPACITY: Max number of SMS inside the seen SMS index.
+            - SEEN_MAX_AGE: Delay before a SMS is removed from the seen SMS index (in days).
+            - METRICS_HOST: Listening address of the metrics endpoint.
+            - METRICS_PORT: Port of the metrics endpoint (0 to disable it).
+            - METRICS_SUMMARY_INTERVAL: Delay between two logged metrics summaries (0 to disable them).
+            - GATEWAY_HOST: Listening address of the send gateway.
+            - GATEWAY_PORT: Port of the send gateway (0 to disable it).
+            - GATEWAY_TOKEN: Token required by the send gateway (empty to disable it).
+            - GATEWAY_MAX_PENDING: Max number of queued SMS before the send requests are refused.
+            - GATEWAY_BATCH_WINDOW: Delay during which the send requests are batched (in seconds).
+            - SINKS: Dict containing the settings of every non-SMS forwarding sink (see ConfigParser.parse_sink()).
+            - ROUTERS: List of the router keys of every router (see ConfigParser.parse_router()),
+            the ROUTER_* keys are the ones of the first router.
             - CONTACTS: Dict containing all the contacts.
-            - FORWARDERS: Dict containing all the forwarders.
-            - REPLIERS: Dict containing all the repliers.
+            - FORWARDERS: Dict containing all the forwarders (the sinks are prefixed with "sink:").
+            - FORWARDER_TEMPLATES: Dict containing the compiled template of every forwarder.
+            - FORWARDER_DIGESTS: Dict containing the digest settings of the forwarders with a digest window.
+            - REPLIERS: Dict containing all the repliers (compiled ReplyMatcher per phone number).
+            - ROUTING: RoutingTable compiled from the contacts, forwarders and repliers (used to route the SMS).
 
         Returns:
             dict: Parsed dict containing all the .yaml file config.
         """
 
         res: dict[str, Union[str, list[str], int, None, dict[str, str]]] = {
+            "ROUTER_NAME": None,
             "ROUTER_URI": None,
             "ROUTER_IP_ADDRESS": None,
             "ROUTER_PHONE_NUMBER": None,
             "ROUTER_USERNAME": None,
             "ROUTER_PASSWORD": None,
             "ROUTER_LOOP_SLEEP": None,
+            "ROUTER_LOOP_MIN": None,
+            "ROUTER_LOOP_MAX": None,
+            "ROUTER_LOOP_BACKOFF": None,
+            "ROUTER_HEARTBEAT": None,
+            "ROUTER_BATCH_SIZE": None,
+            "ROUTER_PROBE": None,
+            "ROUTER_SEND_WORKERS": None,
+            "ROUTER_MODEL": None,
+            "ROUTER_SEND_RATE": None,
+            "ROUTER_SEND_BURST": None,
+            "OUTBOX_MAX_ATTEMPTS": None,
+            "OUTBOX_RETRY_DELAY": None,
+            "APP_ENGINE": None,
+            "APP_QUEUE_SIZE": None,
+            "APP_COUNTRY_CODE": None,
+            "APP_CONFIG_WATCH": None,
+            "HISTORY_FLUSH_INTERVAL": None,
+            "HISTORY_FLUSH_COUNT": None,
+            "HISTORY_HOT_WINDOW": None,
+            "HOUSEKEEPING_ENABLED": None,
+            "HOUSEKEEPING_RETENTION_DAYS": None,
+            "HOUSEKEEPING_MAX_INBOX": None,
+            "HOUSEKEEPING_INTERVAL": None,
+            "HOUSEKEEPING_ARCHIVE": None,
+            "DELIVERY_ENABLED": None,
+            "DELIVERY_INTERVAL": None,
+            "DELIVERY_TIMEOUT": None,
+            "MULTIPART_ENABLED": None,
+            "MULTIPART_TIMEOUT": None,
+            "MULTIPART_MAX_GAP": None,
+            "MULTIPART_MAX_PARTS": None,
+            "SEEN_CAPACITY": None,
+            "SEEN_MAX_AGE": None,
+            "METRICS_HOST": None,
+            "METRICS_PORT": None,
+            "METRICS_SUMMARY_INTERVAL": None,
+            "GATEWAY_HOST": None,
+            "GATEWAY_PORT": None,
+            "GATEWAY_TOKEN": None,
+            "GATEWAY_MAX_PENDING": None,
+            "GATEWAY_BATCH_WINDOW": None,
+            "SINKS": {},
+            "ROUTERS": [],
             "CONTACTS": {},
             "FORWARDERS": {},
-            "REPLIERS": {}
+            "FORWARDER_TEMPLATES": {},
+            "FORWARDER_DIGESTS": {},
+            "REPLIERS": {},
+            "ROUTING": None
         }
 
         # Loads the .yaml file
         yaml_dict = ConfigParser.load_yaml()
 
-        # Get router data
-        res["ROUTER_IP_ADDRESS"] = yaml_dict["router"]["ip_address"]
-        res["ROUTER_PHONE_NUMBER"] = ConfigParser.format_phone_number(yaml_dict["router"]["phone_number"])
-        res["ROUTER_USERNAME"] = yaml_dict["router"]["username"]
-        res["ROUTER_PASSWORD"] = yaml_dict["router"]["password"]
-        res["ROUTER_LOOP_SLEEP"] = yaml_dict["router"]["loop"]
+        # Get router data (a single "router" or a list of "routers")
+        if "routers" in yaml_dict:
+            if not isinstance(yaml_dict["routers"], list) or len(yaml_dict["routers"]) == 0:
+                logger.critical("The routers section must be a non-empty list")
+                sys.exit(1)
 
-        res["ROUTER_URI"] = "http://{0}:{1}@{2}".format(
-            res["ROUTER_USERNAME"],
-            res["ROUTER_PASSWORD"],
-            res["ROUTER_IP_ADDRESS"]
-        )
+            routers = [
+                ConfigParser.parse_router(router_dict, router_dict.get("name", f"router{i + 1}"))
+                for i, router_dict in enumerate(yaml_dict["routers"])
+            ]
+        else:
+            routers = [ConfigParser.parse_router(yaml_dict["router"], "")]
+
+        router_names = [router["ROUTER_NAME"] for router in routers]
+
+        if len(set(router_names)) != len(router_names):
+            logger.critical(f"The router names must be unique {router_names}")
+            sys.exit(1)
+
+        # The first router is used by the single router mode
+        res.update(routers[0])
+        res["ROUTERS"] = routers
+
+        # Get app data (optional section)
+        app_dict = yaml_dict.get("app") or {}
+        res["APP_ENGINE"] = app_dict.get("engine", "loop")
+        res["APP_QUEUE_SIZE"] = app_dict.get("queue_size", 100)
+        res["APP_COUNTRY_CODE"] = str(app_dict.get("country_code", "")).replace(" ", "")
+
+        res["APP_CONFIG_WATCH"] = app_dict.get("config_watch", 5)
+
+        if type(res["APP_CONFIG_WATCH"]) not in (int, float) or res["APP_CONFIG_WATCH"] < 0:
+            logger.critical(f"The config watch delay must be a positive number or 0 [{res['APP_CONFIG_WATCH']}]")
+            sys.exit(1)
+
+        if res["APP_COUNTRY_CODE"] != "" and not re.fullmatch(r"\+[0-9]{1,4}", res["APP_COUNTRY_CODE"]):
+            logger.critical(f"The country code must be an international prefix like \"+33\" [{res['APP_COUNTRY_CODE']}]")
+            sys.exit(1)
+
+        if res["APP_ENGINE"] not in ("loop", "async"):
+            logger.critical(f"The engine must be \"loop\" or \"async\" [{res['APP_ENGINE']}]")
+            sys.exit(1)
+
+        # Get outbox data (optional section)
+        outbox_dict = yaml_dict.get("outbox") or {}
+        res["OUTBOX_MAX_ATTEMPTS"] = outbox_dict.get("max_attempts", 5)
+        res["OUTBOX_RETRY_DELAY"] = outbox_dict.get("retry_delay", 5)
+
+        # Get history data (optional section)
+        history_dict = yaml_dict.get("history") or {}
+        res["HISTORY_FLUSH_INTERVAL"] = history_dict.get("flush_interval", 30)
+        res["HISTORY_FLUSH_COUNT"] = history_dict.get("flush_count", 10)
+        res["HISTORY_HOT_WINDOW"] = history_dict.get("hot_window", 1000)
+
+        # Get inbox housekeeping data (optional section)
+        housekeeping_dict = yaml_dict.get("housekeeping") or {}
+        res["HOUSEKEEPING_ENABLED"] = bool(housekeeping_dict.get("enabled", False))
+        res["HOUSEKEEPING_RETENTION_DAYS"] = housekeeping_dict.get("retention_days", 30)
+        res["HOUSEKEEPING_MAX_INBOX"] = housekeeping_dict.get("max_inbox", 500)
+        res["HOUSEKEEPING_INTERVAL"] = housekeeping_dict.get("interval", 3600)
+        res["HOUSEKEEPING_ARCHIVE"] = bool(housekeeping_dict.get("archive", True))
+
+        if type(res["HOUSEKEEPING_MAX_INBOX"]) is not int or res["HOUSEKEEPING_MAX_INBOX"] < 1:
+            logger.critical(f"The max inbox size must be a positive integer [{res['HOUSEKEEPING_MAX_INBOX']}]")
+            sys.exit(1)
+
+        if res["HOUSEKEEPING_RETENTION_DAYS"] < 0 or res["HOUSEKEEPING_INTERVAL"] <= 0:
+            logger.critical("The housekeeping retention must be positive (or 0) and its interval must be positive")
+            sys.exit(1)
+
+        # Get delivery confirmation data (optional section)
+        delivery_dict = yaml_dict.get("delivery") or {}
+        res["DELIVERY_ENABLED"] = bool(delivery_dict.get("enabled", False))
+        res["DELIVERY_INTERVAL"] = delivery_dict.get("interval", 10)
+        res["DELIVERY_TIMEOUT"] = delivery_dict.get("timeout", 300)
+
+        if res["DELIVERY_INTERVAL"] <= 0 or res["DELIVERY_TIMEOUT"] <= res["DELIVERY_INTERVAL"]:
+            logger.critical("The delivery check interval must be positive and shorter than its timeout")
+            sys.exit(1)
+
+        # Get multipart SMS reassembly data (optional section)
+        multipart_dict = yaml_dict.get("multipart") or {}
+        res["MULTIPART_ENABLED"] = bool(multipart_dict.get("enabled", True))
+        res["MULTIPART_TIMEOUT"] = multipart_dict.get("timeout", 30)
+        res["MULTIPART_MAX_GAP"] = multipart_dict.get("max_gap", 60)
+        res["MULTIPART_MAX_PARTS"] = multipart_dict.get("max_parts", 10)
+
+        if res["MULTIPART_TIMEOUT"] <= 0 or res["MULTIPART_MAX_GAP"] < 0:
+            logger.critical("The multipart timeout must be positive and its max gap must be positive (or 0)")
+            sys.exit(1)
+
+        if type(res["MULTIPART_MAX_PARTS"]) is not int or res["MULTIPART_MAX_PARTS"] < 2:
+            logger.critical(f"The multipart max parts must be an integer of at least 2 [{res['MULTIPART_MAX_PARTS']}]")
+            sys.exit(1)
+
+        # Get seen SMS index data (optional section)
+        seen_dict = yaml_dict.get("seen") or {}
+        res["SEEN_CAPACITY"] = seen_dict.get("capacity", 100000)
+        res["SEEN_MAX_AGE"] = seen_dict.get("max_age", 30)
+
+        if type(res["SEEN_CAPACITY"]) is not int or res["SEEN_CAPACITY"] < 1:
+            logger.critical(f"The seen SMS capacity must be a positive integer [{res['SEEN_CAPACITY']}]")
+            sys.exit(1)
+
+        # Get metrics data (optional section)
+        metrics_dict = yaml_dict.get("metrics") or {}
+        res["METRICS_HOST"] = metrics_dict.get("host", "127.0.0.1")
+        res["METRICS_PORT"] = metrics_dict.get("port", 0)
+        res["METRICS_SUMMARY_INTERVAL"] = metrics_dict.get("summary_interval", 0)
+
+        if type(res["METRICS_PORT"]) is not int or not 0 <= res["METRICS_PORT"] <= 65535:
+            logger.critical(f"The metrics port must be between 0 and 65535 [{res['METRICS_PORT']}]")
+            sys.exit(1)
+
+        # Get send gateway data (optional section)
+        gateway_dict = yaml_dict.get("gateway") or {}
+        res["GATEWAY_HOST"] = gateway_dict.get("host", "127.0.0.1")
+        res["GATEWAY_PORT"] = gateway_dict.get("port", 0)
+        res["GATEWAY_TOKEN"] = str(gateway_dict.get("token") or "")
+        res["GATEWAY_MAX_PENDING"] = gateway_dict.get("max_pending", 1000)
+        res["GATEWAY_BATCH_WINDOW"] = gateway_dict.get("batch_window", 0.05)
+
+        if type(res["GATEWAY_PORT"]) is not int or not 0 <= res["GATEWAY_PORT"] <= 65535:
+            logger.critical(f"The gateway port must be between 0 and 65535 [{res['GATEWAY_PORT']}]")
+            sys.exit(1)
+
+        if type(res["GATEWAY_MAX_PENDING"]) is not int or res["GATEWAY_MAX_PENDING"] < 1 or res["GATEWAY_BATCH_WINDOW"] < 0:
+            logger.critical("The gateway max pending SMS must be a positive integer and its batch window must be positive (or 0)")
+            sys.exit(1)
+
+        # Get non-SMS forwarding sinks data (optional section)
+        for sink_dict in yaml_dict.get("sinks") or []:
+            sink = ConfigParser.parse_sink(sink_dict)
+
+            if sink["name"] in res["SINKS"]: # type: ignore
+                logger.critical(f"Duplicated sink name: {sink['name']}")
+                sys.exit(1)
+
+            res["SINKS"][sink["name"]] = sink # type: ignore
 
         # Get contacts data
         if "contacts" in yaml_dict:
@@ -132,7 +565,7 @@ class ConfigParser:
 
             for contact in temp_contacts:
                 if "phone_number" in contact and "name" in contact:
-                    formatted_phone_number = ConfigParser.format_phone_number(contact["phone_number"])
+                    formatted_phone_number = ConfigParser.format_phone_number(contact["phone_number"], True)
 
                     # Ignores the empty placeholders
                     if formatted_phone_number != "":
@@ -144,20 +577,54 @@ class ConfigParser:
                 else:
                     logger.warning(f"Invalid contact: {contact}")
 
+        # Default template of the forwarded SMS (optional section)
+        template_dict = yaml_dict.get("template") or {}
+        default_template = ConfigParser.compile_template(
+            template_dict.get("forward", SmsTemplate.DEFAULT),
+            template_dict.get("max_segments", 0),
+            template_dict.get("split", False)
+        )
+
         # Get forwarders data
         if "forwarders" in yaml_dict:
             temp_forwarders = yaml_dict["forwarders"]
 
             for forwarder in temp_forwarders:
-                if "phone_number" in forwarder and "whitelist" in forwarder:
-                    formatted_phone_number = ConfigParser.format_phone_number(forwarder["phone_number"])
+                if ("phone_number" in forwarder or "sink" in forwarder) and "whitelist" in forwarder:
+                    # A sink forwarder is stored as "sink:<name>" (see HuaweiWrapper.sms_forwarder())
+                    if "sink" in forwarder:
+                        if forwarder["sink"] not in res["SINKS"]: # type: ignore
+                            logger.critical(f"Unknown sink for forwarder: {forwarder['sink']}")
+                            sys.exit(1)
+
+                        formatted_phone_number = f"{ForwardSink.FORWARDER_PREFIX}{forwarder['sink']}"
+                    else:
+                        formatted_phone_number = ConfigParser.format_phone_number(forwarder["phone_number"])
+
                     formatted_whitelist = [
-                        ConfigParser.format_phone_number(phone_number) for phone_number in forwarder["whitelist"]
+                        ConfigParser.format_phone_number(phone_number, True) for phone_number in forwarder["whitelist"]
                     ]
 
                     # Ignores the empty placeholders
                     if formatted_phone_number != "":
                         res["FORWARDERS"][formatted_phone_number] = formatted_whitelist # type: ignore
+
+                        # Template of the forwarder, compiled only if overridden
+                        if "template" in forwarder or "max_segments" in forwarder or "split" in forwarder:
+                            res["FORWARDER_TEMPLATES"][formatted_phone_number] = ConfigParser.compile_template( # type: ignore
+                                forwarder.get("template", default_template.template),
+                                forwarder.get("max_segments", default_template.max_segments),
+                                forwarder.get("split", default_template.split)
+                            )
+                        else:
+                            res["FORWARDER_TEMPLATES"][formatted_phone_number] = default_template # type: ignore
+
+                        # Burst coalescing of the forwarder (see SmsDigest)
+                        if forwarder.get("digest", 0) != 0:
+                            res["FORWARDER_DIGESTS"][formatted_phone_number] = ConfigParser.parse_digest( # type: ignore
+                                forwarder,
+                                formatted_phone_number
+                            )
                 else:
                     logger.warning(f"Invalid forwarder: {forwarder}")
 
@@ -171,7 +638,23 @@ class ConfigParser:
 
                     # Ignores the empty placeholders
                     if formatted_phone_number != "":
-                        res["REPLIERS"][formatted_phone_number] = replier["messages"] # type: ignore
+                        # Compiles the filters once
+                        try:
+                            res["REPLIERS"][formatted_phone_number] = ReplyMatcher( # type: ignore
+                                replier["messages"],
+                                replier.get("reply_all", False)
+                            )
+                        except ValueError as err:
+                            logger.critical(f"Invalid replier: {err}")
+                            sys.exit(1)
+
+        # Compiled routing (single lookup per SMS)
+        res["ROUTING"] = RoutingTable(
+            res["CONTACTS"], # type: ignore
+            res["FORWARDERS"], # type: ignore
+            res["REPLIERS"], # type: ignore
+            res["APP_COUNTRY_CODE"] # type: ignore
+        )
 
         # Verify if the data is valid
         for key in res:
@@ -0,0 +1,165 @@
+from libs.config_parser import ConfigParser
+from libs.metrics import Metrics
+from libs import logger
+from typing import Any, Optional
+
+import threading
+import signal
+import time
+import os
+
+
+class ConfigWatcher:
+    """
+    Hot reload of the config file, triggered by a file change or by a SIGHUP signal.
+
+    Note:
+        - The new config is fully parsed and validated before being used,
+        an invalid config is reported and the current one is kept.
+        - Only the routing keys (contacts, forwarders, templates & repliers) are swapped,
+        the router sessions, the dedup state, the history and the outboxes are kept.
+        The router settings still need a restart (a warning is logged if they changed).
+        - The keys are swapped with a single dict.update() per running config, and every poll
+        iteration works on a copy of its config, so a SMS is never routed by a half-applied config.
+    """
+
+    # Keys swapped by a reload
+    RELOADABLE_KEYS = (
+        "APP_COUNTRY_CODE",
+        "CONTACTS",
+        "FORWARDERS",
+        "FORWARDER_TEMPLATES",
+        "FORWARDER_DIGESTS",
+        "REPLIERS",
+        "ROUTING"
+    )
+
+
+    def __init__(self, config: dict[str, Any], interval: float = 5):
+        """
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config().
+            interval (float, optional): Delay between two checks of the config files (0 to only reload on SIGHUP).
+        """
+
+        self.config = config
+        self.interval = interval
+
+        # Running configs updated by a reload (per-router copies in the multi-router mode)
+        self.targets: list[dict[str, Any]] = [config]
+
+        self.mtimes = ConfigWatcher.get_mtimes()
+        self.reload_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+
+    @staticmethod
+    def get_mtimes() -> tuple[Optional[float], ...]:
+        """
+        Returns the modification time of each config file (None if it does not exist).
+        """
+
+        mtimes = []
+
+        for path in ConfigParser.get_config_paths():
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError:
+                mtimes.append(None)
+
+        return tuple(mtimes)
+
+
+    def add_target(self, config: dict[str, Any]) -> None:
+        with self.lock:
+            self.targets.append(config)
+
+
+    def reload(self) -> bool:
+        """
+        Parses the config files again and swaps the routing keys of every running config.
+
+        Returns:
+            bool: True if the new config has been applied.
+        """
+
+        start_time = time.perf_counter()
+
+        # ConfigParser exits on an invalid config (the reason is already logged)
+        try:
+            new_config = ConfigParser.get_config()
+        except SystemExit:
+            Metrics.increment("config_reload_failures")
+            logger.error("Invalid config, the current config is kept")
+            return False
+        except Exception as err:
+            Metrics.increment("config_reload_failures")
+            logger.error(f"The config could not be reloaded, the current config is kept:\n{err}")
+            return False
+
+        # Settings only used when the app starts
+        changed_keys = [
+            key for key in new_config
+            if key not in ConfigWatcher.RELOADABLE_KEYS and new_config[key] != self.config.get(key)
+        ]
+
+        if len(changed_keys) > 0:
+            logger.warning(f"Restart the app to apply: {', '.join(changed_keys)}")
+
+        values = {key: new_config[key] for key in ConfigWatcher.RELOADABLE_KEYS}
+
+        with self.lock:
+            for target in self.targets:
+                target.update(values)
+
+            # Reference for the next comparison
+            self.config = {**self.config, **values}
+
+        elapsed_time = time.perf_counter() - start_time
+
+        Metrics.observe("config_reload", elapsed_time)
+        Metrics.increment("config_reloads")
+        logger.info(f"Config reloaded in {elapsed_time * 1000:.1f}ms ({len(new_config['CONTACTS'])} contacts, {len(new_config['FORWARDERS'])} forwarders, {len(new_config['REPLIERS'])} repliers)")
+
+        return True
+
+
+    def watch(self) -> None:
+        """
+        Reloads the config when a file changes or when SIGHUP is received (runs until ConfigWatcher.stop()).
+        """
+
+        while not self.stop_event.is_set():
+            is_signaled = self.reload_event.wait(self.interval if self.interval > 0 else None)
+
+            if self.stop_event.is_set():
+                break
+
+            self.reload_event.clear()
+            mtimes = ConfigWatcher.get_mtimes()
+
+            if is_signaled or mtimes != self.mtimes:
+                self.mtimes = mtimes
+                self.reload()
+
+
+    def start(self) -> None:
+        """
+        Starts the watcher thread and the SIGHUP handler (if supported).
+        """
+
+        # Signal handlers can only be set from the main thread (and SIGHUP does not exist on Windows)
+        if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda *_: self.reload_event.set())
+
+        self.thread = threading.Thread(target=self.watch, name="config-watcher", daemon=True)
+        self.thread.start()
+
+        logger.info("Config hot reload enabled (file changes & SIGHUP)")
+
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.reload_event.set()
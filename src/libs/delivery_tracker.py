@@ -0,0 +1,410 @@
+from huawei_lte_api.enums.sms import BoxTypeEnum, SortTypeEnum
+from huawei_lte_api.Client import Client
+
+from libs.app_history import AppHistory
+from libs.routing_table import RoutingTable
+from libs.send_queue import SendQueue
+from libs.metrics import Metrics
+from libs import logger
+from collections import OrderedDict
+from typing import Any, Optional
+
+import threading
+import json
+import time
+import sys
+import os
+
+
+class DeliveryTracker:
+    """
+    Confirms that the SMS accepted by the router ("OK" response) have really been sent,
+    by reading the router sent box (and draft box) in batches.
+
+    Note:
+        - The sent SMS are matched by recipient (normalized phone numbers) and content, against the sent box SMS
+        that are newer than the last checked one (the sent box IDs only increase). The last checked ID
+        starts at the newest sent box SMS, so the SMS sent before the tracker cannot confirm a new send.
+        - A sent box SMS with the "sent" status confirms the SMS, the "send failed" status
+        or a copy inside the draft box fails it, nothing after the timeout leaves it unconfirmed.
+        - A sent box SMS with any other status (still being sent) leaves the SMS pending, the last checked ID
+        stays below it so it is read again by the next checks (the SMS already matched are not reused).
+        - Failed and unconfirmed SMS are requeued (see SendQueue.requeue()), the final
+        state of each recipient is recorded inside the history ("Delivery" field).
+        - The tracked SMS are persisted inside a JSON-lines file, like the outbox.
+        - The router must save the sent SMS (default setting of the Huawei routers).
+    """
+
+    DELIVERY_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/delivery.jsonl")
+
+    # "Smstat" values of the sent box SMS
+    SENT_STATUS = "3"
+    FAILED_STATUS = "4"
+
+    # Max number of sent box pages read per check
+    MAX_PAGES = 5
+    PAGE_SIZE = 50
+
+    # Number of events inside the file before it is compacted
+    COMPACTION_THRESHOLD = 1000
+
+
+    def __init__(
+        self,
+        path: str,
+        send_queue: SendQueue,
+        interval: float = 10,
+        timeout: float = 300,
+        router_name: str = ""
+    ):
+        self.path = path
+        self.send_queue = send_queue
+        self.interval = interval
+        self.timeout = timeout
+        self.router_name = router_name
+
+        # Tracked sends (ID -> entry with the "pending" phone numbers and "sent_at"), oldest first
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+
+        # Highest sent box ID already checked (None until seeded, see DeliveryTracker.seed())
+        self.last_sent_id: Optional[int] = None
+
+        # Sent box IDs above the last checked one that already resolved a send
+        self.matched_ids: set[int] = set()
+
+        self.last_check_time = 0.0
+        self.event_count = 0
+        self.lock = threading.Lock()
+
+        send_queue.on_sent = self.track
+
+        Metrics.register_gauge(Metrics.labeled("unconfirmed_sms", router=router_name), self.__len__)
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    @staticmethod
+    def from_config(config: dict[str, Any], send_queue: SendQueue) -> Optional["DeliveryTracker"]:
+        """
+        Returns the delivery tracker of a router (loaded), None if disabled.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (or a router config).
+            send_queue (SendQueue): Send queue of the router.
+        """
+
+        if not config["DELIVERY_ENABLED"]:
+            return None
+
+        tracker = DeliveryTracker(
+            AppHistory.get_partition_path(DeliveryTracker.DELIVERY_PATH, config["ROUTER_NAME"]),
+            send_queue,
+            config["DELIVERY_INTERVAL"],
+            config["DELIVERY_TIMEOUT"],
+            config["ROUTER_NAME"]
+        )
+        tracker.load()
+
+        return tracker
+
+
+    def _append(self, events: list[dict]) -> None:
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+
+            with open(self.path, "a", encoding="utf-8") as delivery_file:
+                delivery_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                delivery_file.flush()
+                os.fsync(delivery_file.fileno())
+
+            self.event_count += len(events)
+        except OSError as err:
+            logger.error(f"Delivery file could not be written:\n{err}")
+
+
+    def _compact(self) -> None:
+        """
+        Rewrites the file with only the tracked sends (temp file then atomic rename).
+        """
+
+        tmp_path = f"{self.path}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                if self.last_sent_id is not None:
+                    tmp_file.write(json.dumps(self._get_checked_event()) + "\n")
+
+                for entry in self.entries.values():
+                    tmp_file.write(json.dumps({"event": "tracked", **entry}, ensure_ascii=False) + "\n")
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.path)
+            self.event_count = len(self.entries) + 1
+        except OSError as err:
+            logger.error(f"Delivery file could not be compacted:\n{err}")
+
+
+    def load(self) -> bool:
+        """
+        Restores the tracked sends from the file.
+
+        Returns:
+            bool: True if the file has been correctly loaded.
+        """
+
+        self.entries = OrderedDict()
+        self.event_count = 0
+
+        if not os.path.exists(self.path):
+            return True
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as delivery_file:
+                for line in delivery_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted delivery event ignored")
+                        continue
+
+                    self.event_count += 1
+                    event_type = event.pop("event")
+
+                    if event_type == "tracked":
+                        self.entries[event["id"]] = event
+                    elif event_type == "confirmed":
+                        self.entries.pop(event["id"], None)
+                    elif event_type == "checked":
+                        self.last_sent_id = event["last_sent_id"]
+                        self.matched_ids = set(event.get("matched_ids", []))
+        except OSError as err:
+            logger.error(f"Delivery file could not be loaded:\n{err}")
+            return False
+
+        self._compact()
+
+        return True
+
+
+    def track(self, entry: dict, phone_numbers: list[str]) -> None:
+        """
+        Tracks a SMS accepted by the router (called by the send queue).
+
+        Args:
+            entry (dict): The send queue entry.
+            phone_numbers (list[str]): The phone numbers accepted by the router.
+        """
+
+        tracked_entry = {**entry, "pending": phone_numbers, "sent_at": time.time()}
+
+        with self.lock:
+            self._append([{"event": "tracked", **tracked_entry}])
+            self.entries[tracked_entry["id"]] = tracked_entry
+
+
+    def _get_checked_event(self) -> dict:
+        return {"event": "checked", "last_sent_id": self.last_sent_id, "matched_ids": sorted(self.matched_ids)}
+
+
+    def seed(self, client: Client) -> bool:
+        """
+        Starts the checks after the newest sent box SMS (only once, before the first send),
+        so the SMS sent before the tracker are never matched.
+
+        Args:
+            client (Client): The API client.
+
+        Returns:
+            bool: True if the tracker is seeded.
+        """
+
+        if self.last_sent_id is not None:
+            return True
+
+        try:
+            raw_sms_list = client.sms.get_sms_list(1, BoxTypeEnum.LOCAL_SENT, 1, SortTypeEnum.DATE, False, False)
+        except Exception as err:
+            logger.error(f"Sent box cannot be returned by the router\n{err}")
+            return False
+
+        if raw_sms_list["Count"] == "0" or raw_sms_list["Messages"] is None:
+            last_sent_id = 0
+        else:
+            messages = raw_sms_list["Messages"]["Message"]
+            last_sent_id = max(int(sms["Index"]) for sms in (messages if isinstance(messages, list) else [messages]))
+
+        with self.lock:
+            self.last_sent_id = last_sent_id
+            self._append([self._get_checked_event()])
+
+        return True
+
+
+    def is_due(self) -> bool:
+        return len(self.entries) > 0 and time.monotonic() - self.last_check_time >= self.interval
+
+
+    def _get_box(self, client: Client, box_type: BoxTypeEnum, max_pages: int) -> list[dict[str, str]]:
+        """
+        Returns the SMS of a box that are newer than the last checked one (newest first).
+        """
+
+        messages: list[dict[str, str]] = []
+
+        for page in range(1, max_pages + 1):
+            raw_sms_list = client.sms.get_sms_list(
+                page,
+                box_type,
+                DeliveryTracker.PAGE_SIZE,
+                SortTypeEnum.DATE,
+                False,
+                False
+            )
+
+            if raw_sms_list["Count"] == "0" or raw_sms_list["Messages"] is None:
+                break
+
+            raw_messages = raw_sms_list["Messages"]["Message"]
+
+            for sms in raw_messages:
+                if self.last_sent_id is not None and int(sms["Index"]) <= self.last_sent_id:
+                    return messages
+
+                messages.append(sms)
+
+            if len(raw_messages) < DeliveryTracker.PAGE_SIZE:
+                break
+
+        return messages
+
+
+    def _resolve(self, entry: dict, states: dict[str, str]) -> None:
+        """
+        Records the final states of a tracked send and requeues the failed recipients.
+        """
+
+        failed_numbers = [phone_number for phone_number, state in states.items() if state != "sent"]
+
+        for state in states.values():
+            Metrics.increment(f"delivery_{state}")
+
+        # A digest SMS is recorded inside the history of every SMS it contains
+        sources = entry.get("source")
+
+        for source in sources if isinstance(sources, list) else [sources]:
+            if source is not None:
+                AppHistory.set_delivery_states(source, states, self.router_name)
+
+        if len(failed_numbers) > 0:
+            logger.warning(f"SMS to {', '.join(failed_numbers)} not sent by the router ({', '.join(sorted(set(states.values())))}), requeued")
+
+            queue_entry = {key: value for key, value in entry.items() if key not in ("pending", "sent_at")}
+            self.send_queue.requeue(queue_entry, failed_numbers)
+
+
+    @staticmethod
+    def is_final(sms: dict[str, str]) -> bool:
+        """
+        Returns True if the status of a sent box SMS cannot change anymore ("sent" or "send failed").
+        """
+
+        return sms["Smstat"] in (DeliveryTracker.SENT_STATUS, DeliveryTracker.FAILED_STATUS)
+
+
+    @Metrics.timed("delivery_check")
+    def check(self, client: Client, routing: Optional[RoutingTable] = None) -> int:
+        """
+        Matches the tracked sends with the router sent box and draft box (a few list requests per check).
+
+        Args:
+            client (Client): The API client.
+            routing (RoutingTable, optional): Normalizes the phone numbers before matching them.
+
+        Returns:
+            int: Number of confirmed recipients.
+        """
+
+        def normalize(phone_number: str) -> str:
+            return routing.normalize(phone_number) if routing is not None else phone_number
+
+        self.last_check_time = time.monotonic()
+
+        try:
+            sent_messages = self._get_box(client, BoxTypeEnum.LOCAL_SENT, DeliveryTracker.MAX_PAGES)
+            draft_messages = self._get_box(client, BoxTypeEnum.LOCAL_DRAFT, 1)
+        except Exception as err:
+            logger.error(f"Sent box cannot be returned by the router\n{err}")
+            return 0
+
+        # (phone number, content) -> sent box SMS (or draft), oldest first
+        candidates: dict[tuple[str, str], list[tuple[dict[str, str], bool]]] = {}
+
+        for sms, is_draft in [(sms, True) for sms in reversed(draft_messages)] + [(sms, False) for sms in reversed(sent_messages)]:
+            if int(sms["Index"]) not in self.matched_ids:
+                candidates.setdefault((normalize(sms["Phone"] or ""), sms["Content"] or ""), []).append((sms, is_draft))
+
+        resolved: list[tuple[dict, dict[str, str]]] = []
+        now = time.time()
+
+        with self.lock:
+            for entry in list(self.entries.values()):
+                states: dict[str, str] = {}
+
+                for phone_number in entry["pending"]:
+                    matches = candidates.get((normalize(phone_number), entry["content"]))
+
+                    if matches:
+                        sms, is_draft = matches.pop(0)
+
+                        # Still being sent, checked again by the next checks
+                        if not is_draft and not DeliveryTracker.is_final(sms):
+                            if now - entry["sent_at"] > self.timeout:
+                                states[phone_number] = "unconfirmed"
+
+                            continue
+
+                        self.matched_ids.add(int(sms["Index"]))
+                        is_sent = not is_draft and sms["Smstat"] == DeliveryTracker.SENT_STATUS
+                        states[phone_number] = "sent" if is_sent else "failed"
+                    elif now - entry["sent_at"] > self.timeout:
+                        states[phone_number] = "unconfirmed"
+
+                if len(states) == 0:
+                    continue
+
+                entry["pending"] = [phone_number for phone_number in entry["pending"] if phone_number not in states]
+                resolved.append((entry, states))
+
+                if len(entry["pending"]) == 0:
+                    self._append([{"event": "confirmed", "id": entry["id"]}])
+                    self.entries.pop(entry["id"], None)
+                else:
+                    self._append([{"event": "tracked", **entry}])
+
+            # Newest checked ID below the SMS still being sent (the older sent box SMS are never read again)
+            last_sent_id = self.last_sent_id
+
+            for sms in sorted(sent_messages, key=lambda sms: int(sms["Index"])):
+                if not DeliveryTracker.is_final(sms):
+                    break
+
+                last_sent_id = int(sms["Index"])
+
+            if last_sent_id != self.last_sent_id or len(resolved) > 0:
+                self.last_sent_id = last_sent_id
+                self.matched_ids = {sms_id for sms_id in self.matched_ids if last_sent_id is None or sms_id > last_sent_id}
+                self._append([self._get_checked_event()])
+
+            if self.event_count > DeliveryTracker.COMPACTION_THRESHOLD:
+                self._compact()
+
+        # Outside of the lock, the send queue calls DeliveryTracker.track() while holding its own lock
+        for entry, states in resolved:
+            self._resolve(entry, states)
+
+        return sum(list(states.values()).count("sent") for _, states in resolved)
@@ -0,0 +1,580 @@
+from libs.app_history import AppHistory
+from libs.metrics import Metrics
+from libs import logger
+from email.message import EmailMessage
+from collections import deque
+from typing import Any, Optional
+
+import threading
+import abc
+import requests
+import smtplib
+import socket
+import struct
+import queue
+import uuid
+import json
+import time
+import sys
+import os
+
+
+class ForwardSink(abc.ABC):
+    """
+    Non-SMS forwarding target (webhook, SMTP, spool file/socket or MQTT), with its own worker thread.
+
+    Note:
+        - ForwardSink.submit() never blocks: the SMS are added to a bounded memory queue
+        (dropped with an error if it is full), so a slow sink never delays the inbox polling.
+        - The worker delivers the SMS in batches (up to batch_size SMS, or what was received
+        during batch_delay), a failed batch is retried with an exponential backoff, then written
+        to the dead letter file after max_attempts attempts.
+        - The SMS are saved inside the history when they are queued, like the forwarded SMS.
+        - The queued SMS are persisted inside a JSON-lines file per sink ("sink.<name>.jsonl"), like the outbox,
+        so they are delivered after a crash or a restart (see ForwardSink.load()).
+    """
+
+    PENDING_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/sink.jsonl")
+    DEAD_LETTER_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/sink_dead_letter.jsonl")
+
+    # Number of events inside the file before it is compacted
+    COMPACTION_THRESHOLD = 1000
+
+    # Key of a sink inside the forwarders (see ConfigParser.get_config())
+    FORWARDER_PREFIX = "sink:"
+
+    # Max delay between two attempts (in seconds)
+    MAX_RETRY_DELAY = 300
+
+    # Required settings of every sink type
+    TYPES: dict[str, tuple[str, ...]] = {
+        "webhook": ("url",),
+        "smtp": ("host", "sender", "recipients"),
+        "spool": ("path",),
+        "mqtt": ("host", "topic")
+    }
+
+
+    def __init__(self, settings: dict[str, Any]):
+        """
+        Args:
+            settings (dict[str, Any]): A sink of the "SINKS" config key (see ConfigParser.parse_sink()).
+        """
+
+        self.settings = settings
+        self.name: str = settings["name"]
+        self.batch_size: int = settings["batch_size"]
+        self.batch_delay: float = settings["batch_delay"]
+        self.timeout: float = settings["timeout"]
+        self.max_attempts: int = settings["max_attempts"]
+        self.retry_delay: float = settings["retry_delay"]
+
+        self.queue: queue.Queue[dict[str, Any]] = queue.Queue(settings["queue_size"])
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        # Queued SMS that are not delivered or dead-lettered yet (ID -> record), persisted inside the file
+        self.pending_path = AppHistory.get_partition_path(ForwardSink.PENDING_PATH, self.name)
+        self.pending: dict[str, dict[str, Any]] = {}
+        self.event_count = 0
+
+        # Restored SMS that did not fit inside the queue (IDs), queued as the worker frees some space
+        self.backlog: deque[str] = deque()
+        self.lock = threading.Lock()
+
+        Metrics.register_gauge(Metrics.labeled("sink_queue_size", sink=self.name), self.queue.qsize)
+
+
+    @staticmethod
+    def from_config(settings: dict[str, Any]) -> "ForwardSink":
+        sink_classes: dict[str, type[ForwardSink]] = {
+            "webhook": WebhookSink,
+            "smtp": SmtpSink,
+            "spool": SpoolSink,
+            "mqtt": MqttSink
+        }
+
+        return sink_classes[settings["type"]](settings)
+
+
+    def _append(self, events: list[dict]) -> bool:
+        try:
+            if not os.path.exists(os.path.dirname(self.pending_path)):
+                os.makedirs(os.path.dirname(self.pending_path))
+
+            with open(self.pending_path, "a", encoding="utf-8") as sink_file:
+                sink_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                sink_file.flush()
+                os.fsync(sink_file.fileno())
+
+            self.event_count += len(events)
+
+            return True
+        except OSError as err:
+            logger.error(f"Sink {self.name} file could not be written:\n{err}")
+
+        return False
+
+
+    def _compact(self) -> None:
+        """
+        Rewrites the file with only the queued SMS (temp file then atomic rename).
+        """
+
+        tmp_path = f"{self.pending_path}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                for sms_id, record in self.pending.items():
+                    tmp_file.write(json.dumps({"event": "queued", "id": sms_id, "record": record}, ensure_ascii=False) + "\n")
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.pending_path)
+            self.event_count = len(self.pending)
+        except OSError as err:
+            logger.error(f"Sink {self.name} file could not be compacted:\n{err}")
+
+
+    def load(self) -> bool:
+        """
+        Restores the queued SMS from the file (queued again for the worker).
+
+        Returns:
+            bool: True if the file has been correctly loaded.
+        """
+
+        self.pending = {}
+        self.event_count = 0
+        self.backlog = deque()
+
+        # The SMS submitted before are inside the file too
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+        if not os.path.exists(self.pending_path):
+            return True
+
+        try:
+            with open(self.pending_path, "r", encoding="utf-8") as sink_file:
+                for line in sink_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Corrupted sink {self.name} event ignored")
+                        continue
+
+                    if event["event"] == "queued":
+                        self.pending[event["id"]] = event["record"]
+                    elif event["event"] == "done":
+                        for sms_id in event["ids"]:
+                            self.pending.pop(sms_id, None)
+        except OSError as err:
+            logger.error(f"Sink {self.name} file could not be loaded:\n{err}")
+            return False
+
+        # SMS over the queue size are queued later (see ForwardSink.refill())
+        self.backlog.extend(self.pending.keys())
+        self.refill()
+
+        if len(self.pending) > 0:
+            logger.info(f"{len(self.pending)} queued SMS restored for the sink {self.name}")
+
+        self._compact()
+
+        return True
+
+
+    def submit(self, record: dict[str, Any]) -> bool:
+        """
+        Queues a SMS for the worker (non-blocking, written to the disk before returning).
+
+        Returns:
+            bool: False if the queue is full (the SMS is dropped) or if the SMS could not be written.
+        """
+
+        sms_id = uuid.uuid4().hex
+
+        with self.lock:
+            if self.queue.full():
+                Metrics.increment("sink_dropped")
+                logger.error(f"Sink {self.name} is full, SMS {record.get('Index')} dropped")
+                return False
+
+            if not self._append([{"event": "queued", "id": sms_id, "record": record}]):
+                return False
+
+            self.pending[sms_id] = record
+            self.queue.put_nowait({"id": sms_id, "record": record})
+
+        return True
+
+
+    def refill(self) -> None:
+        """
+        Queues the restored SMS that did not fit inside the queue, as long as it has some space.
+        """
+
+        with self.lock:
+            while len(self.backlog) > 0 and not self.queue.full():
+                sms_id = self.backlog.popleft()
+
+                if sms_id in self.pending:
+                    self.queue.put_nowait({"id": sms_id, "record": self.pending[sms_id]})
+
+
+    def remove(self, sms_ids: list[str]) -> None:
+        """
+        Removes the delivered (or dead-lettered) SMS from the file.
+        """
+
+        with self.lock:
+            for sms_id in sms_ids:
+                self.pending.pop(sms_id, None)
+
+            self._append([{"event": "done", "ids": sms_ids}])
+
+            if self.event_count > ForwardSink.COMPACTION_THRESHOLD:
+                self._compact()
+
+
+    @abc.abstractmethod
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        """
+        Delivers a batch of SMS (implemented by every sink type).
+
+        Raises:
+            Exception: The batch could not be delivered (retried).
+        """
+
+
+    def close(self) -> None:
+        """
+        Closes the connection kept between two batches (if any).
+        """
+
+
+    def get_batch(self) -> list[dict[str, Any]]:
+        """
+        Waits for the first SMS, then for the next ones until the batch is full or the batch delay is over
+        (queue items, with the "id" and the "record" of every SMS).
+        """
+
+        try:
+            batch = [self.queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.batch_delay
+
+        while len(batch) < self.batch_size:
+            remaining_time = deadline - time.monotonic()
+
+            try:
+                batch.append(self.queue.get(timeout=remaining_time) if remaining_time > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+
+    def deliver_batch(self, batch: list[dict[str, Any]]) -> Optional[bool]:
+        """
+        Delivers a batch with retries, the batch is dead-lettered if every attempt failed.
+
+        Note:
+            Once the sink is stopping, a failed batch is not retried nor dead-lettered,
+            it is kept inside the pending file and delivered by the next start.
+
+        Returns:
+            Optional[bool]: True if the batch has been delivered, False if it has been dead-lettered,
+                None if it is kept for the next start.
+        """
+
+        for attempt in range(1, self.max_attempts + 1):
+            start_time = time.perf_counter()
+
+            try:
+                self.deliver(batch)
+            except Exception as err:
+                Metrics.increment("sink_failures")
+                logger.warning(f"Sink {self.name} failed to deliver {len(batch)} SMS (attempt {attempt}/{self.max_attempts}):\n{err}")
+
+                self.close()
+
+                if self.stop_event.is_set():
+                    logger.warning(f"Sink {self.name} is stopping, {len(batch)} SMS kept for the next start")
+                    return None
+
+                if attempt < self.max_attempts:
+                    self.stop_event.wait(min(self.retry_delay * 2 ** (attempt - 1), ForwardSink.MAX_RETRY_DELAY))
+
+                continue
+
+            Metrics.observe(f"sink_{self.name}", time.perf_counter() - start_time)
+            Metrics.increment("sink_delivered", len(batch))
+
+            return True
+
+        logger.error(f"Sink {self.name} could not deliver {len(batch)} SMS, moved to the dead letter file")
+        Metrics.increment("sink_dead_letters", len(batch))
+
+        try:
+            if not os.path.exists(os.path.dirname(ForwardSink.DEAD_LETTER_PATH)):
+                os.makedirs(os.path.dirname(ForwardSink.DEAD_LETTER_PATH))
+
+            with open(ForwardSink.DEAD_LETTER_PATH, "a", encoding="utf-8") as dead_letter_file:
+                dead_letter_file.write("".join(
+                    json.dumps({"sink": self.name, "failed_at": time.time(), **record}, ensure_ascii=False) + "\n"
+                    for record in batch
+                ))
+                dead_letter_file.flush()
+                os.fsync(dead_letter_file.fileno())
+        except OSError as err:
+            logger.error(f"Sink dead letter file could not be written:\n{err}")
+
+        return False
+
+
+    def run(self) -> None:
+        """
+        Worker loop (runs until ForwardSink.stop() is called and the queue is empty).
+        """
+
+        while not self.stop_event.is_set() or not self.queue.empty():
+            self.refill()
+            batch = self.get_batch()
+
+            if len(batch) == 0:
+                continue
+
+            # Undelivered while stopping, the remaining SMS stay inside the pending file
+            if self.deliver_batch([item["record"] for item in batch]) is None:
+                break
+
+            self.remove([item["id"] for item in batch])
+
+        self.close()
+
+
+    def start(self) -> None:
+        """
+        Restores the SMS queued before the last exit, then starts the worker.
+        """
+
+        self.load()
+
+        self.thread = threading.Thread(target=self.run, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Stops the worker once the queued SMS are delivered (or dead-lettered, no more retries),
+        the SMS that are still queued after the timeout are delivered by the next start.
+        """
+
+        self.stop_event.set()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+class WebhookSink(ForwardSink):
+    """
+    POSTs every batch as JSON ({"messages": [...]}) to an URL, with optional headers.
+    """
+
+    def __init__(self, settings: dict[str, Any]):
+        super().__init__(settings)
+
+        self.url: str = settings["url"]
+        self.headers: dict[str, str] = settings.get("headers") or {}
+
+        # Keep-alive connection between two batches
+        self.session = requests.Session()
+
+
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        response = self.session.post(self.url, json={"messages": batch}, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class SmtpSink(ForwardSink):
+    """
+    Sends one email per SMS, with a single SMTP connection per batch.
+    """
+
+    def __init__(self, settings: dict[str, Any]):
+        super().__init__(settings)
+
+        self.host: str = settings["host"]
+        self.port: int = settings.get("port", 587 if settings.get("starttls", True) else 25)
+        self.starttls: bool = settings.get("starttls", True)
+        self.username: str = settings.get("username", "")
+        self.password: str = settings.get("password", "")
+        self.sender: str = settings["sender"]
+        self.recipients: list[str] = settings["recipients"]
+
+
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+
+            if self.username != "":
+                smtp.login(self.username, self.password)
+
+            for record in batch:
+                message = EmailMessage()
+                message["Subject"] = f"SMS from {record.get('Contact') or record.get('Phone')}"
+                message["From"] = self.sender
+                message["To"] = ", ".join(self.recipients)
+                message.set_content(record.get("Text") or record.get("Content") or "")
+
+                smtp.send_message(message)
+
+
+class SpoolSink(ForwardSink):
+    """
+    Appends every SMS as a JSON line to a local file, or writes it to a Unix socket ("unix:/path").
+    """
+
+    def __init__(self, settings: dict[str, Any]):
+        super().__init__(settings)
+
+        self.path: str = settings["path"]
+
+
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode("utf-8")
+
+        if self.path.startswith("unix:"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as unix_socket:
+                unix_socket.settimeout(self.timeout)
+                unix_socket.connect(self.path[len("unix:"):])
+                unix_socket.sendall(payload)
+
+            return
+
+        with open(self.path, "ab") as spool_file:
+            spool_file.write(payload)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+
+
+class MqttSink(ForwardSink):
+    """
+    Publishes every SMS as JSON to a topic of a MQTT 3.1.1 broker (QoS 0, no TLS),
+    the connection is kept between two batches.
+
+    Note:
+        QoS 0 has no broker acknowledgment, a SMS is only retried if the connection fails.
+    """
+
+    # Keep-alive interval sent to the broker, the connection is renewed after half of it without publishing
+    KEEP_ALIVE = 60
+
+
+    def __init__(self, settings: dict[str, Any]):
+        super().__init__(settings)
+
+        self.host: str = settings["host"]
+        self.port: int = settings.get("port", 1883)
+        self.topic: str = settings["topic"]
+        self.client_id: str = settings.get("client_id", f"sms-forwarding-{os.getpid()}")
+        self.username: str = settings.get("username", "")
+        self.password: str = settings.get("password", "")
+
+        self.connection: Optional[socket.socket] = None
+        self.last_publish_time = 0.0
+
+
+    @staticmethod
+    def encode_string(value: str) -> bytes:
+        data = value.encode("utf-8")
+        return struct.pack("!H", len(data)) + data
+
+
+    @staticmethod
+    def encode_packet(packet_type: int, body: bytes) -> bytes:
+        """
+        Returns a MQTT packet (fixed header with the variable length encoding, then the body).
+        """
+
+        header = bytearray([packet_type])
+        length = len(body)
+
+        while True:
+            length, digit = divmod(length, 128)
+            header.append(digit | 0x80 if length > 0 else digit)
+
+            if length == 0:
+                break
+
+        return bytes(header) + body
+
+
+    def connect(self) -> socket.socket:
+        flags = 0x02
+        payload = MqttSink.encode_string(self.client_id)
+
+        if self.username != "":
+            flags |= 0x80
+            payload += MqttSink.encode_string(self.username)
+
+            if self.password != "":
+                flags |= 0x40
+                payload += MqttSink.encode_string(self.password)
+
+        body = MqttSink.encode_string("MQTT") + bytes([4, flags]) + struct.pack("!H", MqttSink.KEEP_ALIVE) + payload
+
+        connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection.sendall(MqttSink.encode_packet(0x10, body))
+
+        # CONNACK (4 bytes), return code 0 if accepted
+        connack = b""
+
+        while len(connack) < 4:
+            data = connection.recv(4 - len(connack))
+
+            if data == b"":
+                break
+
+            connack += data
+
+        if len(connack) < 4 or connack[0] != 0x20 or connack[3] != 0:
+            connection.close()
+            raise ConnectionError(f"MQTT connection refused by {self.host}:{self.port} ({connack.hex()})")
+
+        return connection
+
+
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        if self.connection is None or time.monotonic() - self.last_publish_time > MqttSink.KEEP_ALIVE / 2:
+            self.close()
+            self.connection = self.connect()
+
+        topic = MqttSink.encode_string(self.topic)
+        packets = b"".join(
+            MqttSink.encode_packet(0x30, topic + json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            for record in batch
+        )
+
+        self.connection.sendall(packets)
+        self.last_publish_time = time.monotonic()
+
+
+    def close(self) -> None:
+        if self.connection is None:
+            return
+
+        try:
+            # DISCONNECT
+            self.connection.sendall(b"\xe0\x00")
+        except OSError:
+            pass
+
+        self.connection.close()
+        self.connection = None
@@ -0,0 +1,255 @@
+from libs.app_history import AppHistory
+from libs.history_store import HistoryStore
+from typing import Callable, Iterator, Optional, TextIO
+
+import argparse
+import json
+import csv
+import sys
+import os
+
+
+class HistoryCli:
+    """
+    "history" subcommand of the app, streams the history files without starting the app.
+
+    Usage (from /src):
+        python app.py history export --since 2024-01-01 --phone "+33123456789" --format csv
+        python app.py history stats --by sender-day
+
+    Note:
+        - The records are streamed line by line, so the memory usage does not depend on the history size
+        (the stats only keep one counter per group).
+        - The lines that cannot match the phone/content filters are skipped before being decoded.
+        - Every partition of the multi-router mode is read ("history.<router>.jsonl").
+    """
+
+    # Columns of the CSV export
+    FIELDS = ("Router", "Index", "Date", "Phone", "Contact", "Content")
+
+    # Stats groups
+    GROUPS = {
+        "sender": ("Phone",),
+        "day": ("Day",),
+        "sender-day": ("Phone", "Day"),
+        "router": ("Router",)
+    }
+
+
+    @staticmethod
+    def get_parser() -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog="app.py history", description="Forwarded SMS history")
+        subparsers = parser.add_subparsers(dest="command", required=True)
+
+        export_parser = subparsers.add_parser("export", help="Streams the matching SMS to stdout")
+        stats_parser = subparsers.add_parser("stats", help="Counts the matching SMS per group")
+
+        for subparser in (export_parser, stats_parser):
+            subparser.add_argument("--since", help="First date (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS)")
+            subparser.add_argument("--until", help="Last date (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS), included")
+            subparser.add_argument("--phone", help="Sender phone number (a prefix if it ends with \"*\")")
+            subparser.add_argument("--contact", help="Contact name (case-insensitive substring)")
+            subparser.add_argument("--contains", help="Content of the SMS (case-insensitive substring)")
+            subparser.add_argument("--router", help="Router name (multi-router mode)")
+            subparser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+
+        stats_parser.add_argument("--by", choices=tuple(HistoryCli.GROUPS.keys()), default="sender-day")
+
+        return parser
+
+
+    @staticmethod
+    def get_line_filter(args: argparse.Namespace) -> Optional[Callable[[bytes], bool]]:
+        """
+        Returns a check of the raw JSON lines that can only reject non-matching records.
+
+        Note:
+            The history is written with ensure_ascii=False, so a phone number or a content
+            without characters escaped by JSON appears as is inside the line.
+        """
+
+        phone_needle = (args.phone or "").replace(" ", "").rstrip("*").encode("utf-8")
+        content_needle = b""
+
+        # ASCII only, as bytes.lower() ignores the other characters
+        if args.contains and args.contains.isascii():
+            content = args.contains.lower()
+
+            if json.dumps(content)[1:-1] == content:
+                content_needle = content.encode("utf-8")
+
+        if phone_needle == b"" and content_needle == b"":
+            return None
+
+        def line_filter(line: bytes) -> bool:
+            if phone_needle not in line:
+                return False
+
+            return content_needle == b"" or content_needle in line.lower()
+
+        return line_filter
+
+
+    @staticmethod
+    def get_record_filter(args: argparse.Namespace) -> Callable[[dict[str, str]], bool]:
+        """
+        Returns the filter of the decoded records.
+        """
+
+        phone_number = (args.phone or "").replace(" ", "")
+        is_prefix = phone_number.endswith("*")
+        phone_number = phone_number.rstrip("*")
+        contact = (args.contact or "").lower()
+        content = (args.contains or "").lower()
+
+        # A day only ("YYYY-MM-DD") includes the whole day
+        until = args.until or ""
+        until_length = 10 if len(until) == 10 else 19
+
+        def record_filter(record: dict[str, str]) -> bool:
+            sms_date = record.get("Date") or ""
+
+            if args.since and sms_date < args.since:
+                return False
+
+            if until and sms_date[:until_length] > until:
+                return False
+
+            if phone_number or is_prefix:
+                sender = (record.get("Phone") or "").replace(" ", "")
+
+                is_matching = sender.startswith(phone_number) if is_prefix else sender == phone_number
+
+                if not is_matching:
+                    return False
+
+            if contact and contact not in (record.get("Contact") or "").lower():
+                return False
+
+            if content and content not in (record.get("Content") or "").lower():
+                return False
+
+            if args.router is not None and (record.get("Router") or "") != args.router:
+                return False
+
+            return True
+
+        return record_filter
+
+
+    @staticmethod
+    def iter_matching(args: argparse.Namespace) -> Iterator[dict[str, str]]:
+        """
+        Streams the matching records of every history partition.
+        """
+
+        line_filter = HistoryCli.get_line_filter(args)
+        record_filter = HistoryCli.get_record_filter(args)
+
+        partitions = [""] + AppHistory.get_partitions()
+
+        if args.router is not None:
+            partitions = [partition for partition in partitions if partition in ("", args.router)]
+
+        for partition in partitions:
+            store = HistoryStore(AppHistory.get_partition_path(AppHistory.HISTORY_PATH, partition))
+
+            for record in store.iter_records(line_filter):
+                if record_filter(record):
+                    yield record
+
+
+    @staticmethod
+    def write_rows(rows: Iterator[dict[str, str]], fields: tuple[str, ...], output_format: str, output: TextIO) -> int:
+        """
+        Writes the rows as JSON lines or CSV.
+
+        Returns:
+            int: Number of written rows.
+        """
+
+        count = 0
+
+        if output_format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(fields)
+
+            for row in rows:
+                writer.writerow([row.get(field, "") for field in fields])
+                count += 1
+        else:
+            for row in rows:
+                output.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+
+        return count
+
+
+    @staticmethod
+    def export(args: argparse.Namespace, output: TextIO) -> int:
+        return HistoryCli.write_rows(HistoryCli.iter_matching(args), HistoryCli.FIELDS, args.format, output)
+
+
+    @staticmethod
+    def stats(args: argparse.Namespace, output: TextIO) -> int:
+        """
+        Counts the matching records per group (sender, day, sender & day or router).
+        """
+
+        group_fields = HistoryCli.GROUPS[args.by]
+        counts: dict[tuple[str, ...], int] = {}
+        contacts: dict[str, str] = {}
+
+        for record in HistoryCli.iter_matching(args):
+            values = {**record, "Day": (record.get("Date") or "")[:10]}
+            key = tuple(values.get(field) or "" for field in group_fields)
+            counts[key] = counts.get(key, 0) + 1
+
+            if record.get("Contact"):
+                contacts[record.get("Phone") or ""] = record["Contact"]
+
+        # The contact name is added to the sender groups
+        fields = group_fields + (("Contact",) if "Phone" in group_fields else ()) + ("Count",)
+        rows = []
+
+        for key, count in sorted(counts.items()):
+            row = dict(zip(group_fields, key))
+
+            if "Phone" in row:
+                row["Contact"] = contacts.get(row["Phone"], "")
+
+            row["Count"] = count # type: ignore
+            rows.append(row)
+
+        return HistoryCli.write_rows(iter(rows), fields, args.format, output)
+
+
+    @staticmethod
+    def main(argv: list[str]) -> int:
+        """
+        Runs the "history" subcommand.
+
+        Args:
+            argv (list[str]): Arguments following "history".
+
+        Returns:
+            int: Exit code.
+        """
+
+        args = HistoryCli.get_parser().parse_args(argv)
+
+        try:
+            if args.command == "export":
+                HistoryCli.export(args, sys.stdout)
+            else:
+                HistoryCli.stats(args, sys.stdout)
+
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Output closed early ("| head"), the remaining output is discarded
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+        except KeyboardInterrupt:
+            return 130
+
+        return 0
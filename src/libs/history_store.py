@@ -0,0 +1,752 @@
+from libs import logger
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+from array import array
+
+import hashlib
+import bisect
+import json
+import os
+
+
+class HistoryStore:
+    """
+    Append-only JSON-lines history store, keyed by SMS ID, date and phone number.
+
+    Note:
+        - The router reuses the IDs of the deleted SMS, so a record is identified by its ID,
+        date and phone number (see HistoryStore.get_key()).
+        - A reassembled SMS (see SmsAssembler) is also found from the keys of its parts ("Parts" field).
+        - Every record is a single JSON line, so saving the history only appends
+        the new records instead of rewriting the whole file.
+        - Only a bounded window of the most recently used records is kept in memory (LRU),
+        older records are read from their offset inside the file (see HistoryStore.find()).
+        - The offset index only holds a 64-bit hash and an offset per key (16 bytes, no record),
+        it is built by streaming the file on the first lookup outside of the hot window.
+        - An updated record is appended again, the file is compacted once the superseded
+        lines exceed COMPACTION_RATIO of the live records (see HistoryStore.should_compact()).
+    """
+
+    # Size of the blocks read when loading the end of the file
+    TAIL_BLOCK_SIZE = 64 * 1024
+
+    # Superseded lines (compared to the live records) before the file is compacted
+    COMPACTION_RATIO = 0.5
+    COMPACTION_MIN_STALE = 1000
+
+    # Offsets of the newest lines kept apart before being merged into the sorted index arrays
+    INDEX_MERGE_SIZE = 10000
+
+
+    def __init__(self, path: str, hot_window: int = 1000):
+        self.path = path
+        self.hot_window = hot_window
+
+        # Most recently used records (key -> record), the oldest are evicted first
+        self.hot: OrderedDict[str, dict[str, str]] = OrderedDict()
+
+        # Records waiting to be appended to the file
+        self.pending: dict[str, dict[str, str]] = {}
+
+        # Pending records that supersede a record already inside the file (see HistoryStore.update())
+        self.updated: set[str] = set()
+
+        # Number of lines inside the file (None until counted) and number of superseded lines
+        self.line_count: Optional[int] = None
+        self.stale_records = 0
+
+        # Offset index of the newest line of every key, sorted key hashes (None until built) and their offsets,
+        # the lines appended since the last merge are inside index_delta (key hash -> offset)
+        self.index_hashes: Optional[array] = None
+        self.index_offsets = array("Q")
+        self.index_delta: dict[int, int] = {}
+
+
+    @staticmethod
+    def get_key(sms: dict[str, str]) -> str:
+        """
+        Returns the key identifying a SMS inside the history ("<ID>|<date>|<phone number>").
+        """
+
+        return f"{sms.get('Index', '')}|{sms.get('Date') or ''}|{sms.get('Phone') or ''}"
+
+
+    @staticmethod
+    def get_part_keys(record: dict) -> list[str]:
+        """
+        Returns the keys of the parts of a reassembled SMS (empty if it is a single SMS).
+        """
+
+        # The older records only have the IDs of the parts
+        return [key for key in record.get("Parts") or [] if isinstance(key, str) and "|" in key]
+
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        """
+        Returns the 64-bit hash of a key inside the offset index.
+        """
+
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+    def is_recent(self, key: str) -> bool:
+        """
+        Returns True if the record is unsaved or inside the hot window (no disk access).
+        """
+
+        return key in self.pending or key in self.hot
+
+
+    def _remember(self, record: dict[str, str]) -> None:
+        """
+        Adds a record to the hot window and evicts the least recently used ones.
+        """
+
+        key = HistoryStore.get_key(record)
+
+        self.hot[key] = record
+        self.hot.move_to_end(key)
+
+        while len(self.hot) > self.hot_window:
+            self.hot.popitem(last=False)
+
+
+    def _read_tail(self, count: int) -> list[dict[str, str]]:
+        """
+        Returns the last records of the file without reading the whole file.
+
+        Args:
+            count (int): Max number of records to return.
+
+        Returns:
+            list[dict[str, str]]: The records, from the oldest to the newest.
+        """
+
+        if count <= 0:
+            return []
+
+        with open(self.path, "rb") as history_file:
+            position = history_file.seek(0, os.SEEK_END)
+            blocks: list[bytes] = []
+            newline_count = 0
+
+            # One more line than needed, the first one may be incomplete
+            while position > 0 and newline_count <= count:
+                block_size = min(HistoryStore.TAIL_BLOCK_SIZE, position)
+                position -= block_size
+                history_file.seek(position)
+                blocks.append(history_file.read(block_size))
+                newline_count += blocks[-1].count(b"\n")
+
+        lines = b"".join(reversed(blocks)).splitlines()
+
+        if position > 0:
+            lines = lines[1:]
+
+        records = []
+
+        for line in lines[-count:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Corrupted history record ignored")
+
+        return records
+
+
+    def _repair_tail(self) -> None:
+        """
+        Truncates a partially written last line (crash during an append).
+        """
+
+        size = os.path.getsize(self.path)
+
+        if size == 0:
+            return
+
+        with open(self.path, "r+b") as history_file:
+            history_file.seek(size - 1)
+
+            if history_file.read(1) == b"\n":
+                return
+
+            # Finds the end of the last complete line
+            position = size
+
+            while position > 0:
+                block_size = min(HistoryStore.TAIL_BLOCK_SIZE, position)
+                position -= block_size
+                history_file.seek(position)
+                last_newline = history_file.read(block_size).rfind(b"\n")
+
+                if last_newline != -1:
+                    position += last_newline + 1
+                    break
+
+            logger.warning(f"Incomplete history record truncated at offset {position}")
+            history_file.truncate(position)
+
+
+    def load(self) -> bool:
+        """
+        Loads the most recent records into the hot window.
+
+        Note:
+            - Only the end of the file is read, so the loading time does not depend on the history size.
+            - Creates an empty file if not found.
+            - A partially written last line (crash during an append) is truncated.
+
+        Returns:
+            bool: True if the history file has been correctly loaded.
+        """
+
+        self.hot = OrderedDict()
+        self.line_count = None
+        self.stale_records = 0
+        self._reset_index()
+
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+
+            # Creates the file if not initialized
+            if not os.path.exists(self.path):
+                open(self.path, "a").close()
+                return True
+
+            self._repair_tail()
+
+            for record in self._read_tail(self.hot_window):
+                self._remember(record)
+
+            return True
+        except PermissionError as err:
+            logger.warning(f"History file could not be read:\n{err}")
+        except OSError as err:
+            logger.error(f"History file could not be loaded:\n{err}")
+
+        return False
+
+
+    def add(self, record: dict[str, str]) -> bool:
+        """
+        Adds a new record, it is only written to the disk by HistoryStore.flush().
+
+        Note:
+            Duplicates are detected against the unsaved records, the hot window and the offset index
+            (the file is only read if the hash of the key is already indexed).
+
+        Args:
+            record (dict[str, str]): The history record (with its "Index" field).
+
+        Returns:
+            bool: True if the record is new.
+        """
+
+        key = HistoryStore.get_key(record)
+
+        if self.is_recent(key):
+            return False
+
+        # A reassembled SMS found from the key of a part is not a duplicate
+        saved_record = self._read_indexed({key}).get(key)
+
+        if saved_record is not None and HistoryStore.get_key(saved_record) == key:
+            return False
+
+        self.pending[key] = record
+
+        return True
+
+
+    def update(self, key: str, fields: dict) -> bool:
+        """
+        Updates the fields of a record, the updated record is appended again by HistoryStore.flush()
+        (the newest line of a record supersedes the older ones, see HistoryStore.compact()).
+
+        Args:
+            key (str): Key of the record (see HistoryStore.get_key()).
+            fields (dict): The updated fields.
+
+        Returns:
+            bool: True if the record exists.
+        """
+
+        record = self.get(key)
+
+        if record is None:
+            return False
+
+        if key not in self.pending:
+            self.updated.add(key)
+
+        self.pending[key] = {**record, **fields}
+
+        return True
+
+
+    def flush(self) -> bool:
+        """
+        Appends the pending records to the history file in a single write.
+
+        Returns:
+            bool: True if there was nothing to write or if the records have been correctly written.
+        """
+
+        if len(self.pending) == 0:
+            return True
+
+        lines = [
+            (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            for record in self.pending.values()
+        ]
+
+        try:
+            with open(self.path, "ab") as history_file:
+                offset = history_file.seek(0, os.SEEK_END)
+                history_file.write(b"".join(lines))
+                history_file.flush()
+                os.fsync(history_file.fileno())
+        except PermissionError as err:
+            logger.warning(f"History file could not be written:\n{err}")
+            return False
+        except OSError as err:
+            logger.error(f"History file could not be written:\n{err}")
+            return False
+
+        for line, record in zip(lines, self.pending.values()):
+            self._remember(record)
+
+            if self.index_hashes is not None:
+                self._index_line(record, offset)
+
+            offset += len(line)
+
+        if self.line_count is not None:
+            self.line_count += len(lines)
+
+        self.stale_records += len(self.updated)
+        self.pending = {}
+        self.updated = set()
+
+        return True
+
+
+    def _reset_index(self) -> None:
+        """
+        Drops the offset index, it is built again by the next lookup outside of the hot window.
+        """
+
+        self.index_hashes = None
+        self.index_offsets = array("Q")
+        self.index_delta = {}
+
+
+    def _index_line(self, record: dict[str, str], offset: int) -> None:
+        """
+        Indexes the keys of a record (and of its parts) at the offset of its newest line.
+        """
+
+        for key in [HistoryStore.get_key(record)] + HistoryStore.get_part_keys(record):
+            self.index_delta[HistoryStore.hash_key(key)] = offset
+
+        if len(self.index_delta) >= HistoryStore.INDEX_MERGE_SIZE:
+            self._merge_index()
+
+
+    def _merge_index(self) -> None:
+        """
+        Merges the newest offsets into the sorted index arrays.
+        """
+
+        offsets = dict(zip(self.index_hashes or [], self.index_offsets))
+        offsets.update(self.index_delta)
+
+        self.index_hashes = array("Q", sorted(offsets))
+        self.index_offsets = array("Q", (offsets[key_hash] for key_hash in self.index_hashes))
+        self.index_delta = {}
+
+
+    def _build_index(self) -> None:
+        """
+        Indexes every line of the file (streamed once, the newest line of a key supersedes the older ones).
+        """
+
+        self._reset_index()
+        self.index_hashes = array("Q")
+        line_count = 0
+
+        try:
+            with open(self.path, "rb") as history_file:
+                offset = 0
+
+                for line in history_file:
+                    line_count += 1
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted history record ignored")
+                    else:
+                        for key in [HistoryStore.get_key(record)] + HistoryStore.get_part_keys(record):
+                            self.index_delta[HistoryStore.hash_key(key)] = offset
+
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+
+        self._merge_index()
+        self.line_count = line_count
+
+
+    def _get_offset(self, key: str) -> Optional[int]:
+        """
+        Returns the offset of the newest line of a key (or of a hash collision), None if not indexed.
+        """
+
+        key_hash = HistoryStore.hash_key(key)
+
+        if key_hash in self.index_delta:
+            return self.index_delta[key_hash]
+
+        position = bisect.bisect_left(self.index_hashes, key_hash) # type: ignore
+
+        if position < len(self.index_hashes) and self.index_hashes[position] == key_hash: # type: ignore
+            return self.index_offsets[position]
+
+        return None
+
+
+    def _read_indexed(self, keys: set[str]) -> dict[str, dict[str, str]]:
+        """
+        Returns the newest saved record of each key, only the indexed lines are read
+        (the offset index is built first if needed, see HistoryStore._build_index()).
+        """
+
+        if self.index_hashes is None:
+            self._build_index()
+
+        key_offsets = {key: offset for key in keys if (offset := self._get_offset(key)) is not None}
+        records: dict[str, dict[str, str]] = {}
+
+        if len(key_offsets) == 0:
+            return records
+
+        line_records: dict[int, dict[str, str]] = {}
+
+        try:
+            with open(self.path, "rb") as history_file:
+                for offset in sorted(set(key_offsets.values())):
+                    history_file.seek(offset)
+
+                    try:
+                        line_records[offset] = json.loads(history_file.readline())
+                    except ValueError:
+                        logger.warning("Corrupted history record ignored")
+        except FileNotFoundError:
+            pass
+
+        for key, offset in key_offsets.items():
+            record = line_records.get(offset)
+
+            # Hash collisions are ignored
+            if record is not None and key in [HistoryStore.get_key(record)] + HistoryStore.get_part_keys(record):
+                records[key] = record
+
+        return records
+
+
+    def find(self, keys: list[str]) -> dict[str, dict[str, str]]:
+        """
+        Returns multiple records, the records that are not unsaved or inside the hot window
+        are read from their offset (see HistoryStore._read_indexed()).
+
+        Note:
+            - The records read from the disk are not added to the hot window.
+            - A reassembled SMS is returned for the key of every part (see HistoryStore.get_part_keys()).
+
+        Args:
+            keys (list[str]): Keys of the records, or of their parts (see HistoryStore.get_key()).
+
+        Returns:
+            dict[str, dict[str, str]]: The records found per key.
+        """
+
+        records: dict[str, dict[str, str]] = {}
+        wanted_keys = set(keys)
+
+        # Parts of the reassembled SMS that are unsaved or inside the hot window (the unsaved ones are newer)
+        for record in list(self.hot.values()) + list(self.pending.values()):
+            for part_key in HistoryStore.get_part_keys(record):
+                if part_key in wanted_keys:
+                    records[part_key] = record
+
+        for key in keys:
+            if key in self.pending:
+                records[key] = self.pending[key]
+            elif key in self.hot:
+                records[key] = self.hot[key]
+
+        missing_keys = wanted_keys - records.keys()
+
+        if len(missing_keys) > 0:
+            records.update(self._read_indexed(missing_keys))
+
+        return records
+
+
+    def get(self, key: str) -> Optional[dict[str, str]]:
+        """
+        Returns a record from its key (read from its offset if not in the hot window).
+
+        Args:
+            key (str): Key of the record (see HistoryStore.get_key()).
+
+        Returns:
+            Optional[dict[str, str]]: The record or None if not found.
+        """
+
+        if key in self.pending:
+            return self.pending[key]
+
+        if key in self.hot:
+            self.hot.move_to_end(key)
+            return self.hot[key]
+
+        record = self._read_indexed({key}).get(key)
+
+        if record is not None:
+            self._remember(record)
+
+        return record
+
+
+    def _get_updated_offsets(self) -> dict[str, int]:
+        """
+        Returns the offset of the newest line of every updated record (see HistoryStore.update()),
+        only the lines with a "Delivery" field are decoded.
+        """
+
+        updated_offsets: dict[str, int] = {}
+
+        try:
+            with open(self.path, "rb") as history_file:
+                offset = 0
+
+                for line in history_file:
+                    if b'"Delivery"' in line:
+                        try:
+                            updated_offsets[HistoryStore.get_key(json.loads(line))] = offset
+                        except (ValueError, KeyError):
+                            pass
+
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+
+        return updated_offsets
+
+
+    def _iter_lines(self, line_filter: Optional[Callable[[bytes], bool]] = None) -> Iterator[tuple[bytes, dict[str, str]]]:
+        """
+        Streams the newest line of every record inside the file, from the oldest to the newest.
+
+        Note:
+            The file is read line by line, the memory usage does not depend on the history size
+            (only the offsets of the updated records are kept, to skip their superseded lines).
+
+        Args:
+            line_filter (Callable[[bytes], bool], optional): Cheap check of the raw JSON line,
+                the lines for which it returns False are skipped without being decoded.
+
+        Yields:
+            tuple[bytes, dict[str, str]]: The raw lines and their records.
+        """
+
+        updated_offsets = self._get_updated_offsets()
+        pending_keys = set(self.pending.keys())
+
+        try:
+            with open(self.path, "rb") as history_file:
+                offset = 0
+
+                for line in history_file:
+                    line_offset = offset
+                    offset += len(line)
+
+                    if line_filter is not None and not line_filter(line):
+                        continue
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted history record ignored")
+                        continue
+
+                    # Superseded by a newer line (or by an unsaved update)
+                    key = HistoryStore.get_key(record)
+
+                    if key in pending_keys or updated_offsets.get(key, line_offset) != line_offset:
+                        continue
+
+                    yield line, record
+        except FileNotFoundError:
+            pass
+
+
+    def iter_records(self, line_filter: Optional[Callable[[bytes], bool]] = None) -> Iterator[dict[str, str]]:
+        """
+        Streams every record of the history, from the oldest to the newest (see HistoryStore._iter_lines()).
+
+        Args:
+            line_filter (Callable[[bytes], bool], optional): Cheap check of the raw JSON line,
+                the lines for which it returns False are skipped without being decoded.
+
+        Yields:
+            dict[str, str]: The records (including the unsaved ones).
+        """
+
+        pending = list(self.pending.values())
+
+        for _, record in self._iter_lines(line_filter):
+            yield record
+
+        yield from pending
+
+
+    def _count_lines(self) -> int:
+        """
+        Returns the number of lines of the history file (raw blocks, nothing is decoded).
+        """
+
+        line_count = 0
+
+        try:
+            with open(self.path, "rb") as history_file:
+                while block := history_file.read(HistoryStore.TAIL_BLOCK_SIZE):
+                    line_count += block.count(b"\n")
+        except FileNotFoundError:
+            pass
+
+        return line_count
+
+
+    def should_compact(self) -> bool:
+        """
+        Returns True if the superseded lines exceed COMPACTION_RATIO of the live records.
+
+        Note:
+            Only the lines superseded since the history has been loaded are counted,
+            the older ones are removed by the next compaction.
+        """
+
+        if self.stale_records < HistoryStore.COMPACTION_MIN_STALE:
+            return False
+
+        if self.line_count is None:
+            self.line_count = self._count_lines()
+
+        return self.stale_records > HistoryStore.COMPACTION_RATIO * (self.line_count - self.stale_records)
+
+
+    def compact(self) -> bool:
+        """
+        Rewrites the history file without the superseded records.
+
+        Note:
+            The file is streamed (see HistoryStore._iter_lines()), the new file is written next to
+            the original one then atomically renamed, a crash during the compaction leaves the
+            original file untouched.
+
+        Returns:
+            bool: True if the history file has been correctly compacted.
+        """
+
+        if not self.flush():
+            return False
+
+        tmp_path = f"{self.path}.tmp"
+        line_count = 0
+
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                for line, _ in self._iter_lines():
+                    tmp_file.write(line)
+                    line_count += 1
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.error(f"History file could not be compacted:\n{err}")
+            return False
+
+        # Persists the rename (not supported on Windows)
+        try:
+            directory_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+        except OSError:
+            pass
+
+        logger.info(f"History compacted, {line_count} records kept")
+
+        self.line_count = line_count
+        self.stale_records = 0
+
+        # The offsets changed
+        self._reset_index()
+
+        return True
+
+
+    def migrate_json(self, json_path: str) -> bool:
+        """
+        One-time migration of the legacy "history.json" file (dict of SMS IDs).
+
+        Note:
+            The legacy file is renamed to "history.json.migrated" once its records are written.
+
+        Args:
+            json_path (str): Path of the legacy history file.
+
+        Returns:
+            bool: True if the legacy history has been correctly migrated.
+        """
+
+        try:
+            with open(json_path, "r") as json_file:
+                try:
+                    legacy_history: dict[str, dict[str, str]] = json.load(json_file)
+                except json.JSONDecodeError:
+                    # Empty files support
+                    legacy_history = {}
+        except OSError as err:
+            logger.error(f"Legacy history file could not be read:\n{err}")
+            return False
+
+        records = [{"Index": sms_id, **sms} for sms_id, sms in legacy_history.items()]
+
+        # Single pass over the file to skip the already migrated records
+        existing_records = self.find([HistoryStore.get_key(record) for record in records])
+
+        for record in records:
+            if HistoryStore.get_key(record) not in existing_records:
+                self.pending[HistoryStore.get_key(record)] = record
+
+        if not self.flush():
+            return False
+
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except OSError as err:
+            logger.warning(f"Legacy history file could not be renamed:\n{err}")
+
+        logger.info(f"{len(legacy_history)} SMS migrated from the legacy history file")
+
+        return True
@@ -5,26 +5,44 @@ from huawei_lte_api.Client import Client
 from huawei_lte_api.Session import SetResponseType
 
 from libs import logger
-from libs.config_parser import ConfigParser
 from libs.app_history import AppHistory
-from datetime import datetime
-from typing import Literal, Optional, Union
+from libs.history_store import HistoryStore
+from libs.routing_table import RoutingTable
+from libs.inbox_probe import InboxProbe
+from libs.forward_sink import ForwardSink
+from libs.metrics import Metrics
+from libs.seen_index import SeenIndex
+from libs.sms_template import SmsEncoding, SmsTemplate
+from typing import TYPE_CHECKING, Literal, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import textwrap
 import time
 import sys
 
+if TYPE_CHECKING:
+    from libs.send_queue import SendQueue
+    from libs.sms_digest import SmsDigest
+
 
 class ErrorCodes(Enum):
     SMS_CANNOT_BE_RETURNED = "ERROR:SMS_CANNOT_BE_RETURNED"
 
 
 class HuaweiWrapper:
-    # Used to avoid sending the same SMS multiple times
-    # In the case of a SMS received/sent at the exact same time as a new iteration
-    last_received_sms_id = ""
-    last_sent_sms_id = ""
+    # Used to avoid sending the same SMS multiple times (persistent, see SeenIndex)
+    seen_index: Optional[SeenIndex] = None
+
+    # Forwarded SMS format if the forwarder has no template
+    default_template = SmsTemplate()
+
+    # Non-SMS forwarding targets per name (see the "sink:<name>" forwarders)
+    sinks: dict[str, ForwardSink] = {}
+
+    # Fallback if the seen index is not loaded, last SMS ID per router name
+    # (see the "Router" field of the SMS dicts)
+    last_received_sms_ids: dict[str, str] = {}
 
 
     @staticmethod
@@ -62,6 +80,39 @@ class HuaweiWrapper:
         return client
 
 
+    @staticmethod
+    def get_connection_error_message(attempts: int) -> str:
+        """
+        Returns the error message displayed when the router cannot be reached.
+
+        Args:
+            attempts (int): Number of connection attempts.
+
+        Returns:
+            str: The error message (with debugging info).
+        """
+
+        return textwrap.dedent(f"""\
+        Could not connect to the router after {attempts} attempts.
+
+        Debugging:
+        - Verify the settings inside the YAML config file and if your Huawei router is online.
+        - Verify that your router is compatible, here's the list of compatible models:
+            Huawei B310s-22
+            Huawei B315s-22
+            Huawei B525s-23a
+            Huawei B525s-65a
+            Huawei B715s-23c
+            Huawei B528s
+            Huawei B535-232
+            Huawei B628-265
+            Huawei B818-263
+            Huawei E5186s-22a
+            Huawei E5576-320
+            Huawei E5577Cs-321
+        """)
+
+
     @staticmethod
     def api_connection_loop(client: Optional[Client], uri: str) -> Client:
         """
@@ -84,26 +135,7 @@ class HuaweiWrapper:
             client = HuaweiWrapper.connect_to_api(uri)
 
             if iteration > inf_loop_limit:
-                error_msg = textwrap.dedent(f"""\
-                Could not connect to the router after {iteration} attempts.
-
-                Debugging:
-                - Verify the settings inside the YAML config file and if your Huawei router is online.
-                - Verify that your router is compatible, here's the list of compatible models:
-                    Huawei B310s-22
-                    Huawei B315s-22
-                    Huawei B525s-23a
-                    Huawei B525s-65a
-                    Huawei B715s-23c
-                    Huawei B528s
-                    Huawei B535-232
-                    Huawei B628-265
-                    Huawei B818-263
-                    Huawei E5186s-22a
-                    Huawei E5576-320
-                    Huawei E5577Cs-321
-                """)
-
+                error_msg = HuaweiWrapper.get_connection_error_message(iteration)
                 logger.critical(error_msg)
                 sys.exit(1)
 
@@ -130,198 +162,278 @@ class HuaweiWrapper:
             # If client instance exists, disconnect from the router
             if client is not None:
                 client.user.logout()
-                AppHistory.save_history()
                 print("\n")
                 logger.info("Successfully disconnected from the router")
         except Exception:
             pass
 
         if exit_system:
+            # Writes the unsaved history before exiting
+            AppHistory.save_history(True)
             sys.exit(1)
 
 
     @staticmethod
-    def unique_sms_id_check(sms: Optional[dict[str, str]]) -> bool:
+    def unique_sms_id_check(sms: Optional[dict[str, str]], flush: bool = True) -> bool:
         """
         Used to avoid sending the same SMS multiple times
-        in the case of a SMS received at the exact same time as a new iteration.
+        (SMS received at the exact same time as a new iteration, reconnections or restarts).
 
         Note:
-            Saves the last SMS ID and verify that it is not already sent.
+            - The SMS is marked as seen inside the persistent seen index before being forwarded,
+            so a SMS is never forwarded twice, even if the app crashes right after.
+            - Without seen index, saves the last SMS ID of the router and verify that it is not already sent.
 
         Args:
             sms (dict[str, str], optional): The last received SMS dict.
+            flush (bool, optional): Writes the seen index to the disk (disable it to check multiple SMS).
 
         Returns:
             bool: True if the SMS can be sent.
         """
 
+        if sms is not None and "Index" in sms.keys() and HuaweiWrapper.seen_index is not None:
+            is_unique = HuaweiWrapper.seen_index.add(SeenIndex.get_key(sms))
+
+            if flush:
+                HuaweiWrapper.seen_index.flush()
+
+            return is_unique
+
         if sms is not None and "Index" in sms.keys():
             ID = sms["Index"]
+            router_name = sms.get("Router", "")
 
-            if ID != HuaweiWrapper.last_received_sms_id:
-                HuaweiWrapper.last_received_sms_id = ID
+            if ID != HuaweiWrapper.last_received_sms_ids.get(router_name):
+                HuaweiWrapper.last_received_sms_ids[router_name] = ID
                 return True
 
         return False
 
 
     @staticmethod
-    def is_sms_whitelisted(sender: str, whitelist: list[str]) -> bool:
+    @Metrics.timed("set_read")
+    def set_read_bulk(client: Client, sms_ids: list[str]) -> bool:
+        """
+        Sets multiple SMS to read in a single request.
+
+        Note:
+            The router accepts multiple "Index" elements inside one request,
+            if it refuses it, falls back to one request per SMS.
+
+        Args:
+            client (Client): The API client.
+            sms_ids (list[str]): The IDs of the SMS to set to read.
+
+        Returns:
+            bool: True if all the SMS have been set to read.
+        """
+
+        if len(sms_ids) == 0:
+            return True
+
+        try:
+            # Equivalent to client.sms.set_read() but with a list of indexes
+            client.sms._session.post_set("sms/set-read", {
+                "Index": [int(sms_id) for sms_id in sms_ids]
+            })
+
+            return True
+        except Exception as err:
+            logger.warning(f"Bulk set read failed, falling back to single requests\n{err}")
+
+        gen_state = True
+
+        for sms_id in sms_ids:
+            try:
+                client.sms.set_read(int(sms_id))
+            except Exception as err:
+                logger.error(f"SMS {sms_id} cannot be set to read\n{err}")
+                gen_state = False
+
+        return gen_state
+
+
+    @staticmethod
+    @Metrics.timed("delete_sms")
+    def delete_sms_bulk(client: Client, sms_ids: list[str]) -> bool:
         """
-        Returns True if the SMS is sent by one of the senders is inside the whitelist.
+        Deletes multiple SMS from the router in a single request.
 
         Note:
-            If the whitelist system is deactivated (empty list), it always returns True.
+            The router accepts multiple "Index" elements inside one request,
+            if it refuses it, falls back to one request per SMS.
 
         Args:
-            sender (str): The SMS sender.
-            whitelist (list[str]): The list of whitelisted senders.
+            client (Client): The API client.
+            sms_ids (list[str]): The IDs of the SMS to delete.
 
         Returns:
-            bool: True if the SMS is sent by one of the whitelisted senders.
+            bool: True if all the SMS have been deleted.
         """
 
-        if len(whitelist) > 0:
-            for included_sender in whitelist:
-                if sender == included_sender:
-                    return True
+        if len(sms_ids) == 0:
+            return True
+
+        try:
+            # Equivalent to client.sms.delete_sms() but with a list of indexes
+            client.sms._session.post_set("sms/delete-sms", {
+                "Index": [int(sms_id) for sms_id in sms_ids]
+            })
+
+            return True
+        except Exception as err:
+            logger.warning(f"Bulk delete failed, falling back to single requests\n{err}")
 
-            return False
+        gen_state = True
 
-        return True
+        for sms_id in sms_ids:
+            try:
+                client.sms.delete_sms(int(sms_id))
+            except Exception as err:
+                logger.error(f"SMS {sms_id} cannot be deleted\n{err}")
+                gen_state = False
+
+        return gen_state
 
 
     @staticmethod
-    def get_last_sms(
+    @Metrics.timed("get_sms_list")
+    def get_unread_sms_list(
         client: Client,
-        contacts: dict[str, str],
-        ignore_read: bool = True,
-        dont_set_to_read: bool = False
-    ) -> Optional[Union[dict[str, str], Literal[ErrorCodes.SMS_CANNOT_BE_RETURNED]]]:
+        routing: RoutingTable,
+        page_size: int = 20,
+        dont_set_to_read: bool = False,
+        router_name: str = "",
+        probe: Optional[InboxProbe] = None
+    ) -> Union[list[dict[str, str]], Literal[ErrorCodes.SMS_CANNOT_BE_RETURNED]]:
         """
-        Returns the last sms received by the router with unread priority.
+        Returns every unread SMS of the router inbox, sorted from the oldest to the newest.
 
         Note:
-            - Also adds a "Contact" field to the SMS dict if the sender is inside the contacts dict.
-            - In the case of an exception, return "ERROR:SMS_CANNOT_BE_RETURNED" (different from None if no new SMS).
+            - The inbox is read page by page (unread priority) until a read SMS
+            or an incomplete page is found, so a burst of SMS is drained in one pass.
+            - All the returned SMS are set to read in bulk at the end.
+            - With a probe, the inbox is only listed if the router unread counter is above 0.
+            - Also adds a "Contact" field to the SMS dicts if the sender is a known contact,
+            and a "Router" field in the multi-router mode.
+            - In the case of an exception, return "ERROR:SMS_CANNOT_BE_RETURNED".
 
         Args:
             client (Client): The API client.
-            contacts (dict[str, str]): The contacts dict.
-            ignore_read (bool): If True, ignores already read SMS.
+            routing (RoutingTable): Returned from ConfigParser.get_config() ("ROUTING" key).
+            page_size (int): Number of SMS requested per page (defaults to 20).
             dont_set_to_read (bool): If True, doesn't set the SMS to read (defaults to False).
+            router_name (str, optional): Name of the router (multi-router mode).
+            probe (InboxProbe, optional): Cheap unread counter check made before listing the inbox.
 
         Returns:
-            Optional[Union[dict[str, str], Literal[ErrorCodes.SMS_CANNOT_BE_RETURNED]]]: A dict
-                containing all the SMS info, None if no SMS found or if the SMS is already
-                read and "ignore_read" is set to True.
+            Union[list[dict[str, str]], Literal[ErrorCodes.SMS_CANNOT_BE_RETURNED]]: A list
+                of SMS dicts (empty if no new SMS found).
         """
 
-        sms: Optional[dict[str, str]] = None
+        sms_list: list[dict[str, str]] = []
 
         try:
-            # Get last received SMS (Unread priority)
-            raw_sms_list = client.sms.get_sms_list(
-                1,
-                BoxTypeEnum.LOCAL_INBOX,
-                1,
-                SortTypeEnum.PHONE,
-                False,
-                True
-            )
+            # No unread SMS, the inbox is not listed
+            if probe is not None and not probe.should_list(client):
+                logger.info("No new SMS found..")
+                return sms_list
 
-            sms_read_state = 0
+            page = 1
 
-            # If there is at least one SMS
-            if raw_sms_list["Count"] != "0":
-                # Get the last SMS
-                raw_last_sms = raw_sms_list["Messages"]["Message"][0]
+            while True:
+                raw_sms_list = client.sms.get_sms_list(
+                    page,
+                    BoxTypeEnum.LOCAL_INBOX,
+                    page_size,
+                    SortTypeEnum.DATE,
+                    False,
+                    True
+                )
 
-                # Get the read state & the SMS dict
-                sms_read_state = int(raw_last_sms["Smstat"])
-                sms = raw_last_sms
+                raw_messages = []
 
-            # SMS already read
-            if ignore_read and sms_read_state == 1:
-                sms = None
+                if raw_sms_list["Count"] != "0" and raw_sms_list["Messages"] is not None:
+                    raw_messages = raw_sms_list["Messages"]["Message"]
 
-            # Verify that the last sent SMS have not the same ID
-            is_sms_unique = HuaweiWrapper.unique_sms_id_check(sms)
+                # Unread SMS are returned first
+                unread_messages = [sms for sms in raw_messages if int(sms["Smstat"]) == 0]
+                sms_list.extend(unread_messages)
 
-            if sms is not None and is_sms_unique:
-                # Get useful SMS data
-                sms_sender = sms["Phone"]
+                # A read SMS or an incomplete page means that every unread SMS is fetched
+                if len(unread_messages) < page_size:
+                    break
 
-                # Set the SMS status to read
-                if not dont_set_to_read:
-                    client.sms.set_read(int(sms["Index"]))
+                page += 1
 
-                # Main Log
-                logger.info(f"New SMS received from {sms_sender}")
-            else:
-                logger.info("No new SMS found..")
+            # Oldest first, so the forwarded SMS keep the reception order
+            sms_list.sort(key=lambda sms: (sms["Date"], int(sms["Index"])))
 
-        except Exception as err:
-            logger.error(f"Last SMS received by the router cannot be returned\n{err}")
-            return ErrorCodes.SMS_CANNOT_BE_RETURNED
+            # The SMS IDs are only unique per router
+            if router_name != "":
+                for sms in sms_list:
+                    sms["Router"] = router_name
 
-        # If the sender is inside the contacts dict, add a "Contact" field to the SMS dict
-        if sms is not None:
-            formatted_phone_number = ConfigParser.format_phone_number(sms["Phone"])
+            # Already seen SMS that are still unread (set read request failed) are only set to read
+            unread_ids = [sms["Index"] for sms in sms_list]
 
-            if formatted_phone_number in contacts.keys():
-                sms["Contact"] = contacts[formatted_phone_number]
+            # Verify that the SMS have not already been returned (single write of the seen index)
+            sms_list = [sms for sms in sms_list if HuaweiWrapper.unique_sms_id_check(sms, False)]
 
-        return sms
+            if HuaweiWrapper.seen_index is not None:
+                HuaweiWrapper.seen_index.flush()
 
+            # Set the SMS status to read
+            if len(unread_ids) > 0 and not dont_set_to_read:
+                HuaweiWrapper.set_read_bulk(client, unread_ids)
 
-    @staticmethod
-    def format_date(sms_date: str) -> str:
-        """
-        Used to format the date inside the forwarded SMS.
+            if len(sms_list) > 0:
+                Metrics.increment("sms_received", len(sms_list))
 
-        Args:
-            sms_date (str): The original string date coming from the SMS dict.
+                # Main Log
+                if router_name != "":
+                    logger.info(f"{len(sms_list)} new SMS received by {router_name}")
+                else:
+                    logger.info(f"{len(sms_list)} new SMS received")
+            else:
+                logger.info("No new SMS found..")
 
-        Returns:
-            str: Formatted date depending on the day.
-        """
+        except Exception as err:
+            logger.error(f"Unread SMS cannot be returned by the router\n{err}")
+            return ErrorCodes.SMS_CANNOT_BE_RETURNED
 
-        sms_datetime = datetime.strptime(sms_date, "%Y-%m-%d %H:%M:%S")
+        # If the sender is a known contact, add a "Contact" field to the SMS dict
+        for sms in sms_list:
+            contact = routing.route(sms["Phone"]).contact
 
-        # Same day -> Only time
-        if sms_datetime.day == datetime.today().day:
-            return sms_datetime.strftime("%H:%M:%S")
+            if contact is not None:
+                sms["Contact"] = contact
 
-        return sms_date
+        return sms_list
 
 
     @staticmethod
-    def format_sms(sms: dict[str, str]) -> str:
+    def format_sms(sms: dict[str, str], template: Optional[SmsTemplate] = None) -> str:
         """
         Use the SMS dict info to format a messages used for the forwarding.
 
         Args:
             sms (dict[str, str]): Original SMS dict.
+            template (SmsTemplate, optional): Template of the forwarder (defaults to HuaweiWrapper.default_template).
 
         Returns:
             str: Formatted string of the message.
         """
 
-        # Get SMS info
-        sms_date = HuaweiWrapper.format_date(sms["Date"])
-        sms_content = sms["Content"]
-
-        if "Contact" in sms.keys():
-            sms_sender = sms["Contact"]
-        else:
-            sms_sender = sms["Phone"]
+        if template is None:
+            template = HuaweiWrapper.default_template
 
-        return f"[{sms_date}] New SMS from '{sms_sender}':\n\n{sms_content}"
+        return template.render(sms)
 
 
     @staticmethod
+    @Metrics.timed("send_sms")
     def send_sms(client: Client, sms_content: str, phone_number: str) -> bool:
         """
         Allows to send an SMS to a number (international formatted such as "+33937023216").
@@ -355,6 +467,7 @@ class HuaweiWrapper:
             error_reason = err
 
         if not gen_state:
+            Metrics.increment("send_failures")
             logger.error(f"SMS cannot be sent to {phone_number}\n{error_reason}\nAPI response: {sms_request}")
         else:
             logger.info(f"SMS correctly sent to {phone_number}")
@@ -363,95 +476,282 @@ class HuaweiWrapper:
 
 
     @staticmethod
+    @Metrics.timed("send_sms_bulk")
+    def send_sms_bulk(
+        client: Client,
+        sms_content: str,
+        phone_numbers: list[str],
+        max_workers: int = 1,
+        fallback: bool = True
+    ) -> dict[str, bool]:
+        """
+        Sends the same SMS to multiple phone numbers in a single router request.
+
+        Note:
+            If the grouped request fails, the SMS is sent to every phone number separately
+            by a pool of max_workers threads, so each recipient gets its own result
+            (unless fallback is disabled, see SendQueue.process()).
+
+        Args:
+            client (Client): Returned from HuaweiWrapper.api_connection_loop().
+            sms_content (str): Content of the SMS.
+            phone_numbers (list[str]): International formatted phone numbers.
+            max_workers (int, optional): Max number of concurrent requests for the fallback sends.
+            fallback (bool, optional): Sends the SMS separately if the grouped request fails.
+
+        Returns:
+            dict[str, bool]: The sending state of each phone number.
+        """
+
+        if len(phone_numbers) == 0:
+            return {}
+
+        if len(phone_numbers) == 1:
+            return {phone_numbers[0]: HuaweiWrapper.send_sms(client, sms_content, phone_numbers[0])}
+
+        sms_request: SetResponseType = "UNKNOWN"
+
+        try:
+            # Sending a single multi-recipients SMS request
+            sms_request = client.sms.send_sms(phone_numbers, sms_content)
+
+            if sms_request == "OK":
+                logger.info(f"SMS correctly sent to {', '.join(phone_numbers)}")
+                return {phone_number: True for phone_number in phone_numbers}
+        except Exception as err:
+            sms_request = str(err)
+
+        if not fallback:
+            logger.warning(f"Grouped SMS could not be sent\nAPI response: {sms_request}")
+            return {phone_number: False for phone_number in phone_numbers}
+
+        logger.warning(f"Grouped SMS could not be sent, sending it separately\nAPI response: {sms_request}")
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            states = executor.map(
+                lambda phone_number: HuaweiWrapper.send_sms(client, sms_content, phone_number),
+                phone_numbers
+            )
+
+            return dict(zip(phone_numbers, states))
+
+
+    @staticmethod
+    @Metrics.timed("sms_forwarder")
     def sms_forwarder(
         client: Client,
         sms: Optional[dict[str, str]],
-        forwarders: dict[str, list[str]]
+        routing: RoutingTable,
+        send_workers: int = 1,
+        send_queue: Optional["SendQueue"] = None,
+        templates: Optional[dict[str, SmsTemplate]] = None,
+        digest: Optional["SmsDigest"] = None
     ) -> bool:
         """
         Allows to forward a formatted SMS to multiple phone numbers,
         includes contacts & history systems.
 
+        Note:
+            The whitelisted phone numbers receiving the same content are grouped
+            into a single multi-recipients request (see HuaweiWrapper.send_sms_bulk()),
+            a long SMS is sent as several single SMS if the template splits it (see SmsTemplate.split_content()).
+            If a send queue is given, the SMS are queued instead of being sent directly.
+            The "sink:<name>" forwarders are queued inside their sink (see HuaweiWrapper.sinks),
+            the forwarders with a digest window are added to their digest (see SmsDigest).
+            Each template is only rendered once per SMS.
+
         Args:
             client (Client): Returned from HuaweiWrapper.api_connection_loop().
             sms (Optional[dict[str, str]]): Original SMS dictionary.
-            forwarders (dict[str, list[str]]): Dict of phone numbers to forward the SMS to.
+            routing (RoutingTable): Returned from ConfigParser.get_config() ("ROUTING" key).
+            send_workers (int, optional): Max number of concurrent requests when the recipients cannot be grouped.
+            send_queue (SendQueue, optional): Persistent queue used to send the SMS.
+            templates (dict[str, SmsTemplate], optional): Template of each forwarder (default template if not found).
+            digest (SmsDigest, optional): Digest buffer of the router (queued with SmsDigest.flush()).
 
         Returns:
-            bool: If the message has successfully been forwarded.
+            bool: If the message has successfully been forwarded (or queued) to every recipient.
         """
 
         if sms is not None and "Index" in sms:
-            api_res = True
+            start_time = time.perf_counter()
 
-            # Avoid duplicata
-            if sms["Index"] != HuaweiWrapper.last_sent_sms_id:
-                sms_content = HuaweiWrapper.format_sms(sms)
+            # Recipients grouped by formatted content (and by position, a split SMS may repeat a part)
+            recipients: dict[tuple[str, int], list[str]] = {}
+            rendered_templates: dict[int, str] = {}
 
-                # Forwarding to every listed number
-                for forwarder in forwarders.keys():
-                    is_whitelisted = HuaweiWrapper.is_sms_whitelisted(sms["Phone"], forwarders[forwarder]) # type: ignore
+            # Forwarders whitelisting the sender (single lookup)
+            route = routing.route(sms["Phone"])
 
-                    # Check if the number is whitelisted
-                    if is_whitelisted:
-                        api_response = HuaweiWrapper.send_sms(client, sms_content, forwarder)
+            # Rendered SMS per sink (delivered by the sink workers)
+            sink_contents: dict[str, str] = {}
 
-                        if not api_response:
-                            api_res = False
-                        else:
-                            AppHistory.add_to_history(sms)
-                    else:
-                        logger.warning(f"SMS from {sms['Phone']} has been ignored (not whitelisted)")
+            # Forwarders coalescing the SMS of a burst (sent with their next digest)
+            digest_forwarders: list[str] = []
 
-                return api_res
-            else:
-                logger.warning("This SMS seems to have been already sent once")
+            for forwarder in route.forwarders:
+                if digest is not None and digest.add(forwarder, sms):
+                    digest_forwarders.append(forwarder)
+                    continue
+
+                template = (templates or {}).get(forwarder, HuaweiWrapper.default_template)
+
+                if id(template) not in rendered_templates:
+                    rendered_templates[id(template)] = HuaweiWrapper.format_sms(sms, template)
+
+                if forwarder.startswith(ForwardSink.FORWARDER_PREFIX):
+                    sink_contents[forwarder[len(ForwardSink.FORWARDER_PREFIX):]] = rendered_templates[id(template)]
+                else:
+                    # Several single SMS if the template splits the long SMS
+                    sms_contents = template.split_content(rendered_templates[id(template)])
+
+                    for position, sms_content in enumerate(sms_contents):
+                        recipients.setdefault((sms_content, sms_contents[:position].count(sms_content)), []).append(forwarder)
+
+            if len(route.ignored_forwarders) > 0:
+                logger.warning(f"SMS from {sms['Phone']} has been ignored by {', '.join(route.ignored_forwarders)} (not whitelisted)")
+
+            if len(recipients) == 0 and len(sink_contents) == 0 and len(digest_forwarders) == 0:
+                return False
+
+            # Non-blocking, a slow sink never delays the polling loop
+            is_submitted = HuaweiWrapper.submit_to_sinks(sms, sink_contents)
+
+            if len(recipients) == 0:
+                AppHistory.add_to_history(sms)
+                return is_submitted
+
+            # Multipart SMS cost more router requests (see the "max_segments" setting)
+            for sms_content, _ in recipients.keys():
+                segments = SmsEncoding.count_segments(sms_content)
+
+                if segments > 1:
+                    Metrics.increment("multipart_forwards")
+                    logger.debug(f"SMS {sms['Index']} forwarded as a {segments} segments SMS")
+
+            # Queued forwarding (sent by SendQueue.process())
+            if send_queue is not None:
+                is_queued = is_submitted
+
+                for (sms_content, _), phone_numbers in recipients.items():
+                    if send_queue.enqueue(sms_content, phone_numbers, HistoryStore.get_key(sms)) is None:
+                        is_queued = False
+
+                AppHistory.add_to_history(sms)
+
+                return is_queued
+
+            # Forwarding to every listed number
+            states: dict[str, bool] = {}
+
+            for (sms_content, _), phone_numbers in recipients.items():
+                states.update(HuaweiWrapper.send_sms_bulk(client, sms_content, phone_numbers, send_workers))
+
+            if any(states.values()) or len(sink_contents) > 0 or len(digest_forwarders) > 0:
+                AppHistory.add_to_history(sms)
+
+            failed_numbers = [phone_number for phone_number, state in states.items() if not state]
+
+            if len(failed_numbers) > 0:
+                logger.error(f"SMS {sms['Index']} could not be forwarded to {', '.join(failed_numbers)}")
+
+            # Forwarding latency (router round trips included)
+            elapsed_time = time.perf_counter() - start_time
+            logger.info(f"SMS forwarded to {len(states) - len(failed_numbers)}/{len(states)} recipients in {elapsed_time:.3f}s")
+
+            return len(failed_numbers) == 0 and is_submitted
 
         return False
 
 
     @staticmethod
+    def submit_to_sinks(sms: dict[str, str], sink_contents: dict[str, str]) -> bool:
+        """
+        Queues a SMS inside the non-SMS forwarding sinks (see ForwardSink.submit()).
+
+        Args:
+            sms (dict[str, str]): Original SMS dictionary.
+            sink_contents (dict[str, str]): Formatted SMS per sink name.
+
+        Returns:
+            bool: If the SMS has been queued inside every sink.
+        """
+
+        is_submitted = True
+
+        for sink_name, sms_content in sink_contents.items():
+            sink = HuaweiWrapper.sinks.get(sink_name)
+
+            if sink is None:
+                logger.error(f"SMS {sms['Index']} could not be forwarded to the sink {sink_name} (not started)")
+                is_submitted = False
+                continue
+
+            record = {
+                "Index": sms["Index"],
+                "Router": sms.get("Router", ""),
+                "Phone": sms["Phone"],
+                "Contact": sms.get("Contact", ""),
+                "Date": sms["Date"],
+                "Content": sms["Content"],
+                "Text": sms_content
+            }
+
+            if not sink.submit(record):
+                is_submitted = False
+
+        return is_submitted
+
+
+    @staticmethod
+    @Metrics.timed("sms_replier")
     def sms_replier(
         client: Client,
         sms: Optional[dict[str, str]],
-        repliers: dict[str, str]
+        routing: RoutingTable,
+        send_queue: Optional["SendQueue"] = None
     ) -> bool:
         """
         Allows to reply to a SMS with a filter inside of it, with a custom message.
 
+        Note:
+            - Only the highest priority matching message is replied, unless "reply_all" is enabled.
+            - If a send queue is given, the reply is queued instead of being sent directly.
+
         Args:
             client (Client): Returned from HuaweiWrapper.api_connection_loop().
             sms (Optional[dict[str, str]]): Original SMS dictionary.
-            repliers (dict[str, str]): Dict of filters and replies.
+            routing (RoutingTable): Returned from ConfigParser.get_config() ("ROUTING" key).
+            send_queue (SendQueue, optional): Persistent queue used to send the reply.
 
         Returns:
-            bool: If the reply has successfully been sent.
+            bool: If the reply has successfully been sent (or queued).
         """
 
         if sms is not None and "Index" in sms:
+            replier = routing.route(sms["Phone"]).replier
+
+            # If the phone number has a replier
+            if replier is not None:
 
-            # Avoid duplicata
-            if sms["Index"] != HuaweiWrapper.last_sent_sms_id:
+                # Get the matching messages (sorted by priority)
+                matches = replier.match(sms["Content"])
 
-                # If the phone number is inside the repliers dict
-                if sms["Phone"] in repliers.keys():
+                if len(matches) == 0:
+                    return False
 
-                    # Get the replier dict from the phone number
-                    replier = repliers[sms["Phone"]]
-                    sms_content = sms["Content"].lower()
+                is_sent = True
+
+                for message in matches:
+                    if send_queue is not None:
+                        is_reply_sent = send_queue.enqueue(message.reply, [sms["Phone"]], HistoryStore.get_key(sms)) is not None
+                    else:
+                        is_reply_sent = HuaweiWrapper.send_sms(client, message.reply, sms["Phone"])
 
-                    # Get all the filtered messages and their replies
-                    for message in replier:
-                        # Check if the message contains the filter
-                        if message["filter"].lower() in sms_content: # type: ignore
-                            HuaweiWrapper.send_sms(
-                                client,
-                                message["reply"], # type: ignore
-                                sms["Phone"]
-                            )
+                    is_sent = is_sent and is_reply_sent
 
-                            AppHistory.add_to_history(sms)
+                AppHistory.add_to_history(sms)
 
-                            return True
+                return is_sent
 
         return False
\ No newline at end of file
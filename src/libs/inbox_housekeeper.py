@@ -0,0 +1,240 @@
+from huawei_lte_api.enums.sms import BoxTypeEnum, SortTypeEnum
+from huawei_lte_api.Client import Client
+
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.app_history import AppHistory
+from libs.history_store import HistoryStore
+from libs.metrics import Metrics
+from libs import logger
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import json
+import time
+import sys
+import os
+
+
+class InboxHousekeeper:
+    """
+    Keeps the router inbox small by deleting the old processed SMS (the list requests
+    get slower as the inbox grows, and a full storage refuses the new SMS).
+
+    Note:
+        - Only read SMS are deleted, from the oldest to the newest, once they are older than
+        the retention delay, or earlier if the inbox holds more than max_inbox SMS
+        (or 80% of the router storage).
+        - A SMS is deleted only if it is saved inside the history, or appended to the archive
+        file first (if enabled), otherwise it is kept.
+        - It runs when the polling loop is idle (no new SMS, empty outbox), at most once per interval.
+    """
+
+    ARCHIVE_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/archive.jsonl")
+
+    # Max ratio of the router storage used by the inbox
+    MAX_STORAGE_RATIO = 0.8
+
+    # Max number of listed pages per run (bounds the duration of a run)
+    MAX_PAGES = 10
+
+
+    def __init__(
+        self,
+        retention_days: float,
+        max_inbox: int,
+        interval: float,
+        archive: bool,
+        archive_path: str,
+        router_name: str = "",
+        page_size: int = 50
+    ):
+        self.retention = timedelta(days=retention_days)
+        self.max_inbox = max_inbox
+        self.interval = interval
+        self.archive = archive
+        self.archive_path = archive_path
+        self.router_name = router_name
+        self.page_size = page_size
+
+        # First run after one interval (the startup already drains the inbox)
+        self.last_run_time = time.monotonic()
+
+        # Inbox size returned by the router during the last run
+        self.inbox_count = 0
+
+        Metrics.register_gauge(Metrics.labeled("router_inbox_sms", router=router_name), lambda: self.inbox_count)
+
+
+    @staticmethod
+    def from_config(config: dict[str, Any]) -> Optional["InboxHousekeeper"]:
+        """
+        Returns the housekeeper of a router, None if disabled.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (or a router config).
+        """
+
+        if not config["HOUSEKEEPING_ENABLED"]:
+            return None
+
+        return InboxHousekeeper(
+            config["HOUSEKEEPING_RETENTION_DAYS"],
+            config["HOUSEKEEPING_MAX_INBOX"],
+            config["HOUSEKEEPING_INTERVAL"],
+            config["HOUSEKEEPING_ARCHIVE"],
+            AppHistory.get_partition_path(InboxHousekeeper.ARCHIVE_PATH, config["ROUTER_NAME"]),
+            config["ROUTER_NAME"]
+        )
+
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self.last_run_time >= self.interval
+
+
+    def get_inbox_limit(self, client: Client) -> int:
+        """
+        Returns the max number of SMS kept inside the inbox (also updates the inbox size).
+        """
+
+        limit = self.max_inbox
+
+        try:
+            sms_count = client.sms.sms_count()
+            self.inbox_count = int(sms_count.get("LocalInbox") or 0)
+            local_max = int(sms_count.get("LocalMax") or 0)
+
+            if local_max > 0:
+                limit = min(limit, int(local_max * InboxHousekeeper.MAX_STORAGE_RATIO))
+        except Exception as err:
+            logger.warning(f"Inbox size could not be returned by the router\n{err}")
+
+        return limit
+
+
+    def get_expired_sms(self, client: Client, limit: int) -> list[dict[str, str]]:
+        """
+        Returns the read SMS that should be deleted (oldest first).
+
+        Args:
+            client (Client): The API client.
+            limit (int): Max number of SMS kept inside the inbox.
+
+        Returns:
+            list[dict[str, str]]: The SMS older than the retention delay, or over the limit.
+        """
+
+        cutoff_date = (datetime.now() - self.retention).strftime("%Y-%m-%d %H:%M:%S")
+        excess_count = max(self.inbox_count - limit, 0)
+        expired_sms: list[dict[str, str]] = []
+
+        for page in range(1, InboxHousekeeper.MAX_PAGES + 1):
+            raw_sms_list = client.sms.get_sms_list(
+                page,
+                BoxTypeEnum.LOCAL_INBOX,
+                self.page_size,
+                SortTypeEnum.DATE,
+                True,
+                False
+            )
+
+            if raw_sms_list["Count"] == "0" or raw_sms_list["Messages"] is None:
+                break
+
+            raw_messages = raw_sms_list["Messages"]["Message"]
+
+            for index, sms in enumerate(raw_messages):
+                # Oldest first, every following SMS is more recent
+                is_over_limit = (page - 1) * self.page_size + index < excess_count
+
+                if sms["Date"] >= cutoff_date and not is_over_limit:
+                    return expired_sms
+
+                # Unread SMS are never deleted
+                if int(sms["Smstat"]) == 1:
+                    expired_sms.append(sms)
+
+            if len(raw_messages) < self.page_size:
+                break
+
+        return expired_sms
+
+
+    def archive_sms(self, sms_list: list[dict[str, str]]) -> bool:
+        """
+        Appends the SMS to the archive file (single write).
+        """
+
+        if len(sms_list) == 0:
+            return True
+
+        lines = [
+            json.dumps({**sms, "Router": self.router_name} if self.router_name != "" else sms, ensure_ascii=False) + "\n"
+            for sms in sms_list
+        ]
+
+        try:
+            with open(self.archive_path, "a", encoding="utf-8") as archive_file:
+                archive_file.write("".join(lines))
+                archive_file.flush()
+                os.fsync(archive_file.fileno())
+        except OSError as err:
+            logger.error(f"Archive file could not be written:\n{err}")
+            return False
+
+        return True
+
+
+    @Metrics.timed("housekeeping")
+    def run(self, client: Client) -> int:
+        """
+        Deletes the old processed SMS of the router inbox.
+
+        Args:
+            client (Client): The API client.
+
+        Returns:
+            int: Number of deleted SMS.
+        """
+
+        self.last_run_time = time.monotonic()
+
+        # The history must be on the disk before deleting the SMS of the router
+        if not AppHistory.save_history(True):
+            logger.warning("Inbox housekeeping skipped, the history cannot be saved")
+            return 0
+
+        try:
+            expired_sms = self.get_expired_sms(client, self.get_inbox_limit(client))
+        except Exception as err:
+            logger.error(f"Inbox housekeeping failed, the SMS cannot be listed\n{err}")
+            return 0
+
+        recorded_ids: list[str] = []
+        unrecorded_sms: list[dict[str, str]] = []
+
+        # Single lookup, the parts of a reassembled SMS are found from its "Parts" field
+        records = AppHistory.find_sms([HistoryStore.get_key(sms) for sms in expired_sms], self.router_name)
+
+        for sms in expired_sms:
+            if HistoryStore.get_key(sms) in records:
+                recorded_ids.append(sms["Index"])
+            else:
+                unrecorded_sms.append(sms)
+
+        # SMS that are not inside the history (not forwarded) are archived or kept
+        if self.archive and self.archive_sms(unrecorded_sms):
+            Metrics.increment("inbox_archived", len(unrecorded_sms))
+            recorded_ids += [sms["Index"] for sms in unrecorded_sms]
+
+        if len(recorded_ids) == 0:
+            return 0
+
+        if not HuaweiWrapper.delete_sms_bulk(client, recorded_ids):
+            logger.error("Inbox housekeeping failed, some SMS could not be deleted")
+
+        self.inbox_count = max(self.inbox_count - len(recorded_ids), 0)
+        Metrics.increment("inbox_deleted", len(recorded_ids))
+
+        logger.info(f"Inbox housekeeping: {len(recorded_ids)} old SMS deleted ({len(expired_sms) - len(recorded_ids)} kept)")
+
+        return len(recorded_ids)
@@ -0,0 +1,123 @@
+from huawei_lte_api import exceptions as HuaweiExceptions
+from huawei_lte_api.Client import Client
+
+from libs.metrics import Metrics
+from libs import logger
+from typing import Any, Optional
+
+import time
+
+
+class InboxProbe:
+    """
+    Cheap check of the router unread counter, the inbox is only listed (large XML response,
+    parsed by the app) if the router has unread SMS.
+
+    Note:
+        - The notification endpoint ("UnreadMessage") is used first, then the SMS count
+        endpoint ("LocalUnread") if the router does not support it. If none of them
+        can be read, the inbox is always listed (previous behavior).
+        - A SMS left unread (set read request failed) keeps the counter above 0,
+        so it is listed again on the next iteration.
+        - The inbox is still listed every FULL_LIST_INTERVAL seconds, in case a firmware
+        does not update its counter.
+    """
+
+    # Max delay between two inbox lists (in seconds)
+    FULL_LIST_INTERVAL = 600
+
+    # Unread counter endpoints, in the order of preference (fallback if not supported)
+    METHODS = ("notifications", "sms_count")
+
+
+    def __init__(self, router_name: str = ""):
+        self.router_name = router_name
+
+        # Index of the used endpoint inside METHODS (None once every endpoint failed)
+        self.method_index: Optional[int] = 0
+
+        # The first iteration always lists the inbox
+        self.last_list_time = 0.0
+
+        # Unread counter returned by the last probe
+        self.unread_count = 0
+
+
+    @staticmethod
+    def from_config(config: dict[str, Any]) -> Optional["InboxProbe"]:
+        """
+        Returns the unread counter probe of a router, None if disabled.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (or a router config).
+        """
+
+        if not config["ROUTER_PROBE"]:
+            return None
+
+        return InboxProbe(config["ROUTER_NAME"])
+
+
+    @staticmethod
+    def read_counter(client: Client, method: str) -> int:
+        """
+        Returns the number of unread SMS returned by an endpoint.
+
+        Raises:
+            ResponseErrorNotSupportedException: The endpoint is not supported by the router.
+            KeyError: The endpoint does not return the counter.
+        """
+
+        if method == "notifications":
+            return int(client.monitoring.check_notifications()["UnreadMessage"])
+
+        return int(client.sms.sms_count()["LocalUnread"])
+
+
+    def get_unread_count(self, client: Client) -> Optional[int]:
+        """
+        Returns the number of unread SMS, None if it cannot be returned by the router.
+        """
+
+        while self.method_index is not None:
+            method = InboxProbe.METHODS[self.method_index]
+
+            try:
+                return InboxProbe.read_counter(client, method)
+            except (HuaweiExceptions.ResponseErrorNotSupportedException, KeyError, TypeError, ValueError) as err:
+                logger.warning(f"Unread SMS counter not supported ({method}): {err}")
+            except Exception as err:
+                # Temporary error (the session is renewed by the inbox list request)
+                logger.warning(f"Unread SMS counter cannot be returned by the router\n{err}")
+                return None
+
+            # Unsupported endpoint, the next one is used from now on
+            self.method_index = self.method_index + 1 if self.method_index + 1 < len(InboxProbe.METHODS) else None
+
+        return None
+
+
+    @Metrics.timed("inbox_probe")
+    def should_list(self, client: Client) -> bool:
+        """
+        Returns True if the inbox should be listed (unread SMS, unknown counter or full list due).
+
+        Args:
+            client (Client): The API client.
+        """
+
+        now = time.monotonic()
+        unread_count = None
+
+        if now - self.last_list_time < InboxProbe.FULL_LIST_INTERVAL:
+            unread_count = self.get_unread_count(client)
+
+            if unread_count == 0:
+                self.unread_count = 0
+                Metrics.increment("inbox_probe_skips")
+                return False
+
+        self.unread_count = unread_count or 0
+        self.last_list_time = now
+
+        return True
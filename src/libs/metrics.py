@@ -0,0 +1,299 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from libs import logger
+from typing import Any, Callable, Optional, TypeVar
+
+import functools
+import threading
+import time
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Histogram:
+    """
+    Cumulative latency histogram (fixed buckets, in seconds).
+    """
+
+    # Upper bounds of the buckets (in seconds)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(Histogram.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+        for i, upper_bound in enumerate(Histogram.BUCKETS):
+            if value <= upper_bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+    def percentile(self, ratio: float) -> float:
+        """
+        Returns the upper bound of the bucket containing the percentile (max value if above the last bucket).
+        """
+
+        if self.count == 0:
+            return 0
+
+        rank = ratio * self.count
+        cumulative_count = 0
+
+        for i, upper_bound in enumerate(Histogram.BUCKETS):
+            cumulative_count += self.bucket_counts[i]
+
+            if cumulative_count >= rank:
+                return min(upper_bound, self.max)
+
+        return self.max
+
+
+class Metrics:
+    """
+    In-process metrics (stage latency histograms, counters and gauges).
+
+    Note:
+        - The metrics are exposed in the Prometheus text format by Metrics.start_server().
+        - A summary line can be logged periodically by Metrics.start_summary().
+    """
+
+    PREFIX = "sms_forwarding"
+
+    histograms: dict[str, Histogram] = {}
+    counters: dict[str, float] = {}
+    gauges: dict[str, Callable[[], float]] = {}
+    lock = threading.Lock()
+
+    server: Optional[ThreadingHTTPServer] = None
+
+
+    @staticmethod
+    def observe(stage: str, duration: float) -> None:
+        """
+        Records the duration of a stage (in seconds).
+        """
+
+        with Metrics.lock:
+            if stage not in Metrics.histograms:
+                Metrics.histograms[stage] = Histogram()
+
+            Metrics.histograms[stage].observe(duration)
+
+
+    @staticmethod
+    def increment(name: str, value: float = 1) -> None:
+        with Metrics.lock:
+            Metrics.counters[name] = Metrics.counters.get(name, 0) + value
+
+
+    @staticmethod
+    def labeled(name: str, **labels: str) -> str:
+        """
+        Returns the metric name with its labels (the empty labels are ignored).
+
+        Example:
+            Metrics.labeled("outbox_size", router="router1") -> 'outbox_size{router="router1"}'
+        """
+
+        label_list = [f'{key}="{value}"' for key, value in labels.items() if value != ""]
+
+        if len(label_list) == 0:
+            return name
+
+        return f"{name}{{{','.join(label_list)}}}"
+
+
+    @staticmethod
+    def register_gauge(name: str, callback: Callable[[], float]) -> None:
+        """
+        Registers a gauge, its value is read by the callback when the metrics are exported.
+
+        Note:
+            Labels can be added to the name, example: 'outbox_size{router="router1"}'.
+        """
+
+        with Metrics.lock:
+            Metrics.gauges[name] = callback
+
+
+    @staticmethod
+    def timed(stage: str) -> Callable[[F], F]:
+        """
+        Decorator recording the duration of every call of the function as a stage.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                start_time = time.perf_counter()
+
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    Metrics.observe(stage, time.perf_counter() - start_time)
+
+            return wrapper # type: ignore
+
+        return decorator
+
+
+    @staticmethod
+    def read_gauges() -> dict[str, float]:
+        with Metrics.lock:
+            gauges = dict(Metrics.gauges)
+
+        values = {}
+
+        for name, callback in gauges.items():
+            try:
+                values[name] = float(callback())
+            except Exception:
+                continue
+
+        return values
+
+
+    @staticmethod
+    def _family_key(item: tuple[str, Any]) -> tuple[str, str]:
+        # The labeled metrics of a family are rendered together
+        return item[0].split("{")[0], item[0]
+
+
+    @staticmethod
+    def render() -> str:
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+
+        lines: list[str] = []
+        stage_metric = f"{Metrics.PREFIX}_stage_duration_seconds"
+
+        with Metrics.lock:
+            if len(Metrics.histograms) > 0:
+                lines.append(f"# TYPE {stage_metric} histogram")
+
+            for stage, histogram in sorted(Metrics.histograms.items()):
+                cumulative_count = 0
+
+                for i, upper_bound in enumerate(Histogram.BUCKETS):
+                    cumulative_count += histogram.bucket_counts[i]
+                    lines.append(f'{stage_metric}_bucket{{stage="{stage}",le="{upper_bound}"}} {cumulative_count}')
+
+                lines.append(f'{stage_metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{stage_metric}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{stage_metric}_count{{stage="{stage}"}} {histogram.count}')
+
+            counter_families: set[str] = set()
+
+            # The "_total" suffix goes before the labels
+            for name, value in sorted(Metrics.counters.items(), key=Metrics._family_key):
+                family, _, labels = name.partition("{")
+
+                if family not in counter_families:
+                    counter_families.add(family)
+                    lines.append(f"# TYPE {Metrics.PREFIX}_{family}_total counter")
+
+                lines.append(f"{Metrics.PREFIX}_{family}_total{'{' + labels if labels else ''} {value:g}")
+
+        gauge_families: set[str] = set()
+
+        for name, value in sorted(Metrics.read_gauges().items(), key=Metrics._family_key):
+            family = name.split("{")[0]
+
+            if family not in gauge_families:
+                gauge_families.add(family)
+                lines.append(f"# TYPE {Metrics.PREFIX}_{family} gauge")
+
+            lines.append(f"{Metrics.PREFIX}_{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+    @staticmethod
+    def get_summary() -> str:
+        """
+        Returns a single line summary (p50/p99 per stage, counters and gauges).
+        """
+
+        parts: list[str] = []
+
+        with Metrics.lock:
+            for stage, histogram in sorted(Metrics.histograms.items()):
+                parts.append(
+                    f"{stage}: n={histogram.count} "
+                    f"p50={histogram.percentile(0.5) * 1000:.0f}ms p99={histogram.percentile(0.99) * 1000:.0f}ms"
+                )
+
+            parts.extend(f"{name}={value:g}" for name, value in sorted(Metrics.counters.items()))
+
+        parts.extend(f"{name}={value:g}" for name, value in sorted(Metrics.read_gauges().items()))
+
+        return "Metrics | " + " | ".join(parts)
+
+
+    @staticmethod
+    def start_server(host: str, port: int) -> bool:
+        """
+        Serves the metrics on http://host:port/metrics (background thread).
+
+        Returns:
+            bool: True if the server has been started.
+        """
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                payload = Metrics.render().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        try:
+            Metrics.server = ThreadingHTTPServer((host, port), MetricsHandler)
+            Metrics.server.daemon_threads = True
+        except OSError as err:
+            logger.error(f"Metrics server could not be started on {host}:{port}\n{err}")
+            return False
+
+        threading.Thread(target=Metrics.server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics available on http://{host}:{port}/metrics")
+
+        return True
+
+
+    @staticmethod
+    def start_summary(interval: float) -> None:
+        """
+        Logs the metrics summary every interval (background thread).
+
+        Args:
+            interval (float): Delay between two summaries (in seconds).
+        """
+
+        def summary_loop() -> None:
+            while True:
+                time.sleep(interval)
+                logger.info(Metrics.get_summary())
+
+        threading.Thread(target=summary_loop, daemon=True).start()
@@ -0,0 +1,176 @@
+from libs.huawei_wrapper import ErrorCodes
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.app_history import AppHistory
+from libs.send_queue import SendQueue
+from libs.poll_scheduler import PollScheduler
+from libs.router_session import RouterSession
+from libs.inbox_housekeeper import InboxHousekeeper
+from libs.delivery_tracker import DeliveryTracker
+from libs.inbox_probe import InboxProbe
+from libs.sms_digest import SmsDigest
+from libs.sms_assembler import SmsAssembler
+from libs import logger
+from typing import Any, Optional
+
+
+class PollLoop:
+    """
+    Default engine, a blocking loop polling the router inbox then forwarding/replying to the new SMS.
+    """
+
+    @staticmethod
+    def poll_once(
+        session: RouterSession,
+        config: dict[str, Any],
+        history: bool,
+        send_queue: SendQueue,
+        housekeeper: Optional[InboxHousekeeper] = None,
+        tracker: Optional[DeliveryTracker] = None,
+        probe: Optional[InboxProbe] = None,
+        digest: Optional[SmsDigest] = None,
+        assembler: Optional[SmsAssembler] = None
+    ) -> int:
+        """
+        Single iteration of the loop: polls the inbox, queues the forwards/replies
+        of the new SMS, then sends the queued SMS.
+
+        Args:
+            session (RouterSession): The router session.
+            config (dict[str, Any]): Returned from ConfigParser.get_config().
+            history (bool): True if the history has been correctly loaded.
+            send_queue (SendQueue): Persistent queue of the outbound SMS.
+            housekeeper (InboxHousekeeper, optional): Cleans the router inbox when the loop is idle.
+            tracker (DeliveryTracker, optional): Confirms the sent SMS with the router sent box.
+            probe (InboxProbe, optional): Skips the inbox list when the router has no unread SMS.
+            digest (SmsDigest, optional): Coalesces the SMS of a burst for the forwarders with a digest window.
+            assembler (SmsAssembler, optional): Reassembles the parts of the concatenated SMS.
+
+        Returns:
+            int: Number of new SMS received.
+        """
+
+        # Consistent snapshot of the config (hot reload, see ConfigWatcher)
+        config = config.copy()
+
+        client = session.ensure()
+        sms_list = HuaweiWrapper.get_unread_sms_list(
+            client,
+            config["ROUTING"],
+            config["ROUTER_BATCH_SIZE"],
+            False,
+            config["ROUTER_NAME"],
+            probe
+        )
+
+        # Checks if the unread SMS are properly received
+        if type(sms_list) is list:
+            # The parts of a long SMS are processed as a single SMS (incomplete ones are kept for the next iterations)
+            if assembler is not None:
+                sms_list = assembler.feed(sms_list)
+
+            # Every unread SMS is processed in one pass (oldest first)
+            for sms in sms_list:
+                # Main SMS forwarding function (queued)
+                HuaweiWrapper.sms_forwarder(
+                    client,
+                    sms,
+                    config["ROUTING"],
+                    config["ROUTER_SEND_WORKERS"],
+                    send_queue,
+                    config["FORWARDER_TEMPLATES"],
+                    digest
+                )
+
+                # Main SMS replying function (queued)
+                HuaweiWrapper.sms_replier(
+                    client,
+                    sms,
+                    config["ROUTING"],
+                    send_queue
+                )
+
+            # Queues the digests whose window is over
+            if digest is not None:
+                digest.flush()
+
+            # The SMS sent before the tracker starts are never matched (before the first send)
+            if tracker is not None:
+                tracker.seed(client)
+
+            # Sends the queued SMS (rate limited to prevent the router from crashing)
+            send_queue.process(client, config["ROUTER_SEND_WORKERS"])
+
+            # Confirms the sent SMS (batched sent box checks, failed ones are queued again)
+            if tracker is not None and tracker.is_due():
+                tracker.check(client, config["ROUTING"])
+
+            # Saves the history if needed (writes are coalesced)
+            if history:
+                AppHistory.save_history()
+
+            # Inbox cleanup, only when nothing is being processed
+            if housekeeper is not None and len(sms_list) == 0 and len(send_queue) == 0 and housekeeper.is_due():
+                housekeeper.run(client)
+
+            return len(sms_list)
+
+        # Authenticates again (same connection) if the unread SMS cannot be returned
+        if sms_list == ErrorCodes.SMS_CANNOT_BE_RETURNED:
+            session.invalidate()
+
+        return 0
+
+
+    @staticmethod
+    def run(config: dict[str, Any], history: bool, send_queue: SendQueue) -> None:
+        """
+        Runs the polling loop forever.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config().
+            history (bool): True if the history has been correctly loaded.
+            send_queue (SendQueue): Persistent queue of the outbound SMS.
+        """
+
+        session = RouterSession(config["ROUTER_URI"], config["ROUTER_HEARTBEAT"])
+        housekeeper = InboxHousekeeper.from_config(config)
+        tracker = DeliveryTracker.from_config(config, send_queue)
+        probe = InboxProbe.from_config(config)
+        digest = SmsDigest.from_config(config, send_queue)
+        assembler = SmsAssembler.from_config(config)
+        scheduler = PollScheduler(
+            config["ROUTER_LOOP_MIN"],
+            config["ROUTER_LOOP_MAX"],
+            config["ROUTER_LOOP_BACKOFF"],
+            config["ROUTER_LOOP_SLEEP"],
+            config["ROUTER_NAME"]
+        )
+
+        while True:
+            try:
+                new_sms_count = PollLoop.poll_once(
+                    session,
+                    config,
+                    history,
+                    send_queue,
+                    housekeeper,
+                    tracker,
+                    probe,
+                    digest,
+                    assembler
+                )
+
+                # Adaptive delay, shorter after a received SMS (or while SMS are queued), longer on a quiet inbox,
+                # interrupted by the SMS queued from the send gateway (or by the end of a digest/multipart wait)
+                send_queue.wait(min(
+                    scheduler.update(new_sms_count + len(send_queue)),
+                    digest.wait_time(),
+                    assembler.wait_time() if assembler is not None else float("inf")
+                ))
+
+            # Disconnect from the router if possible
+            except KeyboardInterrupt:
+                session.disconnect()
+            except Exception as err:
+                logger.critical(f"Something went wrong!\n{err}")
+                session.disconnect()
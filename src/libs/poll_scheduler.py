@@ -0,0 +1,69 @@
+from libs.metrics import Metrics
+from libs import logger
+
+
+class PollScheduler:
+    """
+    Adaptive delay between two inbox polls.
+
+    Note:
+        - The delay goes back to its minimum as soon as a SMS is received (bursts are polled quickly).
+        - The delay is multiplied by the backoff factor after every idle poll, up to its maximum
+        (less requests on a quiet inbox, but a SMS can wait up to the max delay).
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        backoff_factor: float = 2,
+        initial_interval: float = 0,
+        router_name: str = ""
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff_factor = backoff_factor
+
+        # Current delay between two polls (in seconds)
+        self.interval = min(max(initial_interval, self.min_interval), self.max_interval)
+
+        # Number of polls since the last received SMS
+        self.idle_polls = 0
+
+        Metrics.register_gauge(Metrics.labeled("poll_interval_seconds", router=router_name), lambda: self.interval)
+        Metrics.register_gauge(Metrics.labeled("polls_per_minute", router=router_name), self.polls_per_minute)
+        Metrics.register_gauge(Metrics.labeled("idle_polls", router=router_name), lambda: self.idle_polls)
+
+
+    def update(self, new_sms_count: int) -> float:
+        """
+        Updates the delay from the result of the last poll.
+
+        Args:
+            new_sms_count (int): Number of new SMS returned by the last poll.
+
+        Returns:
+            float: The delay before the next poll (in seconds).
+        """
+
+        previous_interval = self.interval
+
+        if new_sms_count > 0:
+            self.idle_polls = 0
+            self.interval = self.min_interval
+        else:
+            self.idle_polls += 1
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+
+        if self.interval != previous_interval:
+            logger.debug(f"Poll interval set to {self.interval:.2f}s")
+
+        return self.interval
+
+
+    def polls_per_minute(self) -> float:
+        """
+        Returns the current number of polls per minute.
+        """
+
+        return 60 / self.interval if self.interval > 0 else 0
@@ -0,0 +1,98 @@
+from libs import logger
+
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, allows short bursts while keeping an average rate.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+
+    def try_consume(self) -> bool:
+        """
+        Consumes a token if available.
+
+        Returns:
+            bool: True if a token has been consumed.
+        """
+
+        self._refill()
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        return False
+
+
+    def wait_time(self) -> float:
+        """
+        Returns the delay before the next token is available (in seconds).
+        """
+
+        self._refill()
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Send rates of the supported routers, used to send as many SMS as possible without crashing the router.
+    """
+
+    # Safe send rates per router model (requests per second, burst)
+    ROUTER_SEND_RATES: dict[str, tuple[float, int]] = {
+        "B310s-22": (0.25, 1),
+        "B315s-22": (0.25, 1),
+        "B525s-23a": (0.5, 2),
+        "B525s-65a": (0.5, 2),
+        "B528s": (0.5, 2),
+        "B535-232": (0.5, 2),
+        "B628-265": (1, 3),
+        "B715s-23c": (1, 3),
+        "B818-263": (1, 3),
+        "E5186s-22a": (0.5, 2),
+        "E5576-320": (0.25, 1),
+        "E5577Cs-321": (0.25, 1),
+        "E3131": (0.25, 1),
+        "E3372": (0.25, 1),
+        "E3531": (0.25, 1),
+        "H122-373": (1, 3)
+    }
+
+    # Used for the unknown models (one request per second, like the previous fixed delay)
+    DEFAULT_SEND_RATE: tuple[float, int] = (1, 1)
+
+
+    @staticmethod
+    def get_send_rate(router_model: str) -> tuple[float, int]:
+        """
+        Returns the safe send rate of a router model.
+
+        Args:
+            router_model (str): The router model (example: "B525s-65a").
+
+        Returns:
+            tuple[float, int]: Requests per second and burst.
+        """
+
+        if router_model != "" and router_model not in RateLimiter.ROUTER_SEND_RATES:
+            logger.warning(f"Unknown router model [{router_model}], using the default send rate")
+
+        return RateLimiter.ROUTER_SEND_RATES.get(router_model, RateLimiter.DEFAULT_SEND_RATE)
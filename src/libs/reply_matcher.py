@@ -0,0 +1,217 @@
+from typing import Optional
+
+import re
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton, finds all the patterns inside a text in a single pass.
+
+    Note:
+        The matching cost depends on the length of the text, not on the number of patterns.
+    """
+
+    def __init__(self, patterns: list[str]):
+        # Transitions, failure links and pattern IDs found at each state
+        self.transitions: list[dict[str, int]] = [{}]
+        self.failures: list[int] = [0]
+        self.outputs: list[set[int]] = [set()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            self._add_pattern(pattern, pattern_id)
+
+        self._build_failures()
+
+
+    def _add_pattern(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+
+        for char in pattern:
+            next_state = self.transitions[state].get(char)
+
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][char] = next_state
+                self.transitions.append({})
+                self.failures.append(0)
+                self.outputs.append(set())
+
+            state = next_state
+
+        self.outputs[state].add(pattern_id)
+
+
+    def _build_failures(self) -> None:
+        # Breadth-first traversal, the failure link of a state is built from its parent one
+        queue = list(self.transitions[0].values())
+
+        for state in queue:
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+
+                failure = self.failures[state]
+
+                while failure != 0 and char not in self.transitions[failure]:
+                    failure = self.failures[failure]
+
+                self.failures[next_state] = self.transitions[failure].get(char, 0)
+                self.outputs[next_state] |= self.outputs[self.failures[next_state]]
+
+
+    def find_all(self, text: str) -> set[int]:
+        """
+        Returns the IDs of all the patterns found inside the text.
+
+        Args:
+            text (str): The text to search into.
+
+        Returns:
+            set[int]: The found pattern IDs (index inside the patterns list).
+        """
+
+        found: set[int] = set()
+        state = 0
+
+        for char in text:
+            while state != 0 and char not in self.transitions[state]:
+                state = self.failures[state]
+
+            state = self.transitions[state].get(char, 0)
+
+            if self.outputs[state]:
+                found |= self.outputs[state]
+
+        return found
+
+
+class ReplyRule:
+    """
+    A single replier message (filter, regex or keywords) and its reply.
+    """
+
+    def __init__(
+        self,
+        reply: str,
+        priority: int,
+        order: int,
+        keyword_ids: Optional[list[int]] = None,
+        regex: Optional[re.Pattern] = None
+    ):
+        self.reply = reply
+        self.priority = priority
+        self.order = order
+
+        # Literal patterns that must all be found (filter or keywords)
+        self.keyword_ids = keyword_ids or []
+        self.regex = regex
+
+
+class ReplyMatcher:
+    """
+    Replier messages of a phone number, compiled once when the config is loaded.
+
+    Note:
+        - "filter" (substring) and "keywords" (all the substrings) messages share a single
+        case-insensitive Aho-Corasick automaton, "regex" messages are precompiled.
+        - The matching messages are sorted by priority (highest first), then by config order.
+    """
+
+    def __init__(self, messages: list[dict], reply_all: bool = False):
+        """
+        Args:
+            messages (list[dict]): The "messages" list of a replier inside the config.
+            reply_all (bool, optional): If True, every matching message is replied, not only the first one.
+
+        Raises:
+            ValueError: If a message is invalid.
+        """
+
+        self.reply_all = reply_all
+        self.rules: list[ReplyRule] = []
+        self.regex_rules: list[ReplyRule] = []
+        self.always_rules: list[ReplyRule] = []
+
+        # Rules that only need literal patterns, by pattern ID
+        self.rules_by_pattern: dict[int, list[ReplyRule]] = {}
+        patterns: list[str] = []
+
+        for order, message in enumerate(messages):
+            if "reply" not in message:
+                raise ValueError(f"Replier message without reply: {message}")
+
+            priority = int(message.get("priority", 0))
+
+            if "regex" in message:
+                try:
+                    regex = re.compile(message["regex"], re.IGNORECASE)
+                except re.error as err:
+                    raise ValueError(f"Invalid replier regex [{message['regex']}]: {err}")
+
+                rule = ReplyRule(str(message["reply"]), priority, order, regex=regex)
+                self.regex_rules.append(rule)
+            else:
+                if "filter" in message:
+                    keywords = [message["filter"]]
+                elif "keywords" in message:
+                    keywords = list(message["keywords"])
+                else:
+                    raise ValueError(f"Replier message without filter, keywords or regex: {message}")
+
+                keyword_ids = []
+
+                # Empty keywords are found inside every SMS
+                for keyword in keywords:
+                    if str(keyword) != "":
+                        keyword_ids.append(len(patterns))
+                        patterns.append(str(keyword).lower())
+
+                rule = ReplyRule(str(message["reply"]), priority, order, keyword_ids=keyword_ids)
+
+                for keyword_id in keyword_ids:
+                    self.rules_by_pattern.setdefault(keyword_id, []).append(rule)
+
+                if len(keyword_ids) == 0:
+                    self.always_rules.append(rule)
+
+            self.rules.append(rule)
+
+        self.automaton = AhoCorasick(patterns)
+
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+
+    def match(self, sms_content: str) -> list[ReplyRule]:
+        """
+        Returns the messages matching the SMS content.
+
+        Args:
+            sms_content (str): Content of the received SMS.
+
+        Returns:
+            list[ReplyRule]: The matching messages, sorted by priority
+                (only the first one if reply_all is disabled).
+        """
+
+        found_ids = self.automaton.find_all(sms_content.lower())
+        matches: dict[int, ReplyRule] = {}
+
+        for pattern_id in found_ids:
+            for rule in self.rules_by_pattern[pattern_id]:
+                if rule.order not in matches and all(keyword_id in found_ids for keyword_id in rule.keyword_ids):
+                    matches[rule.order] = rule
+
+        for rule in self.regex_rules:
+            if rule.regex.search(sms_content): # type: ignore
+                matches[rule.order] = rule
+
+        for rule in self.always_rules:
+            matches[rule.order] = rule
+
+        sorted_matches = sorted(matches.values(), key=lambda rule: (-rule.priority, rule.order))
+
+        if not self.reply_all:
+            return sorted_matches[:1]
+
+        return sorted_matches
@@ -0,0 +1,235 @@
+from huawei_lte_api import exceptions as HuaweiExceptions
+from huawei_lte_api.enums.user import LoginStateEnum
+from huawei_lte_api.Connection import Connection
+from huawei_lte_api.Client import Client
+
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.metrics import Metrics
+from libs import logger
+from urllib.parse import urlparse
+from datetime import date
+from typing import Optional
+
+import threading
+import requests
+import random
+import time
+import sys
+
+
+class RouterSession:
+    """
+    Keeps a single authenticated router session alive.
+
+    Note:
+        - The HTTP connection pool (requests.Session) is kept for the whole life of the app,
+        a reconnection only refreshes the CSRF tokens and logs in again on the same connection.
+        - The session is checked with a cheap login state request every heartbeat interval,
+        so an expired session is detected before a SMS request fails.
+        - Failed attempts are retried with an exponential backoff (with jitter),
+        which avoids the "already logged in" lockouts of the router.
+    """
+
+    # Number of failed attempts before exiting the app
+    MAX_ATTEMPTS = 12
+
+    # Max delay between two attempts (in seconds)
+    MAX_BACKOFF = 60
+
+
+    def __init__(self, uri: str, heartbeat_interval: float = 60):
+        self.uri = uri
+        self.heartbeat_interval = heartbeat_interval
+
+        parsed_uri = urlparse(uri)
+        self.username = parsed_uri.username or "admin"
+        self.password = parsed_uri.password
+
+        # Kept alive across the reconnections
+        self.requests_session = requests.Session()
+        self.connection: Optional[Connection] = None
+        self.client: Optional[Client] = None
+
+        self.is_logged_in = False
+        self.last_heartbeat = 0.0
+        self.lock = threading.RLock()
+
+        # Set by RouterSession.disconnect(), interrupts the reconnection backoff
+        self.closed_event = threading.Event()
+
+        # Stats (reset every day)
+        self.stats_date = date.today()
+        self.login_calls = 0
+        self.reconnect_times: list[float] = []
+
+
+    def _login(self) -> None:
+        """
+        Logs in, reuses the existing connection if possible.
+        """
+
+        if self.connection is None:
+            # Also logs in
+            self.connection = Connection(self.uri, requests_session=self.requests_session)
+            self.client = Client(self.connection)
+            self.login_calls += 1
+        else:
+            # New CSRF tokens on the same HTTP session, then login only if the router logged us out
+            self.connection.reload()
+
+            if not self._heartbeat():
+                self.client.user.login(self.username, self.password, True) # type: ignore
+                self.login_calls += 1
+
+        self.is_logged_in = True
+        self.last_heartbeat = time.monotonic()
+
+
+    def _heartbeat(self) -> bool:
+        """
+        Checks that the router still considers the session as logged in.
+
+        Returns:
+            bool: True if the session is still valid.
+        """
+
+        try:
+            state_login = self.client.user.state_login() # type: ignore
+            return LoginStateEnum(int(state_login["State"])) == LoginStateEnum.LOGGED_IN
+        except Exception as err:
+            logger.warning(f"Router session heartbeat failed\n{err}")
+
+        return False
+
+
+    def get_stats_summary(self) -> str:
+        """
+        Returns the login calls and reconnection times since the start of the day.
+        """
+
+        if len(self.reconnect_times) == 0:
+            return f"Router session stats ({self.stats_date}): {self.login_calls} login calls, no reconnection"
+
+        average_time = sum(self.reconnect_times) / len(self.reconnect_times)
+
+        return (
+            f"Router session stats ({self.stats_date}): {self.login_calls} login calls, "
+            f"{len(self.reconnect_times)} connections (avg {average_time:.2f}s, max {max(self.reconnect_times):.2f}s)"
+        )
+
+
+    def _report_stats(self, reconnect_time: float) -> None:
+        """
+        Logs the reconnection time, and the stats of the previous day once a day.
+        """
+
+        if date.today() != self.stats_date:
+            logger.info(self.get_stats_summary())
+
+            self.stats_date = date.today()
+            self.login_calls = 0
+            self.reconnect_times = []
+
+        self.reconnect_times.append(reconnect_time)
+
+        Metrics.increment("reconnects")
+        Metrics.observe("reconnect", reconnect_time)
+
+        logger.info(f"Connected to the router in {reconnect_time:.2f}s ({self.login_calls} login calls today)")
+
+
+    def invalidate(self) -> None:
+        """
+        Marks the session as expired, it is authenticated again by the next RouterSession.ensure().
+        """
+
+        with self.lock:
+            self.is_logged_in = False
+
+
+    def ensure(self) -> Client:
+        """
+        Returns the connected client, checks the session and authenticates again if needed.
+
+        Note:
+            Exits the app if the router cannot be reached after RouterSession.MAX_ATTEMPTS attempts,
+            or if the session is closed during the reconnection (see RouterSession.disconnect()).
+
+        Returns:
+            Client: The connected client.
+        """
+
+        with self.lock:
+            # Proactive expiration detection
+            if self.is_logged_in and time.monotonic() - self.last_heartbeat >= self.heartbeat_interval:
+                self.is_logged_in = self._heartbeat()
+                self.last_heartbeat = time.monotonic()
+
+            if self.is_logged_in:
+                return self.client # type: ignore
+
+            start_time = time.perf_counter()
+            attempts = 0
+
+            while not self.is_logged_in:
+                logger.info("Trying to connect to the router..")
+                attempts += 1
+
+                try:
+                    self._login()
+                    break
+
+                except HuaweiExceptions.LoginErrorAlreadyLoginException:
+                    logger.warning("Client is already logged in, waiting for the router to disconnect old clients")
+
+                except (
+                    HuaweiExceptions.LoginErrorUsernameWrongException,
+                    HuaweiExceptions.LoginErrorPasswordWrongException,
+                    HuaweiExceptions.LoginErrorUsernamePasswordWrongException
+                ) as err:
+                    logger.critical(f"Router connection failed! Please check the config settings\n{err}")
+                    sys.exit(1)
+
+                except Exception as err:
+                    logger.warning(f"Router connection failed\n{err}")
+
+                if attempts >= RouterSession.MAX_ATTEMPTS:
+                    logger.critical(HuaweiWrapper.get_connection_error_message(attempts))
+                    sys.exit(1)
+
+                # Exponential backoff (with jitter)
+                backoff = min(2 ** attempts, RouterSession.MAX_BACKOFF)
+
+                if self.closed_event.wait(backoff * random.uniform(0.5, 1)):
+                    sys.exit(1)
+
+            self._report_stats(time.perf_counter() - start_time)
+
+            return self.client # type: ignore
+
+
+    def close(self) -> None:
+        """
+        Closes the HTTP connection pool (call HuaweiWrapper.disconnect() first to log out).
+        """
+
+        self.requests_session.close()
+
+
+    def disconnect(self, exit_system: bool = True) -> None:
+        """
+        Logs out from the router and closes the HTTP connection pool (see HuaweiWrapper.disconnect()).
+
+        Args:
+            exit_system (bool, optional): To exit the system or not.
+        """
+
+        # Not locked, a reconnection may be waiting for its backoff
+        self.closed_event.set()
+        HuaweiWrapper.disconnect(self.client, False)
+        self.is_logged_in = False
+        self.close()
+
+        if exit_system:
+            HuaweiWrapper.disconnect(None)
+
@@ -0,0 +1,210 @@
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.app_history import AppHistory
+from libs.async_engine import AsyncEngine
+from libs.send_queue import SendQueue
+from libs.poll_scheduler import PollScheduler
+from libs.router_session import RouterSession
+from libs.config_watcher import ConfigWatcher
+from libs.inbox_housekeeper import InboxHousekeeper
+from libs.delivery_tracker import DeliveryTracker
+from libs.inbox_probe import InboxProbe
+from libs.sms_digest import SmsDigest
+from libs.sms_assembler import SmsAssembler
+from libs.send_gateway import SendGateway
+from libs.poll_loop import PollLoop
+from libs.metrics import Metrics
+from libs import logger
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import threading
+import asyncio
+
+
+class RouterSupervisor:
+    """
+    Multi-router mode, drives every router of the "routers" config section from one process.
+
+    Note:
+        - Each router has its own session, polling loop, dedup state, history partition
+        and outbox (with the send rate of its model).
+        - The loop engine runs one polling loop per router on a thread pool, the async engine
+        runs one AsyncEngine per router inside the same event loop.
+        - The metrics, the contacts, the forwarders and the repliers are shared.
+    """
+
+    def __init__(self, config: dict[str, Any], history: bool, outbox_path: str, dead_letter_path: str):
+        self.config = config
+        self.history = history
+        self.stop_event = threading.Event()
+
+        # Config, send queue and session of every router
+        self.router_configs: list[dict[str, Any]] = []
+        self.send_queues: dict[str, SendQueue] = {}
+        self.sessions: dict[str, RouterSession] = {}
+
+        for router in config["ROUTERS"]:
+            router_config = {**config, **router}
+            name = router_config["ROUTER_NAME"]
+
+            send_queue = SendQueue(
+                AppHistory.get_partition_path(outbox_path, name),
+                AppHistory.get_partition_path(dead_letter_path, name),
+                router_config["ROUTER_SEND_RATE"],
+                router_config["ROUTER_SEND_BURST"],
+                router_config["OUTBOX_MAX_ATTEMPTS"],
+                router_config["OUTBOX_RETRY_DELAY"]
+            )
+            send_queue.load()
+
+            Metrics.register_gauge(Metrics.labeled("outbox_size", router=name), send_queue.__len__)
+
+            self.router_configs.append(router_config)
+            self.send_queues[name] = send_queue
+
+            # Created before the loops start, so RouterSupervisor.stop() disconnects every one of them
+            self.sessions[name] = RouterSession(router_config["ROUTER_URI"], router_config["ROUTER_HEARTBEAT"])
+
+
+    def poll_router(self, router_config: dict[str, Any]) -> None:
+        """
+        Polling loop of a single router (runs until RouterSupervisor.stop() is called).
+
+        Note:
+            An error only pauses the router, a router that cannot be reached is stopped
+            without stopping the other ones.
+        """
+
+        name = router_config["ROUTER_NAME"]
+        send_queue = self.send_queues[name]
+        session = self.sessions[name]
+
+        housekeeper = InboxHousekeeper.from_config(router_config)
+        tracker = DeliveryTracker.from_config(router_config, send_queue)
+        probe = InboxProbe.from_config(router_config)
+        digest = SmsDigest.from_config(router_config, send_queue)
+        assembler = SmsAssembler.from_config(router_config)
+
+        scheduler = PollScheduler(
+            router_config["ROUTER_LOOP_MIN"],
+            router_config["ROUTER_LOOP_MAX"],
+            router_config["ROUTER_LOOP_BACKOFF"],
+            router_config["ROUTER_LOOP_SLEEP"],
+            name
+        )
+
+        while not self.stop_event.is_set():
+            try:
+                new_sms_count = PollLoop.poll_once(
+                    session,
+                    router_config,
+                    self.history,
+                    send_queue,
+                    housekeeper,
+                    tracker,
+                    probe,
+                    digest,
+                    assembler
+                )
+                delay = min(
+                    scheduler.update(new_sms_count + len(send_queue)),
+                    digest.wait_time(),
+                    assembler.wait_time() if assembler is not None else float("inf")
+                )
+            except SystemExit:
+                if not self.stop_event.is_set():
+                    Metrics.increment(Metrics.labeled("router_errors", router=name))
+                    logger.critical(f"Router {name} stopped")
+
+                return
+            except Exception as err:
+                Metrics.increment(Metrics.labeled("router_errors", router=name))
+                logger.error(f"Something went wrong with the router {name}!\n{err}")
+                delay = scheduler.max_interval
+
+            # Interrupted by RouterSupervisor.stop() or by the SMS queued from the send gateway
+            # (shorter if a digest window or a multipart wait ends before)
+            send_queue.wait(delay)
+
+
+    def stop(self) -> None:
+        """
+        Stops the polling loops and disconnects every router (only once).
+        """
+
+        if self.stop_event.is_set():
+            return
+
+        self.stop_event.set()
+
+        for send_queue in self.send_queues.values():
+            send_queue.wake()
+
+        for session in self.sessions.values():
+            session.disconnect(False)
+
+
+    def run_loops(self) -> None:
+        """
+        Runs the polling loop of every router on a thread pool (blocking).
+        """
+
+        with ThreadPoolExecutor(max_workers=len(self.router_configs), thread_name_prefix="router") as executor:
+            for router_config in self.router_configs:
+                executor.submit(self.poll_router, router_config)
+
+            # Waiting on the event keeps the main thread responsive to KeyboardInterrupt
+            try:
+                while not self.stop_event.wait(1):
+                    pass
+            finally:
+                # Wakes the loops (send queue waits, reconnection backoffs), the pool waits for them before exiting
+                self.stop()
+
+
+    async def run_engines(self, engines: list[AsyncEngine]) -> None:
+        await asyncio.gather(*[engine.main() for engine in engines])
+
+
+    @staticmethod
+    def run(config: dict[str, Any], history: bool, config_watcher: Optional[ConfigWatcher] = None) -> None:
+        """
+        Runs every router forever.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config().
+            history (bool): True if the history has been correctly loaded.
+            config_watcher (ConfigWatcher, optional): Also updates the config of every router on a reload.
+        """
+
+        supervisor = RouterSupervisor(config, history, SendQueue.OUTBOX_PATH, SendQueue.DEAD_LETTER_PATH)
+        engines: list[AsyncEngine] = []
+
+        if config_watcher is not None:
+            for router_config in supervisor.router_configs:
+                config_watcher.add_target(router_config)
+
+        logger.info(f"Multi-router mode: {', '.join(supervisor.send_queues.keys())}")
+
+        # Send requests of the other services (queued per router)
+        if config["GATEWAY_PORT"] != 0:
+            SendGateway(config, supervisor.send_queues).start(config["GATEWAY_HOST"], config["GATEWAY_PORT"])
+
+        try:
+            if config["APP_ENGINE"] == "async":
+                for router_config in supervisor.router_configs:
+                    name = router_config["ROUTER_NAME"]
+                    engines.append(AsyncEngine(router_config, history, supervisor.send_queues[name], supervisor.sessions[name]))
+
+                asyncio.run(supervisor.run_engines(engines))
+            else:
+                supervisor.run_loops()
+
+        # Disconnect from the routers if possible
+        except KeyboardInterrupt:
+            pass
+        except Exception as err:
+            logger.critical(f"Something went wrong!\n{err}")
+
+        supervisor.stop()
+        HuaweiWrapper.disconnect(None)
@@ -0,0 +1,235 @@
+from libs.reply_matcher import ReplyMatcher
+from types import MappingProxyType
+from typing import Generic, Optional, TypeVar
+
+import re
+
+
+T = TypeVar("T")
+
+
+class PhoneIndex(Generic[T]):
+    """
+    Phone numbers index supporting exact numbers and prefix rules ("+331*").
+
+    Note:
+        A lookup costs one dict access per distinct prefix length,
+        not one comparison per rule.
+    """
+
+    def __init__(self, rules: dict[str, T]):
+        """
+        Args:
+            rules (dict[str, T]): Normalized phone numbers (or prefixes ending with "*") and their values.
+        """
+
+        exact: dict[str, T] = {}
+        prefixes: dict[str, T] = {}
+
+        for phone_number, value in rules.items():
+            if phone_number.endswith("*"):
+                prefixes[phone_number[:-1]] = value
+            else:
+                exact[phone_number] = value
+
+        self.exact = MappingProxyType(exact)
+        self.prefixes = MappingProxyType(prefixes)
+
+        # Longest prefixes first
+        self.prefix_lengths = tuple(sorted({len(prefix) for prefix in prefixes}, reverse=True))
+
+
+    def __len__(self) -> int:
+        return len(self.exact) + len(self.prefixes)
+
+
+    def get(self, phone_number: str) -> Optional[T]:
+        """
+        Returns the value of the exact number, or of the longest matching prefix.
+        """
+
+        value = self.exact.get(phone_number)
+
+        if value is not None:
+            return value
+
+        for length in self.prefix_lengths:
+            if length <= len(phone_number):
+                value = self.prefixes.get(phone_number[:length])
+
+                if value is not None:
+                    return value
+
+        return None
+
+
+    def get_all(self, phone_number: str) -> list[T]:
+        """
+        Returns the values of the exact number and of every matching prefix.
+        """
+
+        values = []
+
+        if phone_number in self.exact:
+            values.append(self.exact[phone_number])
+
+        for length in self.prefix_lengths:
+            if length <= len(phone_number) and phone_number[:length] in self.prefixes:
+                values.append(self.prefixes[phone_number[:length]])
+
+        return values
+
+
+class Route:
+    """
+    Everything needed to process a SMS from a given sender.
+    """
+
+    def __init__(
+        self,
+        phone_number: str,
+        contact: Optional[str],
+        forwarders: tuple[str, ...],
+        ignored_forwarders: tuple[str, ...],
+        replier: Optional[ReplyMatcher]
+    ):
+        self.phone_number = phone_number
+        self.contact = contact
+
+        # Forwarders that whitelist the sender (config order), and the other ones
+        self.forwarders = forwarders
+        self.ignored_forwarders = ignored_forwarders
+        self.replier = replier
+
+
+class RoutingTable:
+    """
+    Contacts, forwarders whitelists and repliers, compiled once when the config is loaded.
+
+    Note:
+        - Numbers are normalized on both sides (spaces and separators removed, "00" replaced by "+"
+        and national numbers converted with the country code), alphanumeric senders are kept as is.
+        - Contacts and whitelists accept prefix rules ending with "*" ("+3361*"),
+        the longest matching contact prefix is used.
+        - The table is never modified once built (a new table is built on a config reload),
+        the route of each sender is cached so a SMS is routed with a single lookup.
+    """
+
+    # Max number of cached routes (cleared once reached)
+    ROUTE_CACHE_SIZE = 10000
+
+    SEPARATORS_REGEX = re.compile(r"[\s\-.()/]")
+
+
+    def __init__(
+        self,
+        contacts: dict[str, str],
+        forwarders: dict[str, list[str]],
+        repliers: dict[str, ReplyMatcher],
+        country_code: str = ""
+    ):
+        """
+        Args:
+            contacts (dict[str, str]): Contact name per phone number (or prefix).
+            forwarders (dict[str, list[str]]): Whitelist per forwarder (empty to forward every SMS).
+            repliers (dict[str, ReplyMatcher]): Compiled replier per phone number.
+            country_code (str, optional): International prefix of the national numbers ("+33").
+        """
+
+        self.country_code = country_code
+
+        self.contacts: PhoneIndex[str] = PhoneIndex({
+            self.normalize(phone_number): name for phone_number, name in contacts.items()
+        })
+        self.repliers: PhoneIndex[ReplyMatcher] = PhoneIndex({
+            self.normalize(phone_number): replier for phone_number, replier in repliers.items()
+        })
+
+        # Reverse index of the whitelists (sender -> forwarder IDs)
+        self.forwarders = tuple(forwarders.keys())
+        self.open_forwarders = frozenset(
+            forwarder_id for forwarder_id, whitelist in enumerate(forwarders.values()) if len(whitelist) == 0
+        )
+
+        whitelisted_by: dict[str, set[int]] = {}
+
+        for forwarder_id, whitelist in enumerate(forwarders.values()):
+            for phone_number in whitelist:
+                whitelisted_by.setdefault(self.normalize(phone_number), set()).add(forwarder_id)
+
+        self.whitelists: PhoneIndex[frozenset[int]] = PhoneIndex({
+            phone_number: frozenset(forwarder_ids) for phone_number, forwarder_ids in whitelisted_by.items()
+        })
+
+        # Sender (as returned by the router) -> route
+        self.routes: dict[str, Route] = {}
+
+
+    def normalize(self, phone_number: str) -> str:
+        """
+        Returns the normalized form of a phone number (international if possible).
+
+        Note:
+            Never fails, alphanumeric senders ("INFO", "Bank") are only stripped.
+
+        Args:
+            phone_number (str): The original phone number (or a prefix ending with "*").
+
+        Returns:
+            str: The normalized phone number.
+        """
+
+        is_prefix = phone_number.endswith("*")
+        number = RoutingTable.SEPARATORS_REGEX.sub("", phone_number.rstrip("*"))
+
+        # Alphanumeric sender
+        if not number.lstrip("+").isdigit():
+            return phone_number.strip()
+
+        if number.startswith("00"):
+            number = "+" + number[2:]
+        elif number.startswith("0") and self.country_code != "":
+            number = self.country_code + number[1:]
+
+        return number + "*" if is_prefix else number
+
+
+    def route(self, sender: str) -> Route:
+        """
+        Returns the route of a sender (cached).
+
+        Args:
+            sender (str): The "Phone" field of the SMS.
+
+        Returns:
+            Route: The contact name, the forwarders and the replier of the sender.
+        """
+
+        route = self.routes.get(sender)
+
+        if route is None:
+            route = self._resolve(sender)
+
+            if len(self.routes) >= RoutingTable.ROUTE_CACHE_SIZE:
+                self.routes.clear()
+
+            self.routes[sender] = route
+
+        return route
+
+
+    def _resolve(self, sender: str) -> Route:
+        phone_number = self.normalize(sender)
+
+        forwarder_ids = set(self.open_forwarders)
+
+        for whitelisted_ids in self.whitelists.get_all(phone_number):
+            forwarder_ids |= whitelisted_ids
+
+        return Route(
+            phone_number,
+            self.contacts.get(phone_number),
+            tuple(forwarder for i, forwarder in enumerate(self.forwarders) if i in forwarder_ids),
+            tuple(forwarder for i, forwarder in enumerate(self.forwarders) if i not in forwarder_ids),
+            self.repliers.get(phone_number)
+        )
@@ -0,0 +1,240 @@
+from libs import logger
+from typing import Optional
+
+import threading
+import hashlib
+import struct
+import mmap
+import time
+import sys
+import os
+
+
+class SeenIndex:
+    """
+    Persistent set of the already received SMS, used to never forward a SMS twice (even after a restart).
+
+    Note:
+        - A SMS is identified by a 64-bit hash of its router, ID, sender, date and content,
+        so an ID reused by the router for a new SMS is not considered as seen.
+        - The hashes are stored inside a fixed-size ring buffer file (memory-mapped),
+        the oldest entries are overwritten once the capacity is reached,
+        entries older than max_age are ignored.
+        - Checks are O(1) (in-memory dict of the hashes), the startup only reads the ring buffer.
+    """
+
+    SEEN_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/seen.bin")
+
+    # File header (magic, version, capacity, next slot) and slots (hash, reception timestamp)
+    MAGIC = b"SEEN"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIII")
+    SLOT = struct.Struct("<Qd")
+
+
+    def __init__(self, path: str, capacity: int = 100000, max_age: float = 30 * 86400):
+        self.path = path
+        self.capacity = capacity
+        self.max_age = max_age
+
+        # Hash -> slot
+        self.slots: dict[int, int] = {}
+        self.position = 0
+
+        self.file = None
+        self.mmap: Optional[mmap.mmap] = None
+        self.lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+    @staticmethod
+    def get_key(sms: dict[str, str]) -> int:
+        """
+        Returns the 64-bit hash identifying a SMS.
+        """
+
+        identity = "\0".join([
+            sms.get("Router", ""),
+            str(sms.get("Index", "")),
+            sms.get("Phone") or "",
+            sms.get("Date") or "",
+            sms.get("Content") or ""
+        ])
+
+        return int.from_bytes(hashlib.blake2b(identity.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+    def _slot_offset(self, slot: int) -> int:
+        return SeenIndex.HEADER.size + slot * SeenIndex.SLOT.size
+
+
+    def _read_entries(self) -> tuple[list[tuple[int, float]], int]:
+        """
+        Reads the valid entries of an existing file, from the oldest to the newest.
+
+        Returns:
+            tuple[list[tuple[int, float]], int]: The entries (hash, timestamp) and the capacity of the file.
+        """
+
+        with open(self.path, "rb") as seen_file:
+            data = seen_file.read()
+
+        magic, version, capacity, position = SeenIndex.HEADER.unpack_from(data, 0)
+
+        if magic != SeenIndex.MAGIC or version != SeenIndex.VERSION:
+            raise ValueError("invalid header")
+
+        if len(data) != SeenIndex.HEADER.size + capacity * SeenIndex.SLOT.size:
+            raise ValueError("invalid size")
+
+        entries = []
+
+        # The oldest slot is the next one to be written
+        for i in range(capacity):
+            slot = (position + i) % capacity
+            key, timestamp = SeenIndex.SLOT.unpack_from(data, SeenIndex.HEADER.size + slot * SeenIndex.SLOT.size)
+
+            if timestamp > 0:
+                entries.append((key, timestamp))
+
+        return entries, capacity
+
+
+    def _create(self, entries: list[tuple[int, float]]) -> None:
+        """
+        Writes a new file with the given entries (temp file then atomic rename).
+        """
+
+        entries = entries[-self.capacity:]
+        tmp_path = f"{self.path}.tmp"
+
+        with open(tmp_path, "wb") as tmp_file:
+            position = len(entries) % self.capacity
+            tmp_file.write(SeenIndex.HEADER.pack(SeenIndex.MAGIC, SeenIndex.VERSION, self.capacity, position))
+
+            for key, timestamp in entries:
+                tmp_file.write(SeenIndex.SLOT.pack(key, timestamp))
+
+            tmp_file.write(bytes(SeenIndex.SLOT.size * (self.capacity - len(entries))))
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        os.replace(tmp_path, self.path)
+
+
+    def load(self) -> bool:
+        """
+        Loads the index file (created if needed, resized if the capacity changed).
+
+        Returns:
+            bool: True if the index has been correctly loaded.
+        """
+
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+
+            entries: list[tuple[int, float]] = []
+            capacity = 0
+
+            if os.path.exists(self.path):
+                try:
+                    entries, capacity = self._read_entries()
+                except (ValueError, struct.error) as err:
+                    logger.warning(f"Corrupted seen SMS index, creating a new one ({err})")
+                    os.replace(self.path, f"{self.path}.corrupted")
+
+            # Created, or rewritten if the capacity changed
+            if capacity != self.capacity:
+                self._create(entries)
+
+            self.file = open(self.path, "r+b")
+            self.mmap = mmap.mmap(self.file.fileno(), 0)
+        except OSError as err:
+            logger.error(f"Seen SMS index could not be loaded:\n{err}")
+            return False
+
+        _, _, _, self.position = SeenIndex.HEADER.unpack_from(self.mmap, 0)
+        min_timestamp = time.time() - self.max_age
+        self.slots = {}
+
+        # From the oldest to the newest slot (the newest one is kept for a duplicated hash)
+        for i in range(self.capacity):
+            slot = (self.position + i) % self.capacity
+            key, timestamp = SeenIndex.SLOT.unpack_from(self.mmap, self._slot_offset(slot))
+
+            if timestamp >= min_timestamp:
+                self.slots[key] = slot
+
+        return True
+
+
+    def contains(self, key: int) -> bool:
+        with self.lock:
+            return self._contains(key)
+
+
+    def _contains(self, key: int) -> bool:
+        slot = self.slots.get(key)
+
+        if slot is None or self.mmap is None:
+            return False
+
+        # Expired entry
+        _, timestamp = SeenIndex.SLOT.unpack_from(self.mmap, self._slot_offset(slot)) # type: ignore
+        return timestamp >= time.time() - self.max_age
+
+
+    def add(self, key: int) -> bool:
+        """
+        Marks a SMS as seen (written to the memory-mapped file, see SeenIndex.flush()).
+
+        Args:
+            key (int): Returned from SeenIndex.get_key().
+
+        Returns:
+            bool: True if the SMS was not already seen.
+        """
+
+        with self.lock:
+            if self._contains(key):
+                return False
+
+            # Overwrites the oldest entry
+            old_key, _ = SeenIndex.SLOT.unpack_from(self.mmap, self._slot_offset(self.position))
+
+            if self.slots.get(old_key) == self.position:
+                del self.slots[old_key]
+
+            SeenIndex.SLOT.pack_into(self.mmap, self._slot_offset(self.position), key, time.time())
+            self.slots[key] = self.position
+
+            self.position = (self.position + 1) % self.capacity
+            SeenIndex.HEADER.pack_into(self.mmap, 0, SeenIndex.MAGIC, SeenIndex.VERSION, self.capacity, self.position)
+
+        return True
+
+
+    def flush(self) -> None:
+        """
+        Writes the changes to the disk (call it before sending the new SMS).
+        """
+
+        with self.lock:
+            if self.mmap is not None:
+                self.mmap.flush()
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self.mmap is not None:
+                self.mmap.flush()
+                self.mmap.close()
+                self.mmap = None
+
+            if self.file is not None:
+                self.file.close()
+                self.file = None
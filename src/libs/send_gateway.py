@@ -0,0 +1,340 @@
+from libs.send_queue import SendQueue
+from libs.metrics import Metrics
+from libs import logger
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+import threading
+import hmac
+import json
+import time
+import re
+
+
+class SendGateway:
+    """
+    Local HTTP endpoint used by the other services to send SMS through the router of the app.
+
+    Endpoints:
+        - POST /sms: {"to": "+33123456789" (or a list), "content": "...", "router": "router1" (optional)}
+        - POST /sms/bulk: {"messages": [{"to": ..., "content": ...}, ...]}
+        - GET /sms/<id>: State of a SMS ("queued", "retrying", "sent" or "dead").
+        - GET /status: Number of queued SMS per router.
+
+    Note:
+        - The SMS are only added to the send queue of the router, they are sent by the polling loop
+        with its authenticated session (a second session would log out the app), at the send rate of the router.
+        - The SMS received during the batch window are queued with a single write, and the ones with
+        the same content are merged into a single send request (up to MAX_RECIPIENTS phone numbers).
+        A phone number is never merged twice into the same send request, so every requested SMS is sent.
+        - Requests are refused (429) while the send queues hold more than max_pending SMS.
+        - If a token is set, it is required inside the "Authorization: Bearer <token>" header.
+    """
+
+    # Request limits
+    MAX_BODY_SIZE = 1024 * 1024
+    MAX_BULK_SIZE = 1000
+    MAX_RECIPIENTS = 50
+    MAX_CONTENT_LENGTH = 1600
+
+    PHONE_NUMBER_REGEX = re.compile(r"\+?[0-9]{3,20}")
+
+
+    def __init__(self, config: dict[str, Any], send_queues: dict[str, SendQueue]):
+        """
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (hot reloaded routing).
+            send_queues (dict[str, SendQueue]): Send queue of every router (the first one is the default one).
+        """
+
+        self.config = config
+        self.send_queues = send_queues
+        self.token: str = config["GATEWAY_TOKEN"]
+        self.max_pending: int = config["GATEWAY_MAX_PENDING"]
+        self.batch_window: float = config["GATEWAY_BATCH_WINDOW"]
+
+        # Messages waiting for the end of the batch window (filled by the request threads)
+        self.condition = threading.Condition()
+        self.batch = SendGateway.new_batch()
+
+        self.server: Optional[ThreadingHTTPServer] = None
+
+
+    @staticmethod
+    def new_batch() -> dict[str, Any]:
+        return {"messages": [], "ids": None, "done": False}
+
+
+    def parse_message(self, data: Any) -> tuple[str, str, list[str]]:
+        """
+        Validates a send request.
+
+        Returns:
+            tuple[str, str, list[str]]: The router name, the content and the normalized phone numbers.
+
+        Raises:
+            ValueError: The request is invalid (the message is returned to the client).
+        """
+
+        if not isinstance(data, dict):
+            raise ValueError("A message must be a JSON object")
+
+        content = data.get("content")
+        phone_numbers = data.get("to")
+        router_name = data.get("router") or next(iter(self.send_queues))
+
+        if isinstance(phone_numbers, str):
+            phone_numbers = [phone_numbers]
+
+        if not isinstance(content, str) or content == "" or len(content) > SendGateway.MAX_CONTENT_LENGTH:
+            raise ValueError(f"\"content\" must be a non-empty string of {SendGateway.MAX_CONTENT_LENGTH} characters max")
+
+        if not isinstance(phone_numbers, list) or not 0 < len(phone_numbers) <= SendGateway.MAX_RECIPIENTS:
+            raise ValueError(f"\"to\" must be a phone number or a list of 1 to {SendGateway.MAX_RECIPIENTS} phone numbers")
+
+        if router_name not in self.send_queues:
+            raise ValueError(f"Unknown router: {router_name}")
+
+        normalized_numbers: list[str] = []
+
+        for phone_number in phone_numbers:
+            normalized_number = self.config["ROUTING"].normalize(str(phone_number))
+
+            if not SendGateway.PHONE_NUMBER_REGEX.fullmatch(normalized_number):
+                raise ValueError(f"Invalid phone number: {phone_number}")
+
+            if normalized_number not in normalized_numbers:
+                normalized_numbers.append(normalized_number)
+
+        return router_name, content, normalized_numbers
+
+
+    def get_pending_count(self) -> int:
+        return sum(len(send_queue) for send_queue in self.send_queues.values()) + len(self.batch["messages"])
+
+
+    def flush(self, messages: list[tuple[str, str, list[str]]]) -> list[Optional[str]]:
+        """
+        Queues a batch of messages, the messages with the same router and content are merged
+        (unless they share a phone number, each message has its own SMS).
+
+        Returns:
+            list[Optional[str]]: The queue entry ID of every message (None if it could not be queued).
+        """
+
+        # (router, content) -> groups of (message positions, phone numbers)
+        groups: dict[tuple[str, str], list[tuple[list[int], list[str]]]] = {}
+
+        for position, (router_name, content, phone_numbers) in enumerate(messages):
+            router_groups = groups.setdefault((router_name, content), [])
+
+            # First group with enough room and none of the phone numbers
+            group = next((
+                group for group in router_groups
+                if len(group[1]) + len(phone_numbers) <= SendGateway.MAX_RECIPIENTS
+                and not any(phone_number in group[1] for phone_number in phone_numbers)
+            ), None)
+
+            if group is None:
+                group = ([], [])
+                router_groups.append(group)
+
+            group[0].append(position)
+            group[1].extend(phone_numbers)
+
+        ids: list[Optional[str]] = [None] * len(messages)
+
+        for router_name, send_queue in self.send_queues.items():
+            router_groups = [
+                (content, group) for (group_router, content), content_groups in groups.items()
+                if group_router == router_name for group in content_groups
+            ]
+
+            if len(router_groups) == 0:
+                continue
+
+            entry_ids = send_queue.enqueue_many([(content, group[1]) for content, group in router_groups])
+
+            if entry_ids is None:
+                continue
+
+            for entry_id, (_, (positions, _)) in zip(entry_ids, router_groups):
+                for position in positions:
+                    ids[position] = entry_id
+
+            send_queue.wake()
+            Metrics.increment("gateway_send_requests", len(entry_ids))
+
+        Metrics.increment("gateway_sms", len(messages))
+
+        return ids
+
+
+    def submit(self, messages: list[tuple[str, str, list[str]]]) -> list[Optional[str]]:
+        """
+        Adds messages to the current batch and waits until it is queued.
+
+        Note:
+            The first request of a batch waits for the batch window then queues the whole batch,
+            the other requests of the window only wait for it.
+
+        Returns:
+            list[Optional[str]]: The queue entry ID of every message (None if it could not be queued).
+        """
+
+        with self.condition:
+            batch = self.batch
+            offset = len(batch["messages"])
+            batch["messages"].extend(messages)
+
+        if offset == 0:
+            if self.batch_window > 0:
+                time.sleep(self.batch_window)
+
+            with self.condition:
+                self.batch = SendGateway.new_batch()
+
+            try:
+                batch["ids"] = self.flush(batch["messages"])
+            finally:
+                with self.condition:
+                    batch["done"] = True
+                    self.condition.notify_all()
+        else:
+            with self.condition:
+                while not batch["done"]:
+                    self.condition.wait()
+
+        if batch["ids"] is None:
+            return [None] * len(messages)
+
+        return batch["ids"][offset:offset + len(messages)]
+
+
+    def get_status(self, entry_id: str) -> Optional[dict]:
+        for router_name, send_queue in self.send_queues.items():
+            status = send_queue.get_status(entry_id)
+
+            if status is not None:
+                return {"id": entry_id, "router": router_name, **status}
+
+        return None
+
+
+    def handle(self, method: str, path: str, headers: Any, body: bytes) -> tuple[int, dict]:
+        """
+        Handles a request.
+
+        Returns:
+            tuple[int, dict]: The HTTP status code and the JSON response.
+        """
+
+        if self.token != "":
+            authorization = headers.get("Authorization") or ""
+
+            if not hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {self.token}".encode("utf-8")):
+                return 401, {"error": "Invalid token"}
+
+        path = path.split("?")[0].rstrip("/")
+
+        if method == "GET":
+            if path == "/status":
+                return 200, {"outbox": {name: len(send_queue) for name, send_queue in self.send_queues.items()}}
+
+            if path.startswith("/sms/"):
+                status = self.get_status(path[len("/sms/"):])
+                return (200, status) if status is not None else (404, {"error": "Unknown SMS ID"})
+
+            return 404, {"error": "Not found"}
+
+        if path not in ("/sms", "/sms/bulk"):
+            return 404, {"error": "Not found"}
+
+        try:
+            data = json.loads(body)
+            raw_messages = data.get("messages") if path == "/sms/bulk" and isinstance(data, dict) else [data]
+
+            if not isinstance(raw_messages, list) or not 0 < len(raw_messages) <= SendGateway.MAX_BULK_SIZE:
+                raise ValueError(f"\"messages\" must be a list of 1 to {SendGateway.MAX_BULK_SIZE} messages")
+
+            messages = [self.parse_message(raw_message) for raw_message in raw_messages]
+        except ValueError as err:
+            return 400, {"error": str(err)}
+
+        if self.get_pending_count() + len(messages) > self.max_pending:
+            Metrics.increment("gateway_rejected", len(messages))
+            return 429, {"error": "Too many queued SMS, retry later"}
+
+        ids = self.submit(messages)
+
+        if None in ids:
+            return 503, {"error": "The SMS could not be queued", "ids": ids}
+
+        return 202, {"id": ids[0]} if path == "/sms" else {"ids": ids}
+
+
+    def start(self, host: str, port: int) -> bool:
+        """
+        Serves the gateway on http://host:port (background thread).
+
+        Returns:
+            bool: True if the server has been started.
+        """
+
+        gateway = self
+
+        class GatewayHandler(BaseHTTPRequestHandler):
+            # Keep-alive connections (clients sending many SMS)
+            protocol_version = "HTTP/1.1"
+
+            # The headers and the body are written separately (no delayed ACK stalls)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _handle(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+
+                if length > SendGateway.MAX_BODY_SIZE:
+                    status_code, response = 413, {"error": "Request too large"}
+                    self.close_connection = True
+                else:
+                    body = self.rfile.read(length) if length > 0 else b""
+                    status_code, response = gateway.handle(method, self.path, self.headers, body)
+
+                payload = json.dumps(response).encode("utf-8")
+
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                self._handle("GET")
+
+            def do_POST(self) -> None:
+                self._handle("POST")
+
+        class GatewayServer(ThreadingHTTPServer):
+            # Many clients can connect at the same time
+            request_queue_size = 128
+            daemon_threads = True
+
+        try:
+            self.server = GatewayServer((host, port), GatewayHandler)
+        except OSError as err:
+            logger.error(f"Send gateway could not be started on {host}:{port}\n{err}")
+            return False
+
+        threading.Thread(target=self.server.serve_forever, name="send-gateway", daemon=True).start()
+        logger.info(f"Send gateway available on http://{host}:{self.server.server_address[1]}/sms")
+
+        return True
+
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,449 @@
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.rate_limiter import TokenBucket
+from libs.metrics import Metrics
+from libs import logger
+from huawei_lte_api.Client import Client
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+import threading
+import random
+import uuid
+import json
+import time
+import sys
+import os
+
+
+class SendQueue:
+    """
+    Persistent outbound SMS queue, with rate limiting, retries and dead-lettering.
+
+    Note:
+        - Every change is appended to a JSON-lines file before being applied,
+        so the queued SMS survive a crash or a restart.
+        - A send request is made only if the token bucket allows it (see RateLimiter.get_send_rate()).
+        - A failed SMS is retried with an exponential backoff, then moved to the dead letter
+        file after max_attempts attempts.
+        - If a multi-recipients request fails, the SMS is split into one entry per recipient ("<ID>.<n>"),
+        so every separate send request also goes through the rate limiter.
+    """
+
+    OUTBOX_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/outbox.jsonl")
+    DEAD_LETTER_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/dead_letter.jsonl")
+
+    # Number of events inside the file before it is compacted
+    COMPACTION_THRESHOLD = 1000
+
+    # Number of final states (sent/dead) kept for the status requests (see SendQueue.get_status())
+    RESULTS_SIZE = 10000
+
+
+    def __init__(
+        self,
+        path: str,
+        dead_letter_path: str,
+        rate: float,
+        burst: int,
+        max_attempts: int = 5,
+        retry_delay: float = 5,
+        max_retry_delay: float = 600
+    ):
+        self.path = path
+        self.dead_letter_path = dead_letter_path
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        # Queued SMS (ID -> entry), in the sending order
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Number of events inside the file
+        self.event_count = 0
+
+        # Called with the entry and its accepted phone numbers after a send (see DeliveryTracker)
+        self.on_sent: Optional[Callable[[dict, list[str]], None]] = None
+
+        # Final state of the last entries that left the queue (ID -> "sent" or "dead")
+        self.results: OrderedDict[str, str] = OrderedDict()
+
+        # Wakes up the polling loop when SMS are queued from outside of it (see SendGateway)
+        self.wake_event = threading.Event()
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def _append(self, file_path: str, events: list[dict]) -> bool:
+        """
+        Appends events to a JSON-lines file (synced to the disk).
+        """
+
+        try:
+            if not os.path.exists(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+
+            with open(file_path, "a", encoding="utf-8") as queue_file:
+                queue_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                queue_file.flush()
+                os.fsync(queue_file.fileno())
+
+            if file_path == self.path:
+                self.event_count += len(events)
+
+            return True
+        except OSError as err:
+            logger.error(f"Outbox file could not be written:\n{err}")
+
+        return False
+
+
+    def _compact(self) -> None:
+        """
+        Rewrites the queue file with only the queued SMS (temp file then atomic rename).
+        """
+
+        tmp_path = f"{self.path}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                for entry in self.entries.values():
+                    tmp_file.write(json.dumps({"event": "queued", **entry}, ensure_ascii=False) + "\n")
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.path)
+            self.event_count = len(self.entries)
+        except OSError as err:
+            logger.error(f"Outbox file could not be compacted:\n{err}")
+
+
+    def load(self) -> bool:
+        """
+        Restores the queued SMS from the queue file.
+
+        Returns:
+            bool: True if the queue has been correctly loaded.
+        """
+
+        self.entries = OrderedDict()
+        self.event_count = 0
+
+        if not os.path.exists(self.path):
+            return True
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as queue_file:
+                for line in queue_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted outbox event ignored")
+                        continue
+
+                    self.event_count += 1
+                    event_type = event.pop("event")
+
+                    if event_type == "queued":
+                        self.entries[event["id"]] = event
+                    elif event_type == "retry" and event["id"] in self.entries:
+                        self.entries[event["id"]].update(event)
+                    elif event_type in ("sent", "dead", "split"):
+                        self.entries.pop(event["id"], None)
+        except OSError as err:
+            logger.error(f"Outbox file could not be loaded:\n{err}")
+            return False
+
+        if len(self.entries) > 0:
+            logger.info(f"{len(self.entries)} queued SMS restored from the outbox")
+
+        self._compact()
+
+        return True
+
+
+    def enqueue(
+        self,
+        sms_content: str,
+        phone_numbers: list[str],
+        source: Optional[Union[str, list[str]]] = None
+    ) -> Optional[str]:
+        """
+        Adds a SMS to the queue (written to the disk before returning).
+
+        Args:
+            sms_content (str): Content of the SMS.
+            phone_numbers (list[str]): International formatted phone numbers.
+            source (Union[str, list[str]], optional): History key of the received SMS that triggered this one
+                (or the keys of the SMS of a digest, see SmsDigest and HistoryStore.get_key()).
+
+        Returns:
+            Optional[str]: The queue entry ID, None if it could not be queued.
+        """
+
+        entry = {
+            "id": uuid.uuid4().hex,
+            "phone_numbers": phone_numbers,
+            "content": sms_content,
+            "source": source,
+            "attempts": 0,
+            "next_try": time.time(),
+            "created_at": time.time()
+        }
+
+        with self.lock:
+            if not self._append(self.path, [{"event": "queued", **entry}]):
+                return None
+
+            self.entries[entry["id"]] = entry
+
+        return entry["id"]
+
+
+    def enqueue_many(
+        self,
+        messages: list[tuple[str, list[str]]],
+        sources: Optional[list[Union[str, list[str], None]]] = None
+    ) -> Optional[list[str]]:
+        """
+        Adds several SMS to the queue with a single write.
+
+        Args:
+            messages (list[tuple[str, list[str]]]): Content and phone numbers of every SMS.
+            sources (list[Union[str, list[str], None]], optional): Source of every SMS (see SendQueue.enqueue()).
+
+        Returns:
+            Optional[list[str]]: The queue entry IDs (same order), None if they could not be queued.
+        """
+
+        now = time.time()
+        entries = [
+            {
+                "id": uuid.uuid4().hex,
+                "phone_numbers": phone_numbers,
+                "content": sms_content,
+                "source": source,
+                "attempts": 0,
+                "next_try": now,
+                "created_at": now
+            }
+            for (sms_content, phone_numbers), source in zip(messages, sources or [None] * len(messages))
+        ]
+
+        with self.lock:
+            if not self._append(self.path, [{"event": "queued", **entry} for entry in entries]):
+                return None
+
+            for entry in entries:
+                self.entries[entry["id"]] = entry
+
+        return [entry["id"] for entry in entries]
+
+
+    def get_status(self, entry_id: str) -> Optional[dict]:
+        """
+        Returns the state of a queue entry ("queued", "retrying", "sent" or "dead"), None if unknown
+        (the state of a split entry is the one of its recipients, see SendQueue._split()).
+        """
+
+        with self.lock:
+            if self.results.get(entry_id) == "split":
+                prefix = f"{entry_id}."
+                pending_entries = [entry for child_id, entry in self.entries.items() if child_id.startswith(prefix)]
+
+                if len(pending_entries) > 0:
+                    return {
+                        "status": "retrying",
+                        "pending": [phone_number for entry in pending_entries for phone_number in entry["phone_numbers"]],
+                        "attempts": max(entry["attempts"] for entry in pending_entries)
+                    }
+
+                states = [state for child_id, state in self.results.items() if child_id.startswith(prefix)]
+                return {"status": "dead" if "dead" in states else "sent"}
+
+            entry = self.entries.get(entry_id)
+
+            if entry is not None:
+                return {
+                    "status": "retrying" if entry["attempts"] > 0 else "queued",
+                    "pending": list(entry["phone_numbers"]),
+                    "attempts": entry["attempts"]
+                }
+
+            if entry_id in self.results:
+                return {"status": self.results[entry_id]}
+
+        return None
+
+
+    def _set_result(self, entry_id: str, state: str) -> None:
+        self.results[entry_id] = state
+
+        while len(self.results) > SendQueue.RESULTS_SIZE:
+            self.results.popitem(last=False)
+
+
+    def wake(self) -> None:
+        self.wake_event.set()
+
+
+    def wait(self, timeout: float) -> None:
+        """
+        Sleeps until the timeout or until SendQueue.wake() is called.
+        """
+
+        if self.wake_event.wait(timeout):
+            self.wake_event.clear()
+
+
+    def requeue(self, entry: dict, phone_numbers: list[str]) -> None:
+        """
+        Sends a SMS again to some of its recipients (the router accepted it but did not send it).
+
+        Note:
+            Counts as a failed attempt, so the SMS is retried with a backoff
+            then dead-lettered after max_attempts attempts.
+
+        Args:
+            entry (dict): The sent queue entry.
+            phone_numbers (list[str]): The phone numbers to send it to again.
+        """
+
+        entry = {**entry, "id": uuid.uuid4().hex, "phone_numbers": phone_numbers}
+
+        with self.lock:
+            if not self._append(self.path, [{"event": "queued", **entry}]):
+                return
+
+            self.entries[entry["id"]] = entry
+            self._on_result(entry, {phone_number: False for phone_number in phone_numbers})
+
+
+    def wait_time(self) -> float:
+        """
+        Returns the delay before the next SMS can be sent (in seconds), 0 if the queue is empty.
+        """
+
+        with self.lock:
+            if len(self.entries) == 0:
+                return 0
+
+            next_try = min(entry["next_try"] for entry in self.entries.values())
+
+        return max(next_try - time.time(), self.bucket.wait_time(), 0)
+
+
+    def _split(self, entry: dict) -> None:
+        """
+        Replaces a multi-recipients entry by one entry per recipient (the grouped request failed).
+        """
+
+        children = [
+            {**entry, "id": f"{entry['id']}.{i}", "phone_numbers": [phone_number], "next_try": time.time()}
+            for i, phone_number in enumerate(entry["phone_numbers"])
+        ]
+
+        logger.warning(f"SMS to {', '.join(entry['phone_numbers'])} will be sent separately")
+
+        self._append(self.path, [{"event": "queued", **child} for child in children] + [{"event": "split", "id": entry["id"]}])
+        self.entries.pop(entry["id"], None)
+        self._set_result(entry["id"], "split")
+
+        for child in children:
+            self.entries[child["id"]] = child
+
+
+    def _on_result(self, entry: dict, states: dict[str, bool]) -> None:
+        """
+        Updates a queue entry after a send attempt.
+        """
+
+        failed_numbers = [phone_number for phone_number, state in states.items() if not state]
+        sent_numbers = [phone_number for phone_number, state in states.items() if state]
+
+        if len(sent_numbers) > 0 and self.on_sent is not None:
+            self.on_sent(entry, sent_numbers)
+
+        if len(failed_numbers) == 0:
+            # Time spent inside the queue (retries included)
+            Metrics.observe("outbox_wait", time.time() - entry["created_at"])
+
+            self._append(self.path, [{"event": "sent", "id": entry["id"]}])
+            self.entries.pop(entry["id"], None)
+            self._set_result(entry["id"], "sent")
+            return
+
+        entry["phone_numbers"] = failed_numbers
+        entry["attempts"] += 1
+
+        # Dead-lettering after too many attempts
+        if entry["attempts"] >= self.max_attempts:
+            logger.error(f"SMS could not be sent to {', '.join(failed_numbers)} after {entry['attempts']} attempts")
+            Metrics.increment("dead_letters")
+
+            self._append(self.dead_letter_path, [{**entry, "failed_at": time.time()}])
+            self._append(self.path, [{"event": "dead", "id": entry["id"]}])
+            self.entries.pop(entry["id"], None)
+            self._set_result(entry["id"], "dead")
+            return
+
+        # Exponential backoff (with jitter)
+        retry_delay = min(self.retry_delay * 2 ** (entry["attempts"] - 1), self.max_retry_delay)
+        entry["next_try"] = time.time() + retry_delay * random.uniform(0.8, 1.2)
+
+        logger.warning(f"SMS to {', '.join(failed_numbers)} will be sent again in {retry_delay:.0f}s")
+
+        self._append(self.path, [{
+            "event": "retry",
+            "id": entry["id"],
+            "phone_numbers": failed_numbers,
+            "attempts": entry["attempts"],
+            "next_try": entry["next_try"]
+        }])
+
+
+    def process(self, client: Optional[Client], max_workers: int = 1) -> int:
+        """
+        Sends the queued SMS that are due, as long as the rate limiter allows it.
+
+        Args:
+            client (Client, optional): Returned from HuaweiWrapper.api_connection_loop().
+            max_workers (int, optional): Max number of concurrent requests (see HuaweiWrapper.send_sms_bulk()),
+                unused as the separate sends of a failed grouped request are rate limited (see SendQueue._split()).
+
+        Returns:
+            int: Number of send requests made.
+        """
+
+        if client is None:
+            return 0
+
+        request_count = 0
+
+        while True:
+            with self.lock:
+                now = time.time()
+                entry = next((entry for entry in self.entries.values() if entry["next_try"] <= now), None)
+
+                if entry is None or not self.bucket.try_consume():
+                    break
+
+            # No concurrent fallback sends, they would bypass the rate limiter
+            states = HuaweiWrapper.send_sms_bulk(client, entry["content"], entry["phone_numbers"], max_workers, False)
+            request_count += 1
+
+            with self.lock:
+                if len(entry["phone_numbers"]) > 1 and not any(states.values()):
+                    self._split(entry)
+                else:
+                    self._on_result(entry, states)
+
+        with self.lock:
+            if self.event_count > SendQueue.COMPACTION_THRESHOLD or (len(self.entries) == 0 and self.event_count > 0):
+                self._compact()
+
+        return request_count
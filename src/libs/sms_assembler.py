@@ -0,0 +1,285 @@
+from libs.app_history import AppHistory
+from libs.history_store import HistoryStore
+from libs.sms_template import SmsEncoding
+from libs.metrics import Metrics
+from libs import logger
+from typing import Any, Optional
+
+import threading
+import json
+import time
+import sys
+import os
+
+
+class SmsAssembler:
+    """
+    Reassembles the parts of the concatenated SMS ("SmsType" 2) listed separately by the router,
+    so a long SMS is forwarded, replied to and saved inside the history as a single SMS.
+
+    Note:
+        - The router does not return the concatenation reference of the parts, the parts are grouped
+        by sender, in the reception order, as long as they are received less than max_gap seconds apart.
+        - Every part but the last one fills a whole segment (153 GSM-7 or 67 UCS-2 characters),
+        so a group is complete as soon as it holds a shorter part. A group that stays incomplete
+        (lost part, last part filling a whole segment) is released timeout seconds after its last part.
+        - The reassembled SMS keeps the ID and the date of its first part, the history keys of every part
+        are saved inside its "Parts" field (see HistoryStore.get_key()), so each part is found inside the history.
+        - The pending parts are persisted inside a JSON-lines file, like the outbox,
+        as they are already marked as seen and read.
+    """
+
+    MULTIPART_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/multipart.jsonl")
+
+    # "SmsType" of a part of a concatenated SMS
+    MULTIPART_TYPE = "2"
+
+
+    def __init__(self, path: str, timeout: float = 30, max_gap: float = 60, max_parts: int = 10, router_name: str = ""):
+        """
+        Args:
+            path (str): Path of the pending parts file.
+            timeout (float, optional): Delay before an incomplete group is released (in seconds).
+            max_gap (float, optional): Max delay between the dates of two parts of the same SMS (in seconds).
+            max_parts (int, optional): Max number of parts of a SMS.
+            router_name (str, optional): Name of the router (multi-router mode).
+        """
+
+        self.path = path
+        self.timeout = timeout
+        self.max_gap = max_gap
+        self.max_parts = max_parts
+        self.router_name = router_name
+
+        # Pending parts per sender (reception order) and reception time of the last part
+        self.groups: dict[str, list[dict[str, str]]] = {}
+        self.updated_at: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+        Metrics.register_gauge(Metrics.labeled("multipart_pending_parts", router=router_name), self.__len__)
+
+
+    def __len__(self) -> int:
+        return sum(len(parts) for parts in self.groups.values())
+
+
+    @staticmethod
+    def from_config(config: dict[str, Any]) -> Optional["SmsAssembler"]:
+        """
+        Returns the multipart SMS assembler of a router (loaded), None if disabled.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (or a router config).
+        """
+
+        if not config["MULTIPART_ENABLED"]:
+            return None
+
+        assembler = SmsAssembler(
+            AppHistory.get_partition_path(SmsAssembler.MULTIPART_PATH, config["ROUTER_NAME"]),
+            config["MULTIPART_TIMEOUT"],
+            config["MULTIPART_MAX_GAP"],
+            config["MULTIPART_MAX_PARTS"],
+            config["ROUTER_NAME"]
+        )
+        assembler.load()
+
+        return assembler
+
+
+    @staticmethod
+    def is_full_segment(content: str) -> bool:
+        """
+        Returns True if the content fills a whole segment of a concatenated SMS.
+        """
+
+        lengths, (_, segment_size) = SmsEncoding.get_lengths(content)
+
+        return sum(lengths) >= segment_size
+
+
+    @staticmethod
+    def get_timestamp(sms: dict[str, str]) -> float:
+        try:
+            return time.mktime(time.strptime(sms["Date"], "%Y-%m-%d %H:%M:%S"))
+        except (KeyError, ValueError):
+            return 0
+
+
+    @staticmethod
+    def merge(parts: list[dict[str, str]]) -> dict[str, Any]:
+        """
+        Returns the SMS made of the parts (ID and date of the first part).
+        """
+
+        sms: dict[str, Any] = dict(parts[0])
+        sms["Content"] = "".join(part["Content"] or "" for part in parts)
+
+        if len(parts) > 1:
+            sms["Parts"] = [HistoryStore.get_key(part) for part in parts]
+
+        return sms
+
+
+    def _append(self, events: list[dict]) -> None:
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+
+            with open(self.path, "a", encoding="utf-8") as multipart_file:
+                multipart_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                multipart_file.flush()
+                os.fsync(multipart_file.fileno())
+        except OSError as err:
+            logger.error(f"Multipart file could not be written:\n{err}")
+
+
+    def _compact(self) -> None:
+        """
+        Rewrites the file with only the pending parts (temp file then atomic rename).
+        """
+
+        tmp_path = f"{self.path}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                for phone, parts in self.groups.items():
+                    for part in parts:
+                        event = {"received_at": self.updated_at[phone], "sms": part}
+                        tmp_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.error(f"Multipart file could not be compacted:\n{err}")
+
+
+    def load(self) -> bool:
+        """
+        Restores the pending parts from the file.
+
+        Returns:
+            bool: True if the file has been correctly loaded.
+        """
+
+        self.groups = {}
+        self.updated_at = {}
+
+        if not os.path.exists(self.path):
+            return True
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as multipart_file:
+                for line in multipart_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted multipart event ignored")
+                        continue
+
+                    phone = event["sms"]["Phone"]
+                    self.groups.setdefault(phone, []).append(event["sms"])
+                    self.updated_at[phone] = event["received_at"]
+        except OSError as err:
+            logger.error(f"Multipart file could not be loaded:\n{err}")
+            return False
+
+        self._compact()
+
+        return True
+
+
+    def is_complete(self, parts: list[dict[str, str]]) -> bool:
+        return len(parts) >= self.max_parts or not SmsAssembler.is_full_segment(parts[-1]["Content"] or "")
+
+
+    def wait_time(self) -> float:
+        """
+        Returns the delay before the next incomplete group is released (in seconds, infinite if none).
+        """
+
+        now = time.time()
+
+        with self.lock:
+            return min(
+                (max(updated_at + self.timeout - now, 0) for updated_at in self.updated_at.values()),
+                default=float("inf")
+            )
+
+
+    @Metrics.timed("sms_assembler")
+    def feed(self, sms_list: list[dict[str, str]]) -> list[dict[str, Any]]:
+        """
+        Adds the new SMS, and returns the SMS ready to be processed (reassembled if needed).
+
+        Note:
+            Should be called on every polling iteration (even without new SMS),
+            to release the incomplete groups after the timeout.
+
+        Args:
+            sms_list (list[dict[str, str]]): New SMS, from the oldest to the newest.
+
+        Returns:
+            list[dict[str, Any]]: The complete SMS, from the oldest to the newest.
+        """
+
+        now = time.time()
+        ready_groups: list[list[dict[str, str]]] = []
+
+        with self.lock:
+            new_parts: list[dict[str, str]] = []
+            pending_count = len(self)
+
+            for sms in sms_list:
+                if sms.get("SmsType") != SmsAssembler.MULTIPART_TYPE:
+                    ready_groups.append([sms])
+                    continue
+
+                phone = sms["Phone"]
+                parts = self.groups.get(phone)
+
+                # Not a part of the pending SMS of the sender (too late or already full)
+                if parts is not None and (
+                    len(parts) >= self.max_parts or
+                    abs(SmsAssembler.get_timestamp(sms) - SmsAssembler.get_timestamp(parts[-1])) > self.max_gap
+                ):
+                    ready_groups.append(self.groups.pop(phone))
+                    self.updated_at.pop(phone)
+
+                parts = self.groups.setdefault(phone, [])
+                parts.append(sms)
+                self.updated_at[phone] = now
+                new_parts.append(sms)
+
+                # Last part received (shorter than a segment)
+                if self.is_complete(parts):
+                    ready_groups.append(self.groups.pop(phone))
+                    self.updated_at.pop(phone)
+
+            if len(new_parts) > 0:
+                self._append([{"received_at": now, "sms": sms} for sms in new_parts])
+
+            # Incomplete groups after the timeout (lost part, or last part filling a whole segment)
+            for phone in list(self.groups.keys()):
+                if now - self.updated_at[phone] >= self.timeout:
+                    Metrics.increment("multipart_timeouts")
+                    logger.warning(f"Incomplete SMS from {phone} released after {self.timeout}s ({len(self.groups[phone])} parts)")
+
+                    ready_groups.append(self.groups.pop(phone))
+                    self.updated_at.pop(phone)
+
+            # Released parts removed from the file
+            if len(self) < pending_count + len(new_parts):
+                self._compact()
+
+        ready_sms = [SmsAssembler.merge(parts) for parts in ready_groups]
+
+        for sms in ready_sms:
+            if "Parts" in sms:
+                Metrics.increment("multipart_reassembled")
+                logger.info(f"SMS {sms['Index']} from {sms['Phone']} reassembled from {len(sms['Parts'])} parts")
+
+        # Reception order of the first parts
+        return sorted(ready_sms, key=lambda sms: (sms["Date"], int(sms["Index"])))
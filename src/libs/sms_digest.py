@@ -0,0 +1,301 @@
+from libs.app_history import AppHistory
+from libs.history_store import HistoryStore
+from libs.send_queue import SendQueue
+from libs.sms_template import SmsEncoding
+from libs.metrics import Metrics
+from libs import logger
+from typing import Any
+
+import threading
+import json
+import time
+import sys
+import os
+
+
+class SmsDigest:
+    """
+    Coalesces the SMS received by a forwarder during a burst into digest SMS ("digest" forwarder setting).
+
+    Note:
+        - The first SMS of a burst opens the digest window of the forwarder, the digest is queued
+        once the window is over or once it holds max_messages SMS.
+        - Every SMS is rendered as a single line (digest template of the forwarder), the lines are
+        split into digest SMS of max_segments segments (a longer line is truncated).
+        - The received SMS are still saved one by one inside the history, the digest SMS are
+        queued with the ID of every SMS they contain (see DeliveryTracker).
+        - The buffered SMS are persisted inside a JSON-lines file, like the outbox,
+        so they are not lost if the app restarts before the end of the window.
+    """
+
+    DIGEST_PATH = os.path.join(os.path.dirname(sys.argv[0]), "logs/digest.jsonl")
+
+    DEFAULT_TEMPLATE = "{time} {sender}: {content}"
+    HEADER = "{count} new SMS:"
+
+
+    def __init__(self, config: dict[str, Any], path: str, send_queue: SendQueue, router_name: str = ""):
+        """
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (hot reloaded "FORWARDER_DIGESTS" key).
+            path (str): Path of the digest file.
+            send_queue (SendQueue): Send queue of the router.
+            router_name (str, optional): Name of the router (multi-router mode).
+        """
+
+        self.config = config
+        self.path = path
+        self.send_queue = send_queue
+        self.router_name = router_name
+
+        # Open digests per forwarder ("started_at", window settings and the rendered "lines" with their "sources")
+        self.buffers: dict[str, dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+        Metrics.register_gauge(Metrics.labeled("digest_buffered_sms", router=router_name), self.__len__)
+
+
+    def __len__(self) -> int:
+        return sum(len(buffer["lines"]) for buffer in self.buffers.values())
+
+
+    @staticmethod
+    def from_config(config: dict[str, Any], send_queue: SendQueue) -> "SmsDigest":
+        """
+        Returns the digest buffer of a router (loaded).
+
+        Note:
+            Always created, the digest settings of the forwarders are hot reloaded.
+
+        Args:
+            config (dict[str, Any]): Returned from ConfigParser.get_config() (or a router config).
+            send_queue (SendQueue): Send queue of the router.
+        """
+
+        digest = SmsDigest(
+            config,
+            AppHistory.get_partition_path(SmsDigest.DIGEST_PATH, config["ROUTER_NAME"]),
+            send_queue,
+            config["ROUTER_NAME"]
+        )
+        digest.load()
+
+        return digest
+
+
+    @staticmethod
+    def split(lines: list[str], max_segments: int) -> list[str]:
+        """
+        Joins the lines into SMS of max_segments segments (a single SMS if 0), with a header.
+
+        Args:
+            lines (list[str]): Rendered SMS.
+            max_segments (int): Max number of segments of a digest SMS.
+
+        Returns:
+            list[str]: The digest SMS.
+        """
+
+        messages: list[str] = []
+        current = SmsDigest.HEADER.format(count=len(lines))
+        is_header_only = True
+
+        for line in lines:
+            candidate = f"{current}\n{line}"
+
+            # Full SMS, the line starts the next one
+            if max_segments > 0 and not is_header_only and SmsEncoding.count_segments(candidate) > max_segments:
+                messages.append(current)
+                candidate = line
+
+            current = SmsEncoding.truncate(candidate, max_segments)
+            is_header_only = False
+
+        messages.append(current)
+
+        return messages
+
+
+    def _append(self, events: list[dict]) -> None:
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+
+            with open(self.path, "a", encoding="utf-8") as digest_file:
+                digest_file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                digest_file.flush()
+                os.fsync(digest_file.fileno())
+        except OSError as err:
+            logger.error(f"Digest file could not be written:\n{err}")
+
+
+    def _compact(self) -> None:
+        """
+        Rewrites the file with only the open digests (temp file then atomic rename).
+        """
+
+        tmp_path = f"{self.path}.tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+                for forwarder, buffer in self.buffers.items():
+                    tmp_file.write(json.dumps({"event": "opened", "forwarder": forwarder, **buffer}, ensure_ascii=False) + "\n")
+
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.error(f"Digest file could not be compacted:\n{err}")
+
+
+    def load(self) -> bool:
+        """
+        Restores the open digests from the file.
+
+        Returns:
+            bool: True if the file has been correctly loaded.
+        """
+
+        self.buffers = {}
+
+        if not os.path.exists(self.path):
+            return True
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as digest_file:
+                for line in digest_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning("Corrupted digest event ignored")
+                        continue
+
+                    event_type = event.pop("event")
+                    forwarder = event.pop("forwarder")
+
+                    if event_type == "opened":
+                        self.buffers[forwarder] = event
+                    elif event_type == "added" and forwarder in self.buffers:
+                        self.buffers[forwarder]["lines"].append(event["line"])
+                        self.buffers[forwarder]["sources"].append(event["source"])
+        except OSError as err:
+            logger.error(f"Digest file could not be loaded:\n{err}")
+            return False
+
+        self._compact()
+
+        return True
+
+
+    def add(self, forwarder: str, sms: dict[str, str]) -> bool:
+        """
+        Adds a SMS to the open digest of a forwarder (opens it if needed).
+
+        Args:
+            forwarder (str): Phone number of the forwarder.
+            sms (dict[str, str]): Original SMS dictionary.
+
+        Returns:
+            bool: False if the forwarder has no digest (the SMS must be forwarded directly).
+        """
+
+        settings = self.config["FORWARDER_DIGESTS"].get(forwarder)
+
+        if settings is None:
+            return False
+
+        line = settings["template"].render(sms)
+
+        with self.lock:
+            buffer = self.buffers.get(forwarder)
+
+            if buffer is None:
+                # The window settings are kept until the digest is queued (hot reload)
+                buffer = {
+                    "started_at": time.time(),
+                    "window": settings["window"],
+                    "max_messages": settings["max_messages"],
+                    "max_segments": settings["max_segments"],
+                    "lines": [],
+                    "sources": []
+                }
+                self._append([{"event": "opened", "forwarder": forwarder, **buffer}])
+                self.buffers[forwarder] = buffer
+
+            self._append([{"event": "added", "forwarder": forwarder, "line": line, "source": HistoryStore.get_key(sms)}])
+            buffer["lines"].append(line)
+            buffer["sources"].append(HistoryStore.get_key(sms))
+
+        return True
+
+
+    def is_full(self, buffer: dict[str, Any], now: float) -> bool:
+        return len(buffer["lines"]) >= buffer["max_messages"] or now - buffer["started_at"] >= buffer["window"]
+
+
+    def wait_time(self) -> float:
+        """
+        Returns the delay before the next digest is due (in seconds, infinite if no digest is open).
+        """
+
+        now = time.time()
+
+        with self.lock:
+            return min(
+                (max(buffer["started_at"] + buffer["window"] - now, 0) for buffer in self.buffers.values()),
+                default=float("inf")
+            )
+
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Queues the due digests, the identical digest SMS of several forwarders are grouped.
+
+        Args:
+            force (bool, optional): Queues every open digest. Defaults to False.
+
+        Returns:
+            int: Number of digest SMS queued.
+        """
+
+        now = time.time()
+
+        with self.lock:
+            due_forwarders = [
+                forwarder for forwarder, buffer in self.buffers.items() if force or self.is_full(buffer, now)
+            ]
+
+            if len(due_forwarders) == 0:
+                return 0
+
+            # Digest SMS -> forwarders and received SMS IDs
+            messages: dict[str, tuple[list[str], list[str]]] = {}
+
+            for forwarder in due_forwarders:
+                buffer = self.buffers[forwarder]
+
+                for sms_content in SmsDigest.split(buffer["lines"], buffer["max_segments"]):
+                    phone_numbers, sources = messages.setdefault(sms_content, ([], []))
+                    phone_numbers.append(forwarder)
+                    sources.extend(source for source in buffer["sources"] if source not in sources)
+
+            # Single write, the digests are kept for the next flush if they cannot be queued
+            if self.send_queue.enqueue_many(
+                [(sms_content, phone_numbers) for sms_content, (phone_numbers, _) in messages.items()],
+                [sources for _, sources in messages.values()]
+            ) is None:
+                logger.error("Digest SMS could not be queued, kept for the next flush")
+                return 0
+
+            for forwarder in due_forwarders:
+                sms_count = len(self.buffers.pop(forwarder)["lines"])
+                logger.info(f"Digest of {sms_count} SMS queued for {forwarder}")
+
+                Metrics.increment("digest_sms", sms_count)
+
+            Metrics.increment("digest_forwards", len(messages))
+
+            self._compact()
+
+        return len(messages)
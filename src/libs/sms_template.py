@@ -0,0 +1,294 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+
+import string
+import re
+
+
+class SmsEncoding:
+    """
+    SMS segment counting and splitting (GSM-7 or UCS-2 encoding), used to avoid unexpected multipart SMS.
+
+    Note:
+        - A GSM-7 SMS holds 160 characters (153 per segment if multipart),
+        the extended characters (such as "€" or "{") count twice.
+        - A single character outside of the GSM-7 alphabet switches the whole SMS to UCS-2,
+        70 characters (67 per segment if multipart), emojis count twice.
+    """
+
+    GSM7_BASIC = frozenset(
+        "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+        "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+    )
+    GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+
+    # Single SMS and multipart segment sizes
+    GSM7_SIZES = (160, 153)
+    UCS2_SIZES = (70, 67)
+
+
+    @staticmethod
+    def is_gsm7(text: str) -> bool:
+        return all(char in SmsEncoding.GSM7_BASIC or char in SmsEncoding.GSM7_EXTENDED for char in text)
+
+
+    @staticmethod
+    def get_lengths(text: str) -> tuple[list[int], tuple[int, int]]:
+        """
+        Returns the encoded length of every character and the segment sizes of the encoding.
+        """
+
+        if SmsEncoding.is_gsm7(text):
+            return [2 if char in SmsEncoding.GSM7_EXTENDED else 1 for char in text], SmsEncoding.GSM7_SIZES
+
+        # UTF-16 code units
+        return [2 if ord(char) > 0xFFFF else 1 for char in text], SmsEncoding.UCS2_SIZES
+
+
+    @staticmethod
+    def count_segments(text: str) -> int:
+        """
+        Returns the number of segments needed to send the text.
+
+        Args:
+            text (str): Content of the SMS.
+
+        Returns:
+            int: Number of segments (1 for a single SMS).
+        """
+
+        lengths, (single_size, segment_size) = SmsEncoding.get_lengths(text)
+        total_length = sum(lengths)
+
+        if total_length <= single_size:
+            return 1
+
+        return -(-total_length // segment_size)
+
+
+    @staticmethod
+    def truncate(text: str, max_segments: int, suffix: str = "..") -> str:
+        """
+        Truncates the text so it fits inside max_segments segments.
+
+        Args:
+            text (str): Content of the SMS.
+            max_segments (int): Max number of segments.
+            suffix (str, optional): Added at the end of a truncated text.
+
+        Returns:
+            str: The text, truncated if needed.
+        """
+
+        if max_segments < 1 or SmsEncoding.count_segments(text) <= max_segments:
+            return text
+
+        lengths, (single_size, segment_size) = SmsEncoding.get_lengths(text + suffix)
+        max_length = single_size if max_segments == 1 else segment_size * max_segments
+        max_length -= sum(lengths[len(text):])
+
+        total_length = 0
+
+        for i, length in enumerate(lengths[:len(text)]):
+            if total_length + length > max_length:
+                return text[:i] + suffix
+
+            total_length += length
+
+        return text
+
+
+    @staticmethod
+    def split(text: str, max_parts: int = 0, suffix: str = "..") -> list[str]:
+        """
+        Splits the text into single SMS (one segment each), preferably after a space or a line break.
+
+        Args:
+            text (str): Content of the SMS.
+            max_parts (int, optional): Max number of SMS, the last one is truncated (0 to disable it).
+            suffix (str, optional): Added at the end of a truncated text.
+
+        Returns:
+            list[str]: The SMS, in the reading order.
+        """
+
+        lengths, (single_size, _) = SmsEncoding.get_lengths(text)
+
+        if sum(lengths) <= single_size:
+            return [text]
+
+        parts: list[str] = []
+        start = 0
+
+        while start < len(text):
+            if max_parts > 0 and len(parts) == max_parts - 1:
+                parts.append(SmsEncoding.truncate(text[start:], 1, suffix))
+                break
+
+            end = start
+            total_length = 0
+
+            while end < len(text) and total_length + lengths[end] <= single_size:
+                total_length += lengths[end]
+                end += 1
+
+            # Words are kept whole, unless the last space is in the first half of the SMS
+            if end < len(text):
+                last_space = max(text.rfind(" ", start, end), text.rfind("\n", start, end))
+
+                if last_space >= start + (end - start) // 2:
+                    end = last_space + 1
+
+            parts.append(text[start:end])
+            start = end
+
+        return parts
+
+
+class SmsTemplate:
+    """
+    Forwarded SMS template, parsed once when the config is loaded.
+
+    Fields:
+        - {sender}: Contact name if known, phone number otherwise.
+        - {contact}: Contact name (empty if unknown).
+        - {phone}: Phone number of the sender.
+        - {date}: Reception time if received today, full date otherwise.
+        - {full_date}: Full reception date ("YYYY-MM-DD HH:MM:SS").
+        - {day}: Reception day ("YYYY-MM-DD").
+        - {time}: Reception time ("HH:MM:SS").
+        - {router}: Name of the router (multi-router mode).
+        - {content}: Content of the SMS, "{content:100}" truncates it to 100 characters.
+
+    Note:
+        If max_segments is set, the SMS is truncated so it fits inside max_segments segments
+        (see SmsEncoding), instead of silently becoming a multipart SMS. With split enabled,
+        a long SMS is sent as several single SMS instead (max_segments SMS max).
+    """
+
+    DEFAULT = "[{date}] New SMS from '{sender}':\n\n{content}"
+    FIELDS = ("sender", "contact", "phone", "date", "full_date", "day", "time", "router", "content")
+
+    DATE_REGEX = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
+    def __init__(self, template: str = DEFAULT, max_segments: int = 0, split: bool = False):
+        """
+        Args:
+            template (str, optional): The template string.
+            max_segments (int, optional): Max number of segments of the SMS (0 to disable it).
+            split (bool, optional): Splits a long SMS into single SMS (see SmsTemplate.split_content()).
+
+        Raises:
+            ValueError: If the template is invalid.
+        """
+
+        self.template = template
+        self.max_segments = max_segments
+        self.split = split
+
+        # (literal text, field name, max length) parts
+        self.parts: list[tuple[str, Optional[str], int]] = []
+
+        try:
+            parsed_template = list(string.Formatter().parse(template))
+        except ValueError as err:
+            raise ValueError(f"Invalid template [{template}]: {err}")
+
+        for literal_text, field_name, format_spec, _ in parsed_template:
+            if field_name is not None and field_name not in SmsTemplate.FIELDS:
+                raise ValueError(f"Unknown template field {{{field_name}}}, available fields: {', '.join(SmsTemplate.FIELDS)}")
+
+            if format_spec and not format_spec.isdigit():
+                raise ValueError(f"Invalid template field {{{field_name}:{format_spec}}}, only a max length can be set")
+
+            self.parts.append((literal_text, field_name, int(format_spec) if format_spec else 0))
+
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse_date(sms_date: str) -> tuple[str, str]:
+        """
+        Returns the day & time of a SMS date (cached, most SMS of a burst share the same dates).
+        """
+
+        if SmsTemplate.DATE_REGEX.fullmatch(sms_date):
+            return sms_date[:10], sms_date[11:]
+
+        # Unexpected format (kept as is)
+        try:
+            sms_datetime = datetime.fromisoformat(sms_date)
+            return sms_datetime.strftime("%Y-%m-%d"), sms_datetime.strftime("%H:%M:%S")
+        except ValueError:
+            return sms_date, sms_date
+
+
+    @staticmethod
+    def format_date(sms_date: str) -> str:
+        """
+        Returns the time if the SMS has been received today, the full date otherwise.
+        """
+
+        day, time = SmsTemplate.parse_date(sms_date)
+
+        if day == date.today().isoformat():
+            return time
+
+        return sms_date
+
+
+    def render(self, sms: dict[str, str]) -> str:
+        """
+        Renders the template with the SMS info.
+
+        Args:
+            sms (dict[str, str]): Original SMS dict.
+
+        Returns:
+            str: The forwarded SMS content (not truncated if split is enabled).
+        """
+
+        sms_date = sms.get("Date") or ""
+        day, time = SmsTemplate.parse_date(sms_date)
+
+        fields = {
+            "sender": sms.get("Contact") or sms.get("Phone") or "",
+            "contact": sms.get("Contact") or "",
+            "phone": sms.get("Phone") or "",
+            "date": time if day == date.today().isoformat() else sms_date,
+            "full_date": sms_date,
+            "day": day,
+            "time": time,
+            "router": sms.get("Router") or "",
+            "content": sms.get("Content") or ""
+        }
+
+        chunks = []
+
+        for literal_text, field_name, max_length in self.parts:
+            chunks.append(literal_text)
+
+            if field_name is not None:
+                value = fields[field_name]
+
+                if max_length > 0 and len(value) > max_length:
+                    value = value[:max_length] + ".."
+
+                chunks.append(value)
+
+        if self.split:
+            return "".join(chunks)
+
+        return SmsEncoding.truncate("".join(chunks), self.max_segments)
+
+
+    def split_content(self, sms_content: str) -> list[str]:
+        """
+        Returns the SMS to send for a rendered content (several single SMS if split is enabled).
+        """
+
+        if self.split:
+            return SmsEncoding.split(sms_content, self.max_segments)
+
+        return [sms_content]
@@ -0,0 +1,6 @@
+import sys
+import os
+
+
+# The app modules are imported from /src ("from libs import ..."), like app.py and the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
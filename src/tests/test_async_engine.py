@@ -0,0 +1,98 @@
+from benchmarks.mock_router import MockRouter
+from libs.async_engine import AsyncEngine
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.reply_matcher import ReplyMatcher
+from libs.routing_table import RoutingTable
+from libs.send_queue import SendQueue
+from libs.sms_digest import SmsDigest
+from typing import Any
+
+import asyncio
+import time
+
+import pytest
+
+
+SENDER = "+33612345678"
+FORWARDER = "+33700000000"
+
+
+@pytest.fixture
+def mock_router():
+    mock_router = MockRouter(latency=0).start()
+    yield mock_router
+    mock_router.stop()
+
+
+def make_config(uri: str, queue_size: int = 10) -> dict[str, Any]:
+    return {
+        "ROUTER_NAME": "",
+        "ROUTER_URI": uri,
+        "ROUTER_HEARTBEAT": 60,
+        "ROUTER_LOOP_SLEEP": 0.01,
+        "ROUTER_LOOP_MIN": 0.01,
+        "ROUTER_LOOP_MAX": 0.05,
+        "ROUTER_LOOP_BACKOFF": 2,
+        "ROUTER_BATCH_SIZE": 20,
+        "ROUTER_PROBE": False,
+        "ROUTER_SEND_WORKERS": 1,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "ROUTING": RoutingTable({}, {FORWARDER: []}, {SENDER: ReplyMatcher([{"filter": "ping", "reply": "pong"}])}),
+        "HOUSEKEEPING_ENABLED": False,
+        "DELIVERY_ENABLED": False,
+        "MULTIPART_ENABLED": False,
+        "APP_QUEUE_SIZE": queue_size
+    }
+
+
+def make_engine(tmp_path, monkeypatch, uri: str, queue_size: int = 10) -> AsyncEngine:
+    monkeypatch.setattr(SmsDigest, "DIGEST_PATH", str(tmp_path / "digest.jsonl"))
+
+    # The mock router IDs start from the same value
+    monkeypatch.setattr(HuaweiWrapper, "last_received_sms_ids", {})
+
+    send_queue = SendQueue(str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"), 1000, 1000)
+    assert send_queue.load()
+
+    return AsyncEngine(make_config(uri, queue_size), False, send_queue)
+
+
+def run_until(engine: AsyncEngine, condition, timeout: float = 5) -> None:
+    async def run() -> None:
+        task = asyncio.create_task(engine.main())
+        deadline = time.monotonic() + timeout
+
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(run())
+    finally:
+        engine.session.disconnect(False)
+
+
+def test_forwards_and_replies_through_the_task_queues(tmp_path, monkeypatch, mock_router):
+    engine = make_engine(tmp_path, monkeypatch, mock_router.uri)
+
+    mock_router.add_sms(SENDER, "ping")
+    run_until(engine, lambda: len(mock_router.sent_box) >= 2)
+
+    sent = sorted((sms["Phone"], sms["Content"]) for sms in mock_router.sent_box.values())
+
+    assert [phone for phone, _ in sent] == [SENDER, FORWARDER]
+    assert sent[0][1] == "pong"
+    assert "ping" in sent[1][1]
+
+
+def test_burst_larger_than_the_queues_is_fully_forwarded(tmp_path, monkeypatch, mock_router):
+    engine = make_engine(tmp_path, monkeypatch, mock_router.uri, queue_size=2)
+
+    mock_router.add_burst(10)
+    run_until(engine, lambda: len(mock_router.sent_box) >= 10)
+
+    assert sorted(sms["Phone"] for sms in mock_router.sent_box.values()) == [FORWARDER] * 10
+    assert len(engine.send_queue) == 0
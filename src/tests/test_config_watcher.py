@@ -0,0 +1,116 @@
+from libs.config_parser import ConfigParser
+from libs.config_watcher import ConfigWatcher
+from libs.routing_table import RoutingTable
+from libs.metrics import Metrics
+from typing import Any
+
+import threading
+import time
+import sys
+import os
+
+import pytest
+
+
+def make_config(forwarders: dict[str, list[str]], loop_sleep: float = 1) -> dict[str, Any]:
+    return {
+        "APP_COUNTRY_CODE": "+33",
+        "CONTACTS": {},
+        "FORWARDERS": forwarders,
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "REPLIERS": {},
+        "ROUTING": RoutingTable({}, forwarders, {}, "+33"),
+        "ROUTER_LOOP_SLEEP": loop_sleep
+    }
+
+
+@pytest.fixture
+def config_paths(tmp_path, monkeypatch):
+    paths = (str(tmp_path / "config.dev.yaml"), str(tmp_path / "config.yaml"))
+    monkeypatch.setattr(ConfigParser, "get_config_paths", lambda: paths)
+
+    with open(paths[1], "w") as config_file:
+        config_file.write("forwarders: []\n")
+
+    return paths
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+
+def test_reload_swaps_the_routing_keys_of_every_target(config_paths, monkeypatch, caplog):
+    config = make_config({"+33700000001": []})
+    router_config = {**config, "ROUTER_NAME": "router1"}
+
+    watcher = ConfigWatcher(config, 0)
+    watcher.add_target(router_config)
+
+    monkeypatch.setattr(ConfigParser, "get_config", lambda: make_config({"+33700000002": []}, loop_sleep=2))
+
+    assert watcher.reload()
+
+    for target in (config, router_config):
+        assert list(target["FORWARDERS"]) == ["+33700000002"]
+        assert target["ROUTING"].route("+33612345678").forwarders == ("+33700000002",)
+
+        # Router settings need a restart
+        assert target["ROUTER_LOOP_SLEEP"] == 1
+
+    assert "Restart the app to apply: ROUTER_LOOP_SLEEP" in caplog.text
+
+
+def test_invalid_config_is_rejected(config_paths, monkeypatch):
+    config = make_config({"+33700000001": []})
+    routing = config["ROUTING"]
+    watcher = ConfigWatcher(config, 0)
+    failure_count = Metrics.counters.get("config_reload_failures", 0)
+
+    def invalid_config() -> None:
+        sys.exit(1)
+
+    monkeypatch.setattr(ConfigParser, "get_config", invalid_config)
+
+    assert not watcher.reload()
+    assert config["ROUTING"] is routing
+    assert Metrics.counters["config_reload_failures"] == failure_count + 1
+
+
+def test_file_change_and_signal_trigger_a_reload(config_paths, monkeypatch):
+    config = make_config({"+33700000001": []})
+    watcher = ConfigWatcher(config, 0.01)
+    reloads = []
+
+    monkeypatch.setattr(ConfigParser, "get_config", lambda: make_config({f"+3370000000{len(reloads) + 2}": []}))
+    monkeypatch.setattr(watcher, "reload", lambda: reloads.append(ConfigWatcher.reload(watcher)))
+
+    thread = threading.Thread(target=watcher.watch, daemon=True)
+    thread.start()
+
+    try:
+        time.sleep(0.05)
+        assert reloads == []
+
+        # Newer modification time
+        mtime = os.stat(config_paths[1]).st_mtime + 10
+        os.utime(config_paths[1], (mtime, mtime))
+
+        assert wait_for(lambda: len(reloads) == 1)
+        assert list(config["FORWARDERS"]) == ["+33700000002"]
+
+        # SIGHUP handler
+        watcher.reload_event.set()
+
+        assert wait_for(lambda: len(reloads) == 2)
+        assert list(config["FORWARDERS"]) == ["+33700000003"]
+    finally:
+        watcher.stop()
+        thread.join(5)
+
+    assert not thread.is_alive()
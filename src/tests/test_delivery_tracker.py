@@ -0,0 +1,113 @@
+from libs.delivery_tracker import DeliveryTracker
+from libs.routing_table import RoutingTable
+from libs.send_queue import SendQueue
+from typing import Any
+
+import pytest
+
+
+class FakeSms:
+    """
+    Sent box and draft box of a router (client.sms.get_sms_list(), newest first).
+    """
+
+    def __init__(self):
+        self.boxes: dict[int, dict[int, dict[str, str]]] = {2: {}, 3: {}}
+
+    def get_sms_list(self, page: int, box_type: Any, read_count: int, *args: Any) -> dict[str, Any]:
+        box = self.boxes[int(box_type)]
+        messages = [box[sms_id] for sms_id in sorted(box, reverse=True)][(page - 1) * read_count:page * read_count]
+
+        return {"Count": str(len(box)), "Messages": {"Message": messages} if len(messages) > 0 else None}
+
+
+class FakeClient:
+    def __init__(self):
+        self.sms = FakeSms()
+
+    def add_sent(self, sms_id: int, phone: str, content: str, status: str = DeliveryTracker.SENT_STATUS) -> None:
+        self.sms.boxes[2][sms_id] = {"Index": str(sms_id), "Phone": phone, "Content": content, "Smstat": status}
+
+
+@pytest.fixture
+def tracker(tmp_path, monkeypatch) -> DeliveryTracker:
+    send_queue = SendQueue(str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"), 1000, 1000)
+    send_queue.requeued = []
+    monkeypatch.setattr(send_queue, "requeue", lambda entry, phone_numbers: send_queue.requeued.append(phone_numbers))
+
+    return DeliveryTracker(str(tmp_path / "delivery.jsonl"), send_queue, 0, 300)
+
+
+def track(tracker: DeliveryTracker, entry_id: str, content: str, phone_numbers: list[str]) -> None:
+    tracker.track({"id": entry_id, "content": content, "phone_numbers": phone_numbers, "source": None}, phone_numbers)
+
+
+def test_check_ignores_the_sms_sent_before_the_tracker(tracker):
+    client = FakeClient()
+    client.add_sent(1, "+33611111111", "Hello")
+
+    assert tracker.seed(client)
+    assert tracker.last_sent_id == 1
+
+    track(tracker, "a", "Hello", ["+33611111111"])
+
+    assert tracker.check(client) == 0
+    assert len(tracker) == 1
+
+    client.add_sent(2, "+33611111111", "Hello")
+
+    assert tracker.check(client) == 1
+    assert len(tracker) == 0
+
+
+def test_check_matches_the_normalized_phone_numbers(tracker):
+    client = FakeClient()
+    tracker.seed(client)
+    track(tracker, "a", "Hello", ["+33611111111", "+33622222222"])
+
+    client.add_sent(1, "06 11 11 11 11", "Hello")
+    client.add_sent(2, "0622222222", "Hello", DeliveryTracker.FAILED_STATUS)
+
+    assert tracker.check(client, RoutingTable({}, {}, {}, "+33")) == 1
+    assert tracker.send_queue.requeued == [["+33622222222"]]
+    assert len(tracker) == 0
+
+
+def test_check_waits_for_the_sms_still_being_sent(tracker):
+    client = FakeClient()
+    tracker.seed(client)
+    track(tracker, "a", "Hello", ["+33611111111"])
+    track(tracker, "b", "Hello", ["+33611111111"])
+
+    client.add_sent(1, "+33611111111", "Hello", "5")
+    client.add_sent(2, "+33611111111", "Hello")
+
+    # Only the second SMS is final, the last checked ID stays below the first one
+    assert tracker.check(client) == 1
+    assert list(tracker.entries) == ["a"]
+    assert tracker.last_sent_id == 0
+
+    # The second SMS is not matched again
+    assert tracker.check(client) == 0
+    assert list(tracker.entries) == ["a"]
+
+    client.sms.boxes[2][1]["Smstat"] = DeliveryTracker.FAILED_STATUS
+
+    assert tracker.check(client) == 0
+    assert tracker.send_queue.requeued == [["+33611111111"]]
+    assert len(tracker) == 0
+    assert tracker.last_sent_id == 2
+    assert tracker.matched_ids == set()
+
+
+def test_load_restores_the_last_checked_id(tracker, tmp_path):
+    client = FakeClient()
+    client.add_sent(7, "+33611111111", "Old")
+    tracker.seed(client)
+    track(tracker, "a", "Hello", ["+33611111111"])
+
+    restored_tracker = DeliveryTracker(str(tmp_path / "delivery.jsonl"), tracker.send_queue, 0, 300)
+
+    assert restored_tracker.load()
+    assert restored_tracker.last_sent_id == 7
+    assert list(restored_tracker.entries) == ["a"]
@@ -0,0 +1,133 @@
+from libs.forward_sink import ForwardSink
+from typing import Any
+
+import threading
+import json
+import time
+
+import pytest
+
+
+class FakeSink(ForwardSink):
+    """
+    Records the delivered batches, fails while is_down is set.
+    """
+
+    def __init__(self, settings: dict[str, Any]):
+        super().__init__(settings)
+
+        self.batches: list[list[dict[str, Any]]] = []
+        self.attempts = 0
+        self.is_down = False
+
+
+    def deliver(self, batch: list[dict[str, Any]]) -> None:
+        self.attempts += 1
+
+        if self.is_down:
+            raise ConnectionError("Sink down")
+
+        self.batches.append(batch)
+
+
+def make_settings(**settings: Any) -> dict[str, Any]:
+    return {
+        "name": "test",
+        "type": "spool",
+        "batch_size": 3,
+        "batch_delay": 0.05,
+        "timeout": 1,
+        "max_attempts": 3,
+        "retry_delay": 0,
+        "queue_size": 100,
+        **settings
+    }
+
+
+@pytest.fixture(autouse=True)
+def sink_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(ForwardSink, "PENDING_PATH", str(tmp_path / "sink.jsonl"))
+    monkeypatch.setattr(ForwardSink, "DEAD_LETTER_PATH", str(tmp_path / "dead" / "sink_dead_letter.jsonl"))
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_forward_sink_is_abstract():
+    with pytest.raises(TypeError):
+        ForwardSink(make_settings()) # type: ignore
+
+
+def test_submitted_sms_are_delivered_in_batches():
+    sink = FakeSink(make_settings())
+
+    for i in range(7):
+        assert sink.submit({"Index": str(i)})
+
+    sink.start()
+    wait_for(lambda: len(sink.pending) == 0)
+    sink.stop()
+
+    assert [[record["Index"] for record in batch] for batch in sink.batches] == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+
+    # Nothing left to restore
+    restored_sink = FakeSink(make_settings())
+    assert restored_sink.load()
+    assert len(restored_sink.pending) == 0
+
+
+def test_failed_batch_is_retried_then_dead_lettered():
+    sink = FakeSink(make_settings())
+    sink.is_down = True
+
+    assert sink.deliver_batch([{"Index": "1"}]) is False
+    assert sink.attempts == 3
+
+    with open(ForwardSink.DEAD_LETTER_PATH, "r", encoding="utf-8") as dead_letter_file:
+        dead_letters = [json.loads(line) for line in dead_letter_file]
+
+    assert [(record["sink"], record["Index"]) for record in dead_letters] == [("test", "1")]
+
+    sink.is_down = False
+
+    assert sink.deliver_batch([{"Index": "2"}]) is True
+
+
+def test_undelivered_sms_are_kept_when_stopping():
+    sink = FakeSink(make_settings(retry_delay=60))
+    sink.is_down = True
+    sink.submit({"Index": "1"})
+    sink.start()
+
+    # Waiting for the retry delay
+    wait_for(lambda: sink.attempts == 1)
+    sink.stop()
+
+    assert sink.attempts == 2
+    assert not sink.thread.is_alive()
+
+    restored_sink = FakeSink(make_settings())
+    assert restored_sink.load()
+    assert [record["Index"] for record in restored_sink.pending.values()] == ["1"]
+
+
+def test_restored_sms_over_the_queue_size_are_queued_later():
+    sink = FakeSink(make_settings(queue_size=2))
+
+    # Written by a previous run with a larger queue
+    with sink.lock:
+        for i in range(5):
+            sink._append([{"event": "queued", "id": str(i), "record": {"Index": str(i)}}])
+
+    assert sink.load()
+    assert sink.queue.qsize() == 2 and len(sink.backlog) == 3
+
+    sink.start()
+    wait_for(lambda: len(sink.pending) == 0)
+    sink.stop()
+
+    assert sorted(record["Index"] for batch in sink.batches for record in batch) == ["0", "1", "2", "3", "4"]
@@ -0,0 +1,104 @@
+from libs.app_history import AppHistory
+from libs.history_cli import HistoryCli
+
+import json
+import csv
+import io
+
+import pytest
+
+
+RECORDS = [
+    {"Index": "40001", "Phone": "+33612345678", "Date": "2024-01-01 10:00:00", "Contact": "Alice", "Content": "Bank code 1234"},
+    {"Index": "40002", "Phone": "+33612345678", "Date": "2024-01-02 09:00:00", "Contact": "Alice", "Content": "Hello"},
+    {"Index": "40003", "Phone": "+33700000000", "Date": "2024-01-02 23:59:59", "Content": "Café"},
+    {"Index": "40004", "Phone": "+33612345678", "Date": "2024-01-03 08:00:00", "Contact": "Alice", "Content": "Late"}
+]
+
+
+@pytest.fixture(autouse=True)
+def history_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(AppHistory, "HISTORY_PATH", str(tmp_path / "history.jsonl"))
+
+    # Main history and a router partition, with a superseded record
+    with open(tmp_path / "history.jsonl", "w", encoding="utf-8") as history_file:
+        for record in RECORDS[:2] + [{**RECORDS[0], "Delivery": {"+33600000000": "sent"}}]:
+            history_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    with open(tmp_path / "history.router2.jsonl", "w", encoding="utf-8") as history_file:
+        for record in RECORDS[2:]:
+            history_file.write(json.dumps({**record, "Router": "router2"}, ensure_ascii=False) + "\n")
+
+
+def run(*argv: str) -> str:
+    args = HistoryCli.get_parser().parse_args(argv)
+    output = io.StringIO()
+
+    if args.command == "export":
+        HistoryCli.export(args, output)
+    else:
+        HistoryCli.stats(args, output)
+
+    return output.getvalue()
+
+
+def exported_ids(*argv: str) -> list[str]:
+    return [json.loads(line)["Index"] for line in run("export", *argv).splitlines()]
+
+
+def test_export_streams_every_partition_once():
+    assert exported_ids() == ["40002", "40001", "40003", "40004"]
+    assert "Delivery" in json.loads(run("export").splitlines()[1])
+
+
+@pytest.mark.parametrize("argv, expected", [
+    (("--since", "2024-01-02"), ["40002", "40003", "40004"]),
+    (("--until", "2024-01-02"), ["40002", "40001", "40003"]),
+    (("--until", "2024-01-02 09:00:00"), ["40002", "40001"]),
+    (("--phone", "+33612345678"), ["40002", "40001", "40004"]),
+    (("--phone", "+337*"), ["40003"]),
+    (("--contact", "ALI"), ["40002", "40001", "40004"]),
+    (("--contains", "bank"), ["40001"]),
+    (("--contains", "café"), ["40003"]),
+    (("--router", "router2"), ["40003", "40004"])
+])
+def test_export_filters(argv, expected):
+    assert exported_ids(*argv) == expected
+
+
+def test_line_filter_only_rejects_non_matching_lines():
+    args = HistoryCli.get_parser().parse_args(["export", "--phone", "+3361*", "--contains", "CODE"])
+    line_filter = HistoryCli.get_line_filter(args)
+
+    assert line_filter(json.dumps(RECORDS[0]).encode("utf-8"))
+    assert not line_filter(json.dumps(RECORDS[1]).encode("utf-8"))
+    assert HistoryCli.get_line_filter(HistoryCli.get_parser().parse_args(["export", "--contains", "café"])) is None
+
+
+def test_export_csv():
+    rows = list(csv.reader(io.StringIO(run("export", "--router", "router2", "--format", "csv"))))
+
+    assert rows == [
+        list(HistoryCli.FIELDS),
+        ["router2", "40003", "2024-01-02 23:59:59", "+33700000000", "", "Café"],
+        ["router2", "40004", "2024-01-03 08:00:00", "+33612345678", "Alice", "Late"]
+    ]
+
+
+def test_stats_per_sender_and_day():
+    rows = list(csv.reader(io.StringIO(run("stats", "--format", "csv"))))
+
+    assert rows == [
+        ["Phone", "Day", "Contact", "Count"],
+        ["+33612345678", "2024-01-01", "Alice", "1"],
+        ["+33612345678", "2024-01-02", "Alice", "1"],
+        ["+33612345678", "2024-01-03", "Alice", "1"],
+        ["+33700000000", "2024-01-02", "", "1"]
+    ]
+
+
+def test_stats_per_router():
+    assert [json.loads(line) for line in run("stats", "--by", "router").splitlines()] == [
+        {"Router": "", "Count": 2},
+        {"Router": "router2", "Count": 2}
+    ]
@@ -0,0 +1,159 @@
+from libs.history_store import HistoryStore
+
+import json
+
+
+def make_sms(index: int, content: str = "Hello") -> dict[str, str]:
+    return {"Index": str(40000 + index), "Phone": "+33612345678", "Date": f"2024-01-01 10:00:{index:02d}", "Content": content}
+
+
+def read_lines(path) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as history_file:
+        return [json.loads(line) for line in history_file]
+
+
+def test_load_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "history.jsonl"
+    lines = [json.dumps(make_sms(i)) + "\n" for i in range(2)]
+    path.write_text("".join(lines) + '{"Index": "40002", "Pho', encoding="utf-8")
+
+    store = HistoryStore(str(path), 10)
+
+    assert store.load()
+    assert path.read_text(encoding="utf-8") == "".join(lines)
+    assert [record["Index"] for record in store.iter_records()] == ["40000", "40001"]
+
+    # New records are appended after the last complete line
+    store.add(make_sms(2))
+    store.flush()
+
+    assert [record["Index"] for record in read_lines(path)] == ["40000", "40001", "40002"]
+
+
+def test_find_reads_records_outside_of_the_hot_window(tmp_path):
+    path = tmp_path / "history.jsonl"
+    store = HistoryStore(str(path), 10)
+    store.load()
+
+    for i in range(5):
+        store.add(make_sms(i))
+
+    store.flush()
+
+    cold_store = HistoryStore(str(path), 1)
+    cold_store.load()
+    keys = [HistoryStore.get_key(make_sms(i)) for i in (0, 2, 9)]
+
+    assert sorted(cold_store.find(keys)) == sorted(keys[:2])
+    assert cold_store.get(keys[0])["Content"] == "Hello"
+
+
+def test_compact_keeps_the_newest_line_of_every_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "COMPACTION_MIN_STALE", 1)
+
+    path = tmp_path / "history.jsonl"
+    store = HistoryStore(str(path), 2)
+    store.load()
+
+    for i in range(4):
+        store.add(make_sms(i))
+
+    store.flush()
+
+    # 3 superseded lines for 4 records
+    for i in range(3):
+        assert store.update(HistoryStore.get_key(make_sms(i)), {"Delivery": {"+33600000000": "sent"}})
+
+    store.flush()
+
+    assert len(read_lines(path)) == 7
+    assert store.should_compact()
+    assert store.compact()
+
+    records = read_lines(path)
+
+    assert [record["Index"] for record in records] == ["40003", "40000", "40001", "40002"]
+    assert all("Delivery" in record for record in records[1:])
+    assert not store.should_compact()
+
+
+def test_should_compact_below_the_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "COMPACTION_MIN_STALE", 1)
+
+    store = HistoryStore(str(tmp_path / "history.jsonl"), 10)
+    store.load()
+
+    for i in range(4):
+        store.add(make_sms(i))
+
+    store.flush()
+    store.update(HistoryStore.get_key(make_sms(0)), {"Delivery": {}})
+    store.flush()
+
+    # 1 superseded line for 4 records
+    assert not store.should_compact()
+
+
+def test_add_skips_the_records_evicted_from_the_hot_window(tmp_path):
+    path = tmp_path / "history.jsonl"
+    store = HistoryStore(str(path), 1)
+    store.load()
+
+    for i in range(3):
+        assert store.add(make_sms(i))
+
+    store.flush()
+
+    # Only the last record is inside the hot window, the others are found from the offset index
+    assert not store.add(make_sms(0))
+    assert not store.add(make_sms(1))
+    assert store.add(make_sms(3))
+    store.flush()
+
+    assert [record["Index"] for record in read_lines(path)] == ["40000", "40001", "40002", "40003"]
+    assert [record["Index"] for record in store.iter_records()] == ["40000", "40001", "40002", "40003"]
+
+
+def test_find_uses_the_newest_offsets_after_merges_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "INDEX_MERGE_SIZE", 2)
+    monkeypatch.setattr(HistoryStore, "COMPACTION_MIN_STALE", 1)
+
+    path = tmp_path / "history.jsonl"
+    store = HistoryStore(str(path), 1)
+    store.load()
+
+    for i in range(5):
+        store.add(make_sms(i))
+
+    store.flush()
+    keys = [HistoryStore.get_key(make_sms(i)) for i in range(5)]
+
+    assert sorted(store.find(keys)) == sorted(keys)
+
+    # Appended after the index has been built (merged every 2 keys)
+    for i in range(3):
+        store.update(keys[i], {"Delivery": {"+33600000000": "sent"}})
+        store.flush()
+
+    store.hot.clear()
+
+    assert all("Delivery" in store.find(keys)[key] for key in keys[:3])
+    assert store.compact()
+
+    store.hot.clear()
+    records = store.find(keys)
+
+    assert sorted(records) == sorted(keys)
+    assert all("Delivery" in records[key] for key in keys[:3])
+
+
+def test_load_reads_the_tail_across_several_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryStore, "TAIL_BLOCK_SIZE", 64)
+
+    path = tmp_path / "history.jsonl"
+    path.write_text("".join(json.dumps(make_sms(i)) + "\n" for i in range(20)), encoding="utf-8")
+
+    store = HistoryStore(str(path), 3)
+    store.load()
+
+    assert [record["Index"] for record in store.hot.values()] == ["40017", "40018", "40019"]
@@ -0,0 +1,69 @@
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.routing_table import RoutingTable
+
+
+class FakeSms:
+    """
+    Records the send requests, the grouped requests fail if is_grouped_ok is False.
+    """
+
+    def __init__(self, is_grouped_ok: bool = True, failing_numbers: tuple[str, ...] = ()):
+        self.is_grouped_ok = is_grouped_ok
+        self.failing_numbers = failing_numbers
+        self.requests: list[tuple[list[str], str]] = []
+
+    def send_sms(self, phone_numbers: list[str], content: str) -> str:
+        self.requests.append((list(phone_numbers), content))
+
+        if len(phone_numbers) > 1 and not self.is_grouped_ok:
+            raise Exception("Grouped request refused")
+
+        return "ERROR" if any(phone_number in self.failing_numbers for phone_number in phone_numbers) else "OK"
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.sms = FakeSms(**kwargs)
+
+
+def make_sms(phone: str = "+33612345678") -> dict[str, str]:
+    return {"Index": "40001", "Phone": phone, "Date": "2024-01-01 10:00:00", "Content": "Hello"}
+
+
+def test_send_sms_bulk_groups_the_recipients():
+    client = FakeClient()
+    phone_numbers = ["+33600000001", "+33600000002", "+33600000003"]
+
+    assert HuaweiWrapper.send_sms_bulk(client, "Hello", phone_numbers) == {phone_number: True for phone_number in phone_numbers}
+    assert client.sms.requests == [(phone_numbers, "Hello")]
+
+
+def test_send_sms_bulk_falls_back_to_separate_sends():
+    client = FakeClient(is_grouped_ok=False, failing_numbers=("+33600000002",))
+    phone_numbers = ["+33600000001", "+33600000002", "+33600000003"]
+
+    states = HuaweiWrapper.send_sms_bulk(client, "Hello", phone_numbers, max_workers=3)
+
+    assert states == {"+33600000001": True, "+33600000002": False, "+33600000003": True}
+    assert sorted(request[0][0] for request in client.sms.requests[1:]) == phone_numbers
+
+
+def test_send_sms_bulk_without_fallback():
+    client = FakeClient(is_grouped_ok=False)
+
+    assert HuaweiWrapper.send_sms_bulk(client, "Hello", ["+33600000001", "+33600000002"], fallback=False) == {
+        "+33600000001": False,
+        "+33600000002": False
+    }
+    assert len(client.sms.requests) == 1
+
+
+def test_sms_forwarder_sends_a_single_request_per_content():
+    client = FakeClient()
+    routing = RoutingTable({}, {"+33600000001": [], "+33600000002": ["+33612345678"], "+33600000003": ["+3370*"]}, {})
+
+    assert HuaweiWrapper.sms_forwarder(client, make_sms(), routing)
+
+    # The third forwarder does not whitelist the sender
+    assert len(client.sms.requests) == 1
+    assert client.sms.requests[0][0] == ["+33600000001", "+33600000002"]
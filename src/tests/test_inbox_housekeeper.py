@@ -0,0 +1,117 @@
+from benchmarks.mock_router import MockRouter
+from huawei_lte_api.Connection import Connection
+from huawei_lte_api.Client import Client
+from libs.inbox_housekeeper import InboxHousekeeper
+from libs.app_history import AppHistory
+
+import json
+
+import pytest
+
+
+OLD_DATE = "2020-01-01 10:00:00"
+
+
+@pytest.fixture
+def mock_router():
+    mock_router = MockRouter(latency=0, local_max=100).start()
+    yield mock_router
+    mock_router.stop()
+
+
+@pytest.fixture
+def client(mock_router):
+    with Connection(mock_router.uri) as connection:
+        yield Client(connection)
+
+
+@pytest.fixture(autouse=True)
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(AppHistory, "HISTORY_PATH", str(tmp_path / "history.jsonl"))
+    monkeypatch.setattr(AppHistory, "LEGACY_HISTORY_PATH", str(tmp_path / "history.json"))
+    monkeypatch.setattr(AppHistory, "store", None)
+    monkeypatch.setattr(AppHistory, "stores", {})
+
+    assert AppHistory.load_history()
+
+
+def add_sms(mock_router: MockRouter, date: str = "", is_read: bool = True, is_recorded: bool = True) -> str:
+    index = mock_router.add_sms("+33612345678", f"SMS {len(mock_router.inbox)}")
+    sms = mock_router.inbox[index]
+
+    if date != "":
+        sms["Date"] = date
+
+    if is_read:
+        sms["Smstat"] = "1"
+
+    if is_recorded:
+        AppHistory.add_to_history(dict(sms))
+
+    return str(index)
+
+
+def make_housekeeper(tmp_path, archive: bool = False, max_inbox: int = 100) -> InboxHousekeeper:
+    return InboxHousekeeper(30, max_inbox, 3600, archive, str(tmp_path / "archive.jsonl"), page_size=2)
+
+
+def inbox_ids(mock_router: MockRouter) -> list[str]:
+    return [str(index) for index in mock_router.inbox]
+
+
+def test_only_deletes_the_old_read_recorded_sms(tmp_path, mock_router, client):
+    deleted_id = add_sms(mock_router, OLD_DATE)
+    unrecorded_id = add_sms(mock_router, OLD_DATE, is_recorded=False)
+    unread_id = add_sms(mock_router, OLD_DATE, is_read=False)
+    recent_id = add_sms(mock_router)
+
+    housekeeper = make_housekeeper(tmp_path)
+
+    assert housekeeper.run(client) == 1
+    assert inbox_ids(mock_router) == [unrecorded_id, unread_id, recent_id]
+    assert deleted_id not in inbox_ids(mock_router)
+    assert housekeeper.inbox_count == 3
+
+    # The history has been written before the deletion
+    assert len((tmp_path / "history.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_archives_the_unrecorded_sms_before_deleting_them(tmp_path, mock_router, client):
+    add_sms(mock_router, OLD_DATE)
+    unrecorded_id = add_sms(mock_router, OLD_DATE, is_recorded=False)
+    recent_id = add_sms(mock_router, is_recorded=False)
+
+    housekeeper = make_housekeeper(tmp_path, archive=True)
+
+    assert housekeeper.run(client) == 2
+    assert inbox_ids(mock_router) == [recent_id]
+
+    archived = [json.loads(line) for line in (tmp_path / "archive.jsonl").read_text(encoding="utf-8").splitlines()]
+
+    assert [sms["Index"] for sms in archived] == [unrecorded_id]
+
+
+def test_deletes_the_oldest_sms_over_the_inbox_limit(tmp_path, mock_router, client):
+    sms_ids = [add_sms(mock_router, f"2099-01-01 10:00:0{i}") for i in range(5)]
+
+    housekeeper = make_housekeeper(tmp_path, max_inbox=2)
+
+    assert housekeeper.run(client) == 3
+    assert inbox_ids(mock_router) == sms_ids[3:]
+
+
+def test_inbox_limit_follows_the_router_storage(tmp_path, mock_router, client):
+    mock_router.local_max = 5
+
+    assert make_housekeeper(tmp_path).get_inbox_limit(client) == 4
+    assert make_housekeeper(tmp_path, max_inbox=2).get_inbox_limit(client) == 2
+
+
+def test_runs_once_per_interval(tmp_path, mock_router, client):
+    housekeeper = make_housekeeper(tmp_path)
+
+    assert not housekeeper.is_due()
+
+    housekeeper.interval = 0
+
+    assert housekeeper.is_due()
@@ -0,0 +1,94 @@
+from huawei_lte_api import exceptions as HuaweiExceptions
+from libs.inbox_probe import InboxProbe
+from types import SimpleNamespace
+from typing import Any
+
+
+def make_client(notifications: Any, sms_count: Any) -> SimpleNamespace:
+    """
+    Returns a client whose endpoints return the given counters (raised if they are exceptions).
+    """
+
+    calls: list[str] = []
+
+    def endpoint(name: str, key: str, value: Any):
+        def call() -> dict[str, str]:
+            calls.append(name)
+
+            if isinstance(value, Exception):
+                raise value
+
+            return {key: str(value)}
+
+        return call
+
+    return SimpleNamespace(
+        calls=calls,
+        monitoring=SimpleNamespace(check_notifications=endpoint("notifications", "UnreadMessage", notifications)),
+        sms=SimpleNamespace(sms_count=endpoint("sms_count", "LocalUnread", sms_count))
+    )
+
+
+def listed_probe() -> InboxProbe:
+    # The first iteration always lists the inbox
+    probe = InboxProbe()
+    probe.should_list(make_client(0, 0))
+
+    return probe
+
+
+def not_supported() -> Exception:
+    return HuaweiExceptions.ResponseErrorNotSupportedException("Not supported", 100002)
+
+
+def test_first_iteration_lists_the_inbox():
+    client = make_client(0, 0)
+
+    assert InboxProbe().should_list(client)
+    assert client.calls == []
+
+
+def test_skips_the_list_without_unread_sms():
+    probe = listed_probe()
+
+    assert not probe.should_list(make_client(0, 5))
+    assert probe.should_list(make_client(2, 0))
+    assert probe.unread_count == 2
+
+
+def test_falls_back_to_the_sms_count_endpoint():
+    probe = listed_probe()
+    client = make_client(not_supported(), 0)
+
+    assert not probe.should_list(client)
+    assert not probe.should_list(client)
+
+    # The unsupported endpoint is not requested again
+    assert client.calls == ["notifications", "sms_count", "sms_count"]
+
+
+def test_always_lists_if_no_counter_is_supported():
+    probe = listed_probe()
+    client = make_client(not_supported(), KeyError("LocalUnread"))
+
+    assert probe.should_list(client)
+    assert probe.method_index is None
+    assert probe.should_list(client)
+    assert client.calls == ["notifications", "sms_count"]
+
+
+def test_temporary_error_lists_and_keeps_the_endpoint():
+    probe = listed_probe()
+
+    assert probe.should_list(make_client(ConnectionError("Timeout"), 0))
+    assert probe.method_index == 0
+
+
+def test_full_list_once_the_interval_is_over(monkeypatch):
+    probe = listed_probe()
+    client = make_client(0, 0)
+
+    monkeypatch.setattr(InboxProbe, "FULL_LIST_INTERVAL", 0)
+
+    assert probe.should_list(client)
+    assert client.calls == []
@@ -0,0 +1,93 @@
+from libs.metrics import Histogram, Metrics
+
+import urllib.request
+import urllib.error
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_metrics(monkeypatch):
+    monkeypatch.setattr(Metrics, "histograms", {})
+    monkeypatch.setattr(Metrics, "counters", {})
+    monkeypatch.setattr(Metrics, "gauges", {})
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+
+    for value in [0.001] * 98 + [0.2, 90]:
+        histogram.observe(value)
+
+    assert histogram.percentile(0.5) == 0.005
+    assert histogram.percentile(0.99) == 0.25
+    assert histogram.percentile(1) == 90
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_labeled_ignores_the_empty_labels():
+    assert Metrics.labeled("outbox_size", router="") == "outbox_size"
+    assert Metrics.labeled("outbox_size", router="router1", box="") == 'outbox_size{router="router1"}'
+
+
+def test_timed_records_the_failed_calls():
+    @Metrics.timed("stage")
+    def failing() -> None:
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        failing()
+
+    assert Metrics.histograms["stage"].count == 1
+
+
+def test_render_prometheus_text_format():
+    Metrics.observe("send", 0.02)
+    Metrics.observe("send", 3)
+    Metrics.increment("reconnects")
+    Metrics.increment(Metrics.labeled("router_errors", router="router1"), 2)
+    Metrics.increment(Metrics.labeled("router_errors", router="router2"))
+    Metrics.increment("router_errors_ignored")
+    Metrics.register_gauge(Metrics.labeled("outbox_size", router="router1"), lambda: 3)
+    Metrics.register_gauge(Metrics.labeled("outbox_size", router="router2"), lambda: 0.5)
+    Metrics.register_gauge("broken", lambda: 1 / 0)
+
+    lines = Metrics.render().splitlines()
+
+    assert lines[0] == "# TYPE sms_forwarding_stage_duration_seconds histogram"
+    assert 'sms_forwarding_stage_duration_seconds_bucket{stage="send",le="0.01"} 0' in lines
+    assert 'sms_forwarding_stage_duration_seconds_bucket{stage="send",le="0.025"} 1' in lines
+    assert 'sms_forwarding_stage_duration_seconds_bucket{stage="send",le="5"} 2' in lines
+    assert 'sms_forwarding_stage_duration_seconds_bucket{stage="send",le="+Inf"} 2' in lines
+    assert 'sms_forwarding_stage_duration_seconds_count{stage="send"} 2' in lines
+
+    assert lines[lines.index("# TYPE sms_forwarding_router_errors_total counter"):][:3] == [
+        "# TYPE sms_forwarding_router_errors_total counter",
+        'sms_forwarding_router_errors_total{router="router1"} 2',
+        'sms_forwarding_router_errors_total{router="router2"} 1'
+    ]
+    assert "sms_forwarding_reconnects_total 1" in lines
+    assert "sms_forwarding_router_errors_ignored_total 1" in lines
+
+    assert lines[-3:] == [
+        "# TYPE sms_forwarding_outbox_size gauge",
+        'sms_forwarding_outbox_size{router="router1"} 3',
+        'sms_forwarding_outbox_size{router="router2"} 0.5'
+    ]
+
+
+def test_metrics_endpoint():
+    Metrics.increment("reconnects")
+
+    assert Metrics.start_server("127.0.0.1", 0)
+    host, port = Metrics.server.server_address[:2] # type: ignore
+
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            assert "sms_forwarding_reconnects_total 1" in response.read().decode("utf-8")
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{port}/other")
+    finally:
+        Metrics.server.shutdown() # type: ignore
+        Metrics.server.server_close() # type: ignore
@@ -0,0 +1,70 @@
+from benchmarks.mock_router import MockRouter
+from huawei_lte_api.enums.sms import BoxTypeEnum, SortTypeEnum
+from huawei_lte_api.Connection import Connection
+from huawei_lte_api.Client import Client
+
+import pytest
+
+
+@pytest.fixture
+def mock_router():
+    mock_router = MockRouter(latency=0, local_max=3).start()
+    yield mock_router
+    mock_router.stop()
+
+
+@pytest.fixture
+def client(mock_router):
+    with Connection(mock_router.uri) as connection:
+        yield Client(connection)
+
+
+def get_inbox(client: Client, page: int = 1, count: int = 20) -> list[dict[str, str]]:
+    sms_list = client.sms.get_sms_list(page, BoxTypeEnum.LOCAL_INBOX, count, SortTypeEnum.DATE, True, True)
+    return sms_list["Messages"]["Message"] if sms_list["Count"] != "0" else []
+
+
+def test_login_is_required(mock_router, client):
+    assert mock_router.is_logged_in
+
+    client.user.logout()
+
+    with pytest.raises(Exception):
+        get_inbox(client)
+
+
+def test_inbox_pages_unread_first(mock_router, client):
+    first_id, second_id, third_id = mock_router.add_burst(3)
+
+    client.sms.set_read(first_id)
+
+    assert [sms["Index"] for sms in get_inbox(client, 1, 2)] == [str(second_id), str(third_id)]
+    assert [sms["Index"] for sms in get_inbox(client, 2, 2)] == [str(first_id)]
+    assert client.sms.sms_count()["LocalUnread"] == "2"
+
+
+def test_full_inbox_refuses_new_sms(mock_router):
+    mock_router.add_burst(3)
+
+    assert mock_router.add_sms("+33600000000") == -1
+    assert mock_router.refused_count == 1
+
+
+def test_sent_sms_are_stored_in_the_sent_box(mock_router, client):
+    assert client.sms.send_sms(["+33600000001", "+33600000002"], "Hello") == "OK"
+
+    assert sorted(sms["Phone"] for sms in mock_router.sent_box.values()) == ["+33600000001", "+33600000002"]
+    assert mock_router.request_counts["/api/sms/send-sms"] == 1
+
+
+def test_multipart_sms_are_listed_as_separate_parts(mock_router, client):
+    mock_router.add_multipart("+33600000000", "x" * 200)
+
+    assert [(len(sms["Content"]), sms["SmsType"]) for sms in get_inbox(client)] == [(153, "2"), (47, "2")]
+
+
+def test_error_injection(mock_router, client):
+    mock_router.error_rate = 1
+
+    with pytest.raises(Exception):
+        client.sms.sms_count()
@@ -0,0 +1,31 @@
+from libs.poll_scheduler import PollScheduler
+
+import pytest
+
+
+def test_backs_off_on_idle_polls_up_to_the_max():
+    scheduler = PollScheduler(0.5, 4, 2)
+
+    assert [scheduler.update(0) for _ in range(5)] == [1, 2, 4, 4, 4]
+    assert scheduler.idle_polls == 5
+    assert scheduler.polls_per_minute() == 15
+
+
+def test_resets_to_the_min_on_a_received_sms():
+    scheduler = PollScheduler(0.5, 4, 2, initial_interval=4)
+
+    assert scheduler.update(3) == 0.5
+    assert scheduler.idle_polls == 0
+    assert scheduler.update(0) == 1
+
+
+@pytest.mark.parametrize("initial_interval, expected", [(0, 1), (2, 2), (10, 3)])
+def test_initial_interval_is_bounded(initial_interval, expected):
+    assert PollScheduler(1, 3, 2, initial_interval).interval == expected
+
+
+def test_max_is_never_lower_than_the_min():
+    scheduler = PollScheduler(2, 1, 2)
+
+    assert scheduler.max_interval == 2
+    assert scheduler.update(0) == 2
@@ -0,0 +1,54 @@
+from libs.reply_matcher import AhoCorasick, ReplyMatcher
+
+import pytest
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+    assert automaton.find_all("ushers") == {0, 1, 3}
+    assert automaton.find_all("this") == {2}
+    assert automaton.find_all("nothing") == set()
+
+
+def test_highest_priority_then_config_order():
+    matcher = ReplyMatcher([
+        {"filter": "code", "reply": "first"},
+        {"keywords": ["code", "bank"], "reply": "keywords", "priority": 5},
+        {"regex": r"\d{4}", "reply": "regex", "priority": 5},
+        {"filter": "", "reply": "always"}
+    ])
+
+    assert [rule.reply for rule in matcher.match("Your BANK code: 1234")] == ["keywords"]
+    assert [rule.reply for rule in matcher.match("Your code: 1234")] == ["regex"]
+    assert [rule.reply for rule in matcher.match("Your code")] == ["first"]
+    assert [rule.reply for rule in matcher.match("Hello")] == ["always"]
+
+
+def test_reply_all_returns_every_match_sorted():
+    matcher = ReplyMatcher([
+        {"filter": "code", "reply": "first"},
+        {"keywords": ["code", "bank"], "reply": "keywords", "priority": 5},
+        {"regex": r"\d{4}", "reply": "regex", "priority": 5},
+        {"filter": "", "reply": "always"}
+    ], reply_all=True)
+
+    assert [rule.reply for rule in matcher.match("Your bank code: 1234")] == ["keywords", "regex", "first", "always"]
+    assert [rule.reply for rule in matcher.match("Bank")] == ["always"]
+
+
+def test_keywords_must_all_be_found():
+    matcher = ReplyMatcher([{"keywords": ["bank", "transfer"], "reply": "ok"}])
+
+    assert matcher.match("Bank transfer done")[0].reply == "ok"
+    assert matcher.match("Bank account") == []
+
+
+@pytest.mark.parametrize("message", [
+    {"filter": "code"},
+    {"reply": "ok"},
+    {"regex": "(", "reply": "ok"}
+])
+def test_invalid_messages(message):
+    with pytest.raises(ValueError):
+        ReplyMatcher([message])
@@ -0,0 +1,109 @@
+from benchmarks.mock_router import MockRouter
+from libs.router_supervisor import RouterSupervisor
+from libs.routing_table import RoutingTable
+from libs.async_engine import AsyncEngine
+from libs.sms_digest import SmsDigest
+from libs.metrics import Metrics
+from typing import Any
+
+import asyncio
+import time
+
+import pytest
+
+
+FORWARDER = "+33700000000"
+
+
+@pytest.fixture
+def mock_router():
+    mock_router = MockRouter(latency=0).start()
+    yield mock_router
+    mock_router.stop()
+
+
+def make_config(tmp_path, monkeypatch, uri: str, names: list[str]) -> dict[str, Any]:
+    monkeypatch.setattr(SmsDigest, "DIGEST_PATH", str(tmp_path / "digest.jsonl"))
+
+    routers = [
+        {
+            "ROUTER_NAME": name,
+            "ROUTER_URI": uri,
+            "ROUTER_HEARTBEAT": 60,
+            "ROUTER_LOOP_SLEEP": 0.01,
+            "ROUTER_LOOP_MIN": 0.01,
+            "ROUTER_LOOP_MAX": 0.05,
+            "ROUTER_LOOP_BACKOFF": 2,
+            "ROUTER_BATCH_SIZE": 20,
+            "ROUTER_PROBE": False,
+            "ROUTER_SEND_WORKERS": 1,
+            "ROUTER_SEND_RATE": 1000,
+            "ROUTER_SEND_BURST": 1000
+        }
+        for name in names
+    ]
+
+    return {
+        "FORWARDER_TEMPLATES": {},
+        "FORWARDER_DIGESTS": {},
+        "ROUTING": RoutingTable({}, {FORWARDER: []}, {}),
+        "OUTBOX_MAX_ATTEMPTS": 5,
+        "OUTBOX_RETRY_DELAY": 1,
+        "HOUSEKEEPING_ENABLED": False,
+        "DELIVERY_ENABLED": False,
+        "MULTIPART_ENABLED": False,
+        "APP_QUEUE_SIZE": 10,
+        "ROUTERS": routers
+    }
+
+
+def make_supervisor(tmp_path, config: dict[str, Any]) -> RouterSupervisor:
+    return RouterSupervisor(config, False, str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"))
+
+
+def test_sessions_are_created_before_the_loops(tmp_path, monkeypatch, mock_router):
+    supervisor = make_supervisor(tmp_path, make_config(tmp_path, monkeypatch, mock_router.uri, ["router1", "router2"]))
+
+    assert list(supervisor.sessions) == ["router1", "router2"]
+
+    supervisor.stop()
+
+    assert all(session.closed_event.is_set() for session in supervisor.sessions.values())
+
+
+def test_unreachable_router_only_stops_its_async_engine(tmp_path, monkeypatch, mock_router):
+    supervisor = make_supervisor(tmp_path, make_config(tmp_path, monkeypatch, mock_router.uri, ["router1", "router2"]))
+    engines = [
+        AsyncEngine(router_config, False, supervisor.send_queues[name], supervisor.sessions[name])
+        for router_config, name in zip(supervisor.router_configs, supervisor.sessions)
+    ]
+
+    def unreachable() -> None:
+        raise SystemExit(1)
+
+    monkeypatch.setattr(engines[0].session, "ensure", unreachable)
+    errors_metric = Metrics.labeled("router_errors", router="router1")
+    error_count = Metrics.counters.get(errors_metric, 0)
+
+    mock_router.add_sms("+33600000000", "Hello")
+
+    async def run() -> None:
+        stopped_engine = asyncio.create_task(engines[0].main())
+        running_engine = asyncio.create_task(engines[1].main())
+
+        # The tasks of the first engine end, without raising SystemExit
+        await asyncio.wait_for(stopped_engine, 5)
+
+        deadline = time.monotonic() + 5
+
+        while len(mock_router.sent_box) == 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+        assert not running_engine.done()
+        running_engine.cancel()
+
+    asyncio.run(run())
+    supervisor.stop()
+
+    assert [sms["Phone"] for sms in mock_router.sent_box.values()] == [FORWARDER]
+    assert Metrics.counters[errors_metric] == error_count + 1
@@ -0,0 +1,74 @@
+from libs.reply_matcher import ReplyMatcher
+from libs.routing_table import PhoneIndex, RoutingTable
+
+import pytest
+
+
+def test_phone_index_exact_then_longest_prefix():
+    index = PhoneIndex({"+33612345678": "exact", "+336*": "mobile", "+3361*": "longer", "+33*": "country"})
+
+    assert index.get("+33612345678") == "exact"
+    assert index.get("+33612000000") == "longer"
+    assert index.get("+33700000000") == "country"
+    assert index.get("+44700000000") is None
+    assert len(index) == 4
+
+
+def test_phone_index_get_all_matches():
+    index = PhoneIndex({"+33612345678": "exact", "+336*": "mobile", "+3361*": "longer", "+44*": "other"})
+
+    assert index.get_all("+33612345678") == ["exact", "longer", "mobile"]
+    assert index.get_all("+33699999999") == ["mobile"]
+
+
+@pytest.mark.parametrize("phone_number, expected", [
+    ("06 12 34 56 78", "+33612345678"),
+    ("0033.6.12.34.56.78", "+33612345678"),
+    ("+33 (6) 12-34-56-78", "+33612345678"),
+    ("061*", "+3361*"),
+    (" Bank ", "Bank"),
+    ("INFO", "INFO")
+])
+def test_normalize(phone_number, expected):
+    assert RoutingTable({}, {}, {}, "+33").normalize(phone_number) == expected
+
+
+def test_national_numbers_are_kept_without_country_code():
+    assert RoutingTable({}, {}, {}).normalize("0612345678") == "0612345678"
+
+
+def test_route_resolves_contacts_whitelists_and_repliers():
+    replier = ReplyMatcher([{"filter": "ping", "reply": "pong"}])
+    routing = RoutingTable(
+        {"06 12 34 56 78": "Alice", "+336*": "Mobile"},
+        {"+33700000001": [], "+33700000002": ["0612345678"], "+33700000003": ["+3361*"], "+33700000004": ["+44*"]},
+        {"+33612345678": replier},
+        "+33"
+    )
+
+    route = routing.route("+33612345678")
+
+    assert route.contact == "Alice"
+    assert route.forwarders == ("+33700000001", "+33700000002", "+33700000003")
+    assert route.ignored_forwarders == ("+33700000004",)
+    assert route.replier is replier
+
+    other_route = routing.route("0699999999")
+
+    assert other_route.contact == "Mobile"
+    assert other_route.forwarders == ("+33700000001",)
+    assert other_route.replier is None
+
+
+def test_routes_are_cached_and_cleared_once_full(monkeypatch):
+    monkeypatch.setattr(RoutingTable, "ROUTE_CACHE_SIZE", 2)
+    routing = RoutingTable({}, {"+33700000001": []}, {})
+
+    route = routing.route("+33600000001")
+
+    assert routing.route("+33600000001") is route
+
+    routing.route("+33600000002")
+    routing.route("+33600000003")
+
+    assert list(routing.routes) == ["+33600000003"]
@@ -0,0 +1,96 @@
+from libs.seen_index import SeenIndex
+
+import time
+
+import pytest
+
+
+def make_index(path, capacity: int = 3, max_age: float = 3600) -> SeenIndex:
+    seen_index = SeenIndex(str(path), capacity, max_age)
+    assert seen_index.load()
+
+    return seen_index
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "logs" / "seen.bin"
+
+
+def test_seen_sms_are_kept_after_a_restart(path):
+    seen_index = make_index(path)
+
+    assert seen_index.add(1)
+    assert not seen_index.add(1)
+    seen_index.close()
+
+    restored_index = make_index(path)
+
+    assert restored_index.contains(1)
+    assert not restored_index.add(1)
+    assert restored_index.add(2)
+    restored_index.close()
+
+
+def test_ring_overwrites_the_oldest_entries(path):
+    seen_index = make_index(path)
+
+    for key in range(1, 6):
+        assert seen_index.add(key)
+
+    assert [seen_index.contains(key) for key in range(1, 6)] == [False, False, True, True, True]
+    assert len(seen_index) == 3
+    seen_index.close()
+
+    # The next slot is restored, the oldest entry is still the next one overwritten
+    restored_index = make_index(path)
+
+    assert restored_index.add(6)
+    assert [restored_index.contains(key) for key in range(3, 7)] == [False, True, True, True]
+    restored_index.close()
+
+
+def test_expired_entries_are_ignored(path, monkeypatch):
+    seen_index = make_index(path, max_age=60)
+    seen_index.add(1)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+
+    assert not seen_index.contains(1)
+    assert seen_index.add(1)
+    seen_index.close()
+
+
+def test_capacity_change_keeps_the_newest_entries(path):
+    seen_index = make_index(path, capacity=4)
+
+    for key in range(1, 5):
+        seen_index.add(key)
+
+    seen_index.close()
+
+    resized_index = make_index(path, capacity=2)
+
+    assert [resized_index.contains(key) for key in range(1, 5)] == [False, False, True, True]
+    resized_index.close()
+
+
+def test_corrupted_file_is_replaced(path):
+    path.parent.mkdir()
+    path.write_bytes(b"corrupted")
+
+    seen_index = make_index(path)
+
+    assert len(seen_index) == 0
+    assert seen_index.add(1)
+    assert (path.parent / "seen.bin.corrupted").read_bytes() == b"corrupted"
+    seen_index.close()
+
+
+def test_reused_router_ids_are_new_sms():
+    sms = {"Index": "40001", "Phone": "+33612345678", "Date": "2024-01-01 10:00:00", "Content": "Hello"}
+
+    assert SeenIndex.get_key(sms) == SeenIndex.get_key(dict(sms))
+    assert SeenIndex.get_key(sms) != SeenIndex.get_key({**sms, "Date": "2024-01-02 10:00:00"})
+    assert SeenIndex.get_key(sms) != SeenIndex.get_key({**sms, "Router": "router2"})
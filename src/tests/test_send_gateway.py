@@ -0,0 +1,99 @@
+from libs.send_gateway import SendGateway
+from libs.routing_table import RoutingTable
+from libs.send_queue import SendQueue
+from typing import Any
+
+import json
+
+import pytest
+
+
+def make_gateway(tmp_path, token: str = "", max_pending: int = 100) -> SendGateway:
+    send_queues = {}
+
+    for name in ("router1", "router2"):
+        send_queues[name] = SendQueue(str(tmp_path / f"outbox.{name}.jsonl"), str(tmp_path / "dead_letter.jsonl"), 1000, 1000)
+        send_queues[name].load()
+
+    config = {
+        "ROUTING": RoutingTable({}, {}, {}, "+33"),
+        "GATEWAY_TOKEN": token,
+        "GATEWAY_MAX_PENDING": max_pending,
+        "GATEWAY_BATCH_WINDOW": 0
+    }
+
+    return SendGateway(config, send_queues)
+
+
+def post(gateway: SendGateway, path: str, data: Any, headers: dict[str, str] = {}) -> tuple[int, dict]:
+    return gateway.handle("POST", path, headers, json.dumps(data).encode("utf-8"))
+
+
+def test_token_is_required(tmp_path):
+    gateway = make_gateway(tmp_path, "secret")
+    message = {"to": "+33612345678", "content": "Hello"}
+
+    assert post(gateway, "/sms", message)[0] == 401
+    assert post(gateway, "/sms", message, {"Authorization": "Bearer wrong"})[0] == 401
+    assert post(gateway, "/sms", message, {"Authorization": "Bearer secret"})[0] == 202
+
+
+@pytest.mark.parametrize("message", [
+    {"to": "+33612345678"},
+    {"to": [], "content": "Hello"},
+    {"to": "not a number", "content": "Hello"},
+    {"to": "+33612345678", "content": "Hello", "router": "unknown"},
+    ["not", "an", "object"]
+])
+def test_invalid_messages_are_refused(tmp_path, message):
+    status_code, response = post(make_gateway(tmp_path), "/sms", message)
+
+    assert status_code == 400
+    assert "error" in response
+
+
+def test_sms_are_queued_then_refused_when_full(tmp_path):
+    gateway = make_gateway(tmp_path, max_pending=3)
+
+    status_code, response = post(gateway, "/sms/bulk", {"messages": [
+        {"to": "0612345678", "content": "Hello"},
+        {"to": ["+33600000001", "+33600000002"], "content": "Hi", "router": "router2"}
+    ]})
+
+    assert status_code == 202
+    assert len(gateway.send_queues["router1"]) == 1 and len(gateway.send_queues["router2"]) == 1
+    assert gateway.send_queues["router1"].entries[response["ids"][0]]["phone_numbers"] == ["+33612345678"]
+
+    # 2 queued SMS + 2 new ones > 3
+    status_code, _ = post(gateway, "/sms/bulk", {"messages": [{"to": "+33600000003", "content": "A"}] * 2})
+
+    assert status_code == 429
+
+
+def test_status_endpoints(tmp_path):
+    gateway = make_gateway(tmp_path)
+    _, response = post(gateway, "/sms", {"to": "+33612345678", "content": "Hello", "router": "router2"})
+
+    assert gateway.handle("GET", "/status", {}, b"") == (200, {"outbox": {"router1": 0, "router2": 1}})
+
+    status_code, status = gateway.handle("GET", f"/sms/{response['id']}", {}, b"")
+
+    assert status_code == 200
+    assert status["router"] == "router2" and status["id"] == response["id"]
+    assert gateway.handle("GET", "/sms/unknown", {}, b"")[0] == 404
+
+
+def test_flush_merges_the_identical_contents_without_merging_a_recipient_twice(tmp_path):
+    gateway = make_gateway(tmp_path)
+
+    ids = gateway.flush([
+        ("router1", "Alert", ["+33600000001"]),
+        ("router1", "Alert", ["+33600000002"]),
+        ("router1", "Alert", ["+33600000001"]),
+        ("router1", "Other", ["+33600000001"])
+    ])
+    entries = gateway.send_queues["router1"].entries
+
+    assert ids[0] == ids[1] and len(set(ids)) == 3
+    assert entries[ids[0]]["phone_numbers"] == ["+33600000001", "+33600000002"]
+    assert entries[ids[2]]["phone_numbers"] == ["+33600000001"]
@@ -0,0 +1,92 @@
+from libs.huawei_wrapper import HuaweiWrapper
+from libs.send_queue import SendQueue
+
+
+def make_queue(tmp_path) -> SendQueue:
+    send_queue = SendQueue(str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"), 1000, 1000, max_attempts=2)
+    assert send_queue.load()
+
+    return send_queue
+
+
+def test_load_replays_the_queued_sms(tmp_path, monkeypatch):
+    send_queue = make_queue(tmp_path)
+
+    sent_id = send_queue.enqueue("Sent", ["+33600000001"], "source")
+    retried_id = send_queue.enqueue("Retried", ["+33600000002", "+33600000003"])
+    queued_ids = send_queue.enqueue_many([("Queued", ["+33600000004"])])
+
+    # Only the first recipient of the second SMS is accepted by the router
+    monkeypatch.setattr(
+        HuaweiWrapper,
+        "send_sms_bulk",
+        lambda client, content, phone_numbers, *args: {
+            phone_number: content == "Sent" or phone_number == "+33600000002" for phone_number in phone_numbers
+        }
+    )
+
+    # The third SMS is sent after the next check
+    send_queue.entries[queued_ids[0]]["next_try"] += 3600
+    assert send_queue.process(object()) == 2
+
+    restored_queue = make_queue(tmp_path)
+
+    assert list(restored_queue.entries) == [retried_id, queued_ids[0]]
+    assert sent_id not in restored_queue.entries
+
+    retried_entry = restored_queue.entries[retried_id]
+
+    assert retried_entry["phone_numbers"] == ["+33600000003"]
+    assert retried_entry["attempts"] == 1
+    assert retried_entry["next_try"] == send_queue.entries[retried_id]["next_try"]
+    assert restored_queue.entries[queued_ids[0]]["content"] == "Queued"
+
+
+def test_load_skips_dead_letters_and_corrupted_lines(tmp_path, monkeypatch):
+    send_queue = make_queue(tmp_path)
+    entry_id = send_queue.enqueue("Failed", ["+33600000001"])
+
+    monkeypatch.setattr(
+        HuaweiWrapper,
+        "send_sms_bulk",
+        lambda client, content, phone_numbers, *args: {phone_number: False for phone_number in phone_numbers}
+    )
+
+    send_queue.process(object())
+    send_queue.entries[entry_id]["next_try"] = 0
+    send_queue.process(object())
+
+    assert len(send_queue) == 0
+    assert (tmp_path / "dead_letter.jsonl").read_text(encoding="utf-8").count("\n") == 1
+
+    with open(tmp_path / "outbox.jsonl", "a", encoding="utf-8") as outbox_file:
+        outbox_file.write('{"event": "queued", "id"')
+
+    assert len(make_queue(tmp_path)) == 0
+
+
+def test_failed_grouped_send_is_split_into_rate_limited_sends(tmp_path, monkeypatch):
+    send_queue = SendQueue(str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"), 0.001, 1)
+    send_queue.load()
+    entry_id = send_queue.enqueue("Hello", ["+33600000001", "+33600000002"])
+    requests: list[list[str]] = []
+
+    def send_sms_bulk(client, content, phone_numbers, max_workers, fallback):
+        requests.append(phone_numbers)
+        return {phone_number: len(phone_numbers) == 1 for phone_number in phone_numbers}
+
+    monkeypatch.setattr(HuaweiWrapper, "send_sms_bulk", send_sms_bulk)
+
+    # A single token, the separate sends wait for the next ones
+    assert send_queue.process(object()) == 1
+    assert requests == [["+33600000001", "+33600000002"]]
+    assert list(send_queue.entries) == [f"{entry_id}.0", f"{entry_id}.1"]
+    assert send_queue.get_status(entry_id) == {"status": "retrying", "pending": ["+33600000001", "+33600000002"], "attempts": 0}
+    assert list(make_queue(tmp_path).entries) == [f"{entry_id}.0", f"{entry_id}.1"]
+
+    for _ in range(2):
+        send_queue.bucket.tokens = 1
+        assert send_queue.process(object()) == 1
+
+    assert requests[1:] == [["+33600000001"], ["+33600000002"]]
+    assert send_queue.get_status(entry_id) == {"status": "sent"}
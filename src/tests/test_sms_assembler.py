@@ -0,0 +1,74 @@
+from libs.history_store import HistoryStore
+from libs.sms_assembler import SmsAssembler
+
+
+def make_part(index: int, content: str, phone: str = "+33612345678", second: int = 0) -> dict[str, str]:
+    return {
+        "Index": str(40000 + index),
+        "Phone": phone,
+        "Date": f"2024-01-01 10:00:{second:02d}",
+        "Content": content,
+        "SmsType": SmsAssembler.MULTIPART_TYPE
+    }
+
+
+FULL_SEGMENT = "x" * 153
+
+
+def test_feed_reassembles_the_parts_of_a_sender(tmp_path):
+    assembler = SmsAssembler(str(tmp_path / "multipart.jsonl"))
+    parts = [make_part(0, FULL_SEGMENT), make_part(1, FULL_SEGMENT, second=1), make_part(2, "end", second=2)]
+    single_sms = {**make_part(3, "Single", "+33600000000", 1), "SmsType": "1"}
+
+    # The last part (shorter than a segment) completes the SMS
+    assert assembler.feed(parts[:2]) == []
+    assert len(assembler) == 2
+
+    ready_sms = assembler.feed([single_sms, parts[2]])
+
+    assert [sms["Index"] for sms in ready_sms] == ["40000", "40003"]
+    assert ready_sms[0]["Content"] == FULL_SEGMENT * 2 + "end"
+    assert ready_sms[0]["Parts"] == [HistoryStore.get_key(part) for part in parts]
+    assert "Parts" not in ready_sms[1]
+    assert len(assembler) == 0
+
+
+def test_feed_groups_the_parts_by_sender_and_date(tmp_path):
+    assembler = SmsAssembler(str(tmp_path / "multipart.jsonl"), max_gap=60)
+
+    ready_sms = assembler.feed([
+        make_part(0, FULL_SEGMENT, "+33600000001"),
+        make_part(1, FULL_SEGMENT, "+33600000002"),
+        make_part(2, "end", "+33600000001", 1),
+        make_part(3, "end", "+33600000002", 2)
+    ])
+
+    assert [sms["Parts"] for sms in ready_sms] == [
+        [HistoryStore.get_key(make_part(0, "", "+33600000001")), HistoryStore.get_key(make_part(2, "", "+33600000001", 1))],
+        [HistoryStore.get_key(make_part(1, "", "+33600000002")), HistoryStore.get_key(make_part(3, "", "+33600000002", 2))]
+    ]
+
+    # A part received after max_gap starts a new SMS (the previous one is released incomplete)
+    ready_sms = assembler.feed([make_part(4, FULL_SEGMENT), {**make_part(5, "end"), "Date": "2024-01-01 10:05:00"}])
+
+    assert [(sms["Index"], sms["Content"]) for sms in ready_sms] == [("40004", FULL_SEGMENT), ("40005", "end")]
+
+
+def test_feed_releases_an_incomplete_sms_after_the_timeout(tmp_path):
+    path = tmp_path / "multipart.jsonl"
+    assembler = SmsAssembler(str(path), timeout=30)
+
+    assert assembler.feed([make_part(0, FULL_SEGMENT), make_part(1, FULL_SEGMENT, second=1)]) == []
+    assert 0 < assembler.wait_time() <= 30
+
+    # The pending parts survive a restart
+    restored_assembler = SmsAssembler(str(path), timeout=30)
+    assert restored_assembler.load()
+    assert len(restored_assembler) == 2
+
+    restored_assembler.updated_at["+33612345678"] -= 31
+    ready_sms = restored_assembler.feed([])
+
+    assert [sms["Content"] for sms in ready_sms] == [FULL_SEGMENT * 2]
+    assert len(restored_assembler) == 0
+    assert path.read_text(encoding="utf-8") == ""
@@ -0,0 +1,125 @@
+from libs.history_store import HistoryStore
+from libs.send_queue import SendQueue
+from libs.sms_digest import SmsDigest
+from libs.sms_template import SmsEncoding, SmsTemplate
+from typing import Any
+
+import time
+
+import pytest
+
+
+FORWARDER = "+33700000001"
+OTHER_FORWARDER = "+33700000002"
+
+
+def make_sms(index: int, content: str = "Hello") -> dict[str, str]:
+    return {"Index": str(40000 + index), "Phone": "+33612345678", "Date": f"2024-01-01 10:00:{index:02d}", "Content": content}
+
+
+def make_settings(window: float = 60, max_messages: int = 20, max_segments: int = 3) -> dict[str, Any]:
+    return {"window": window, "max_messages": max_messages, "max_segments": max_segments, "template": SmsTemplate("{content}")}
+
+
+@pytest.fixture
+def send_queue(tmp_path) -> SendQueue:
+    send_queue = SendQueue(str(tmp_path / "outbox.jsonl"), str(tmp_path / "dead_letter.jsonl"), 1000, 1000)
+    assert send_queue.load()
+
+    return send_queue
+
+
+def make_digest(tmp_path, send_queue: SendQueue, digests: dict[str, dict[str, Any]]) -> SmsDigest:
+    digest = SmsDigest({"FORWARDER_DIGESTS": digests}, str(tmp_path / "logs" / "digest.jsonl"), send_queue)
+    assert digest.load()
+
+    return digest
+
+
+def test_split_keeps_every_digest_sms_under_the_segments_limit():
+    lines = [f"Message {i} " + "x" * 100 for i in range(6)]
+    messages = SmsDigest.split(lines, 2)
+
+    assert len(messages) > 1
+    assert messages[0].startswith("6 new SMS:\n")
+    assert all(SmsEncoding.count_segments(message) <= 2 for message in messages)
+    assert "".join(messages).count("Message") == 6
+
+
+def test_split_without_limit_and_truncated_long_lines():
+    lines = ["a" * 400, "b"]
+
+    assert SmsDigest.split(lines, 0) == ["2 new SMS:\n" + "a" * 400 + "\nb"]
+
+    messages = SmsDigest.split(lines, 1)
+
+    assert SmsEncoding.count_segments(messages[0]) == 1
+    assert messages[0].endswith("..")
+    assert messages[1] == "b"
+
+
+def test_forwarder_without_digest(tmp_path, send_queue):
+    digest = make_digest(tmp_path, send_queue, {})
+
+    assert not digest.add(FORWARDER, make_sms(1))
+    assert len(digest) == 0
+
+
+def test_digest_is_queued_once_the_window_is_over(tmp_path, send_queue, monkeypatch):
+    digest = make_digest(tmp_path, send_queue, {FORWARDER: make_settings(window=60)})
+
+    assert digest.add(FORWARDER, make_sms(1, "First"))
+    assert digest.add(FORWARDER, make_sms(2, "Second"))
+    assert digest.flush() == 0
+    assert 0 < digest.wait_time() <= 60
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert digest.wait_time() == 0
+    assert digest.flush() == 1
+    assert len(digest) == 0
+    assert digest.wait_time() == float("inf")
+
+    entry = next(iter(send_queue.entries.values()))
+
+    assert entry["content"] == "2 new SMS:\nFirst\nSecond"
+    assert entry["phone_numbers"] == [FORWARDER]
+    assert entry["source"] == [HistoryStore.get_key(make_sms(1)), HistoryStore.get_key(make_sms(2))]
+
+
+def test_digest_is_queued_once_full(tmp_path, send_queue):
+    digest = make_digest(tmp_path, send_queue, {FORWARDER: make_settings(max_messages=2)})
+
+    digest.add(FORWARDER, make_sms(1))
+    assert digest.flush() == 0
+
+    digest.add(FORWARDER, make_sms(2))
+    assert digest.flush() == 1
+
+
+def test_identical_digests_are_grouped(tmp_path, send_queue):
+    digest = make_digest(tmp_path, send_queue, {FORWARDER: make_settings(), OTHER_FORWARDER: make_settings()})
+
+    digest.add(FORWARDER, make_sms(1))
+    digest.add(OTHER_FORWARDER, make_sms(1))
+
+    assert digest.flush(force=True) == 1
+    assert [entry["phone_numbers"] for entry in send_queue.entries.values()] == [[FORWARDER, OTHER_FORWARDER]]
+
+
+def test_open_digests_are_restored_after_a_restart(tmp_path, send_queue):
+    digests = {FORWARDER: make_settings()}
+    digest = make_digest(tmp_path, send_queue, digests)
+
+    digest.add(FORWARDER, make_sms(1, "First"))
+    digest.add(FORWARDER, make_sms(2, "Second"))
+
+    restored_digest = make_digest(tmp_path, send_queue, digests)
+
+    assert restored_digest.buffers[FORWARDER]["lines"] == ["First", "Second"]
+    assert restored_digest.buffers[FORWARDER]["started_at"] == digest.buffers[FORWARDER]["started_at"]
+    assert restored_digest.flush(force=True) == 1
+
+    # Nothing left once queued
+    assert len(make_digest(tmp_path, send_queue, digests)) == 0
@@ -0,0 +1,81 @@
+from libs.sms_template import SmsEncoding, SmsTemplate
+
+import pytest
+
+
+@pytest.mark.parametrize("text, segments", [
+    ("", 1),
+    ("a" * 160, 1),
+    ("a" * 161, 2),
+    ("a" * 306, 2),
+    ("a" * 307, 3),
+    # Extended GSM-7 characters count twice
+    ("€" * 80, 1),
+    ("€" * 81, 2),
+    # A single UCS-2 character switches the whole SMS
+    ("é" * 160, 1),
+    ("ł" + "a" * 69, 1),
+    ("ł" + "a" * 70, 2),
+    ("ł" + "a" * 133, 2),
+    ("ł" + "a" * 134, 3),
+    # Emojis are 2 UTF-16 code units
+    ("😀" * 35, 1),
+    ("😀" * 36, 2)
+])
+def test_count_segments(text, segments):
+    assert SmsEncoding.count_segments(text) == segments
+
+
+def test_truncate_fits_inside_the_segments():
+    text = "word " * 100
+
+    assert SmsEncoding.truncate(text, 0) == text
+    assert SmsEncoding.truncate("short", 1) == "short"
+
+    for max_segments in (1, 2, 3):
+        truncated_text = SmsEncoding.truncate(text, max_segments)
+
+        assert truncated_text.endswith("..")
+        assert SmsEncoding.count_segments(truncated_text) == max_segments
+        assert SmsEncoding.count_segments(truncated_text + "a") > max_segments
+
+
+def test_split_produces_single_sms():
+    text = " ".join(f"word{i}" for i in range(100))
+    parts = SmsEncoding.split(text)
+
+    assert "".join(parts) == text
+    assert all(SmsEncoding.count_segments(part) == 1 for part in parts)
+
+    # Words are kept whole
+    assert all(part.endswith(" ") for part in parts[:-1])
+
+    # The last SMS is truncated past max_parts
+    limited_parts = SmsEncoding.split(text, 2)
+
+    assert limited_parts[0] == parts[0]
+    assert len(limited_parts) == 2 and limited_parts[1].endswith("..")
+    assert SmsEncoding.count_segments(limited_parts[1]) == 1
+
+
+def test_split_ucs2_and_long_words():
+    text = "ł" * 150
+    parts = SmsEncoding.split(text)
+
+    assert [len(part) for part in parts] == [70, 70, 10]
+    assert SmsEncoding.split("short") == ["short"]
+
+
+def test_template_split_content():
+    sms = {"Phone": "+33612345678", "Date": "2024-01-01 10:00:00", "Content": "a " * 200}
+
+    truncated_template = SmsTemplate("{content}", 2)
+    split_template = SmsTemplate("{content}", 3, True)
+
+    assert SmsEncoding.count_segments(truncated_template.render(sms)) == 2
+    assert truncated_template.split_content("text") == ["text"]
+
+    rendered_content = split_template.render(sms)
+
+    assert rendered_content == sms["Content"]
+    assert len(split_template.split_content(rendered_content)) == 3